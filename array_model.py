@@ -0,0 +1,277 @@
+# NOTE: Building pulp expressions and named LpVariables costs a lot of Python overhead per supplement (and labels like
+# "Pyridoxal 5'-Phosphate Caps" then have to be sanitized into valid names). This builds the same model as
+# PurchaseModel(compact=True) straight from the catalog's columns as NumPy arrays, writes it out as MPS with a vectorized
+# writer, then runs the CBC binary bundled with pulp directly and reads the solution back by column index.
+#
+# Columns and rows are named by index rather than label, so nothing ever needs sanitizing:
+#   S                 number of stacks (on a stacks lattice, its steps: stacks = stacks_multiple * S + stacks_offset)
+#   X{i}              bottles purchased
+#   D{i}, A{i}        purchase flag and adjusted leftover units (adjusted modes only)
+#   B{i}              Balance_*
+#   BP{i}, AU{i},     BottlesPurchasedLimit_*, AdjustedLeftoverUnitsUpper_*,
+#   AL{i}, AW{i}      AdjustedLeftoverUnitsLimit_*, AdjustedLeftoverUnitsLower_* (adjusted modes only)
+#   FS                FreeShipping (only with a free shipping threshold)
+
+import contextlib
+import math
+import os
+import subprocess
+import tempfile
+
+from lazy_imports import lazy_import
+from optimization_mode import ADJUSTED_MODES
+from profiling import NULL_PROFILER
+from solver_options import DEFAULT_SOLVER_OPTIONS
+from stacks_search import StacksSolution, catalog_arrays, lattice_bounds, leftover_weights
+
+np = lazy_import('numpy')
+
+# Map the first word(s) of CBC's solution file status line to pulp's status names
+CBC_STATUSES = {
+  'Optimal': 'Optimal',
+  'Infeasible': 'Infeasible',
+  'Integer infeasible': 'Infeasible',
+  'Unbounded': 'Unbounded',
+  # Stopped on the time limit (etc), which is 'Feasible' if it found an integer solution
+  'Stopped': 'Not Solved',
+}
+
+# Column/row names for each supplement index, eg. names('X', 3) -> ['X0', 'X1', 'X2']
+def names(prefix, count):
+  return np.char.add(prefix, np.arange(count).astype(str))
+
+# Format a float array the same way pulp does in its MPS files
+def format_values(values):
+  return np.char.mod('%.12e', np.asarray(values, dtype=np.float64))
+
+# MPS COLUMNS section lines for one column per row of `rows`, with one (row name, coefficient) entry per column of it.
+# Entries are written column by column, as MPS requires all of a column's entries to be contiguous.
+def column_lines(column_names, rows, values):
+  column_names = np.repeat(column_names, rows.shape[1])
+  rows = rows.ravel()
+  values = format_values(values.ravel())
+
+  return np.char.add(np.char.add(np.char.add(np.char.add("    ", column_names), "  "), np.char.add(rows, "  ")), values)
+
+# Rows (name, sense, right hand side) and columns (name, entries) of the model as arrays
+class ArrayModel:
+  def __init__(
+    self, bottle_size, bottle_cost, daily_dose, current_stock, min_stacks, max_stacks, mode,
+    profiler=None, free_shipping_threshold=None, stacks_multiple=1, stacks_offset=0,
+  ):
+    self.profiler = profiler or NULL_PROFILER
+    self.size = len(bottle_size)
+    # First and last stacks values on the lattice (see PurchaseModel)
+    self.min_stacks, self.max_stacks = lattice_bounds(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+    self.stacks_multiple = stacks_multiple
+    self.stacks_offset = stacks_offset
+    self.mode = mode
+    self.adjusted = mode in ADJUSTED_MODES
+
+    self.bottle_size = bottle_size
+    self.bottle_cost = bottle_cost
+    self.daily_dose = daily_dose
+    self.current_stock = current_stock
+    self.weights = leftover_weights(bottle_size, bottle_cost, mode)
+    self.free_shipping_threshold = free_shipping_threshold
+
+    # The non-adjusted objective is sum(weights * (current_stock + bottle_size * X - daily_dose * stacks)), with its
+    # constant part added back on after the solve
+    offset_stock = current_stock - stacks_offset * daily_dose
+    self.objective_constant = 0.0 if self.adjusted else float(self.weights @ offset_stock)
+
+    # Tightest valid big M values per supplement (see PurchaseModel.big_m)
+    self.bottles_m = np.ceil(np.maximum(self.max_stacks * daily_dose - current_stock, 0) / bottle_size)
+    if free_shipping_threshold is not None:
+      extra = np.ceil(free_shipping_threshold / np.where(bottle_cost > 0, bottle_cost, math.inf))
+      self.bottles_m = self.bottles_m + extra
+    self.leftover_m = np.maximum(current_stock + self.bottles_m * bottle_size - self.min_stacks * daily_dose, 0)
+
+  def rows_section(self):
+    n = self.size
+    lines = ["ROWS", " N  OBJ", *np.char.add(" G  ", names('B', n))]
+
+    if self.adjusted:
+      for sense, prefix in (('L', 'BP'), ('L', 'AU'), ('L', 'AL'), ('G', 'AW')):
+        lines.extend(np.char.add(f" {sense}  ", names(prefix, n)))
+
+    if self.free_shipping_threshold is not None:
+      lines.append(" G  FS")
+
+    return lines
+
+  def columns_section(self):
+    n = self.size
+    b, d = self.bottle_size, self.daily_dose
+    ones = np.ones(n)
+    objective = np.full(n, 'OBJ')
+
+    lines = ["COLUMNS", "    MARKER                 'MARKER'                 'INTORG'"]
+
+    # S: -daily_dose in every Balance_* row, +daily_dose in the rows that substitute in the leftover units (per step of
+    # stacks_multiple, with stacks_offset * daily_dose moved into the right hand sides)
+    if self.adjusted:
+      rows = np.concatenate([names('B', n), names('AU', n), names('AW', n)])
+      values = np.concatenate([-d, d, d]) * self.stacks_multiple
+    else:
+      rows = np.concatenate([['OBJ'], names('B', n)])
+      values = np.concatenate([[-(self.weights @ d)], -d]) * self.stacks_multiple
+    lines.extend(column_lines(np.array(['S']), rows[None, :], values[None, :]))
+
+    # X{i}
+    if self.adjusted:
+      rows = np.stack([names('B', n), names('BP', n), names('AU', n), names('AW', n)], axis=1)
+      values = np.stack([b, ones, -b, -b], axis=1)
+    else:
+      rows = np.stack([objective, names('B', n)], axis=1)
+      values = np.stack([self.weights * b, b], axis=1)
+    if self.free_shipping_threshold is not None:
+      rows = np.column_stack([rows, np.full(n, 'FS')])
+      values = np.column_stack([values, self.bottle_cost])
+    lines.extend(column_lines(names('X', n), rows, values))
+
+    if self.adjusted:
+      # D{i}
+      rows = np.stack([names('BP', n), names('AL', n), names('AW', n)], axis=1)
+      values = np.stack([-self.bottles_m, -self.leftover_m, -self.leftover_m], axis=1)
+      lines.extend(column_lines(names('D', n), rows, values))
+
+    lines.append("    MARKER                 'MARKER'                 'INTEND'")
+
+    if self.adjusted:
+      # A{i} (continuous)
+      rows = np.stack([objective, names('AU', n), names('AL', n), names('AW', n)], axis=1)
+      values = np.stack([self.weights, ones, ones, ones], axis=1)
+      lines.extend(column_lines(names('A', n), rows, values))
+
+    return lines
+
+  def rhs_section(self):
+    n = self.size
+    c = self.current_stock - self.stacks_offset * self.daily_dose
+
+    rows = [names('B', n)]
+    values = [-c]
+    if self.adjusted:
+      rows += [names('BP', n), names('AU', n), names('AL', n), names('AW', n)]
+      values += [np.zeros(n), c, np.zeros(n), c - self.leftover_m]
+    if self.free_shipping_threshold is not None:
+      rows.append(['FS'])
+      values.append([self.free_shipping_threshold])
+
+    return ["RHS", *column_lines(np.array(['RHS']), np.concatenate(rows)[None, :], np.concatenate(values)[None, :])]
+
+  def bounds_section(self):
+    n = self.size
+    lines = [
+      "BOUNDS",
+      f" LO BND       S  {(self.min_stacks - self.stacks_offset) // self.stacks_multiple:.12e}",
+      f" UP BND       S  {(self.max_stacks - self.stacks_offset) // self.stacks_multiple:.12e}",
+      *np.char.add(np.char.add(" LO BND       ", names('X', n)), f"  {0:.12e}"),
+    ]
+    if self.adjusted:
+      lines.extend(np.char.add(" BV BND       ", names('D', n)))
+
+    return lines
+
+  def write_mps(self, path):
+    lines = [
+      "*SENSE:Minimize",
+      "NAME          SupplementPurchasing",
+      *self.rows_section(),
+      *self.columns_section(),
+      *self.rhs_section(),
+      *self.bounds_section(),
+      "ENDATA",
+    ]
+    with open(path, 'w') as mps_file:
+      mps_file.write("\n".join(lines))
+      mps_file.write("\n")
+
+  # Parse CBC's solution file into a StacksSolution. With printingOptions all, CBC lists every row before the columns,
+  # so we pick out the S and X{i} columns by name.
+  def read_solution(self, path):
+    with open(path) as solution_file:
+      status_line = solution_file.readline()
+      values = np.zeros(1 + self.size)
+
+      for line in solution_file:
+        tokens = line.split()
+        # Infeasible values are flagged with a leading '**'
+        if tokens[0] == '**':
+          tokens = tokens[1:]
+        name = tokens[1]
+        if name == 'S':
+          values[0] = float(tokens[2])
+        elif name[0] == 'X':
+          values[1 + int(name[1:])] = float(tokens[2])
+
+    status = next((status for prefix, status in CBC_STATUSES.items() if status_line.startswith(prefix)), 'Not Solved')
+    # eg. "Stopped on time - objective value 123" (vs "Stopped on time (no integer solution - continuous used) - ...")
+    if status == 'Not Solved' and status_line.split()[4:5] == ['objective']:
+      status = 'Feasible'
+    if status not in ('Optimal', 'Feasible'):
+      return StacksSolution(status, None, None, None)
+
+    objective = float(status_line.rsplit(maxsplit=1)[-1]) + self.objective_constant
+
+    stacks = self.stacks_multiple * int(round(values[0])) + self.stacks_offset
+
+    return StacksSolution(status, stacks, np.rint(values[1:]).astype(np.int64).tolist(), objective)
+
+  # Write the model out as MPS, solve it with CBC and read the solution back
+  def solve(self, msg=False, solver_options=None):
+    solver_args = (solver_options or DEFAULT_SOLVER_OPTIONS).cbc_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      mps_path = os.path.join(tmp_dir, "model.mps")
+      solution_path = os.path.join(tmp_dir, "model.sol")
+
+      with self.profiler.phase('write_mps'):
+        self.write_mps(mps_path)
+
+      # When profiling, CBC always logs to a file (which the profiler echoes if msg is set)
+      with self.profiler.solver_log(None, msg) as log_path, self.profiler.phase('cbc'):
+        with open(log_path, 'w') if log_path else contextlib.nullcontext() as log_file:
+          output = log_file or (None if msg else subprocess.DEVNULL)
+          subprocess.run(
+            [
+              cbc_path(), mps_path, "-timeMode", "elapsed", *solver_args,
+              "-branch", "-printingOptions", "all", "-solution", solution_path,
+            ],
+            stdout=output,
+            stderr=output,
+            check=False,
+          )
+
+      if not os.path.exists(solution_path):
+        return StacksSolution("Not Solved", None, None, None)
+
+      with self.profiler.phase('read_solution'):
+        return self.read_solution(solution_path)
+
+# Path to the CBC binary bundled with pulp
+def cbc_path():
+  import pulp
+
+  return pulp.PULP_CBC_CMD().path
+
+# Build, write and solve the model with CBC, without ever building pulp expressions
+def solve_array_model(
+  supplements, min_stacks, max_stacks, mode, msg=False, profiler=None, solver_options=None, free_shipping_threshold=None,
+  stacks_multiple=1, stacks_offset=0,
+):
+  first, last = lattice_bounds(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+  if first > last:
+    return StacksSolution("Infeasible", None, None, None)
+
+  profiler = profiler or NULL_PROFILER
+
+  with profiler.phase('build'):
+    model = ArrayModel(
+      *catalog_arrays(supplements), min_stacks, max_stacks, mode,
+      profiler=profiler, free_shipping_threshold=free_shipping_threshold,
+      stacks_multiple=stacks_multiple, stacks_offset=stacks_offset,
+    )
+  with profiler.phase('solve'):
+    return model.solve(msg=msg, solver_options=solver_options)
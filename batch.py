@@ -0,0 +1,264 @@
+# NOTE: We plan for many households whose catalogs are identical apart from current_stock, and running the optimizer
+# once per household pays the interpreter startup, imports and model build every time. This reads a JSON lines stream
+# of inventory snapshots and plans each one in a single process, against one base catalog, mode, set of stack bounds,
+# stacks lattice and free shipping threshold, writing a JSON line of results per snapshot (in input order) as it goes,
+# so memory stays constant however long the stream is.
+#
+# With the 'milp' engine the PurchaseModel is built once and only the constraints of the supplements whose stock
+# changed are rebuilt between snapshots (each re-solve warm starts CBC from the previous incumbent). The direct search
+# engines don't need CBC at all, and the 'incremental' engine (see incremental_planner) only recomputes the supplements
+# whose stock changed from one snapshot to the next, re-solving only when the optimal stacks value moves.
+#
+# Each snapshot is a JSON object with an optional id (echoed back) and a mapping of label to units on hand, where
+# supplements that aren't listed keep the base catalog's stock:
+#   {"id": "household-1", "current_stock": {"Vitamin B12": 30, "DHA-500": 12}}
+#
+# A snapshot that can't be planned (eg. invalid JSON, an unknown label or a solver failure) gets an {"id": ...,
+# "error": ...} line, and the rest of the batch carries on.
+#
+# With --workers, the snapshots are spread across a pool of worker processes (see parallel), each with its own
+# BatchPlanner, while the results still come out in input order.
+#
+# Usage:
+#   python batch.py --mode adjusted_leftover_units_cost --catalog catalog.csv < snapshots.jsonl > plans.jsonl
+
+import argparse
+import json
+import sys
+import traceback
+from contextlib import nullcontext
+
+from array_model import solve_array_model
+from catalog_io import add_catalog_argument
+from free_shipping import add_free_shipping_arguments, free_shipping_stacks, free_shipping_threshold
+from incremental_planner import IncrementalPlanner
+from lazy_imports import lazy_import
+from optimization_mode import OptimizationMode, get_mode_enum
+from optimize_bottles_min_leftover_units_or_cost_of_leftover_bought import PurchaseModel
+from parallel import WorkerPool, worker_state
+from purchase_plan import make_plan
+from solver_options import DEFAULT_SOLVER_OPTIONS, SolverOptions, add_solver_arguments
+from stacks_search import SEARCH_ENGINES, add_stacks_lattice_arguments
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+np = lazy_import('numpy')
+
+# Engines a BatchPlanner can use
+ENGINES = ('milp', 'array', *SEARCH_ENGINES, 'incremental')
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Plan purchases for a JSON lines stream of inventory snapshots in one process.")
+
+  parser.add_argument(
+    '--min-stacks', type=int, default=7 * 4,
+    help="Minimum number of stacks (default: 7 * 4 days)"
+  )
+  parser.add_argument(
+    '--max-stacks', type=int, default=7 * 4 * 2,
+    help="Maximum number of stacks (default: 7 * 4 * 2 days)"
+  )
+  parser.add_argument(
+    '--mode', type=str, choices=[mode.value for mode in OptimizationMode], default='leftover_units',
+    help="Optimization mode (default: 'leftover_units')"
+  )
+  parser.add_argument(
+    '--engine', type=str, choices=ENGINES, default='milp',
+    help="Solver engine: 'milp' (one MILP reused across snapshots, solved with --solver), 'array' (the compact MILP built from NumPy arrays and solved by CBC directly), 'sweep' or 'breakpoints' (direct searches, without CBC), or 'incremental' (the direct search updated with only the supplements whose stock changed since the previous snapshot) (default: 'milp')"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+  add_free_shipping_arguments(parser)
+  add_stacks_lattice_arguments(parser)
+  parser.add_argument(
+    '--compact', action='store_true',
+    help="Optional: Build the compact MILP, substituting the leftover units/cost definitions directly instead of creating variables and constraints for them"
+  )
+  parser.add_argument(
+    '--workers', type=int, default=1,
+    help="Optional: Number of worker processes to spread the snapshots across, each with its own model (default: 1, ie. in process)"
+  )
+  parser.add_argument(
+    '--input', type=str, default='-', metavar='PATH',
+    help="JSON lines file of inventory snapshots (default: '-' for stdin)"
+  )
+  parser.add_argument(
+    '--output', type=str, default='-', metavar='PATH',
+    help="File to write the JSON lines results to (default: '-' for stdout)"
+  )
+
+  args = parser.parse_args()
+  if args.engine == 'incremental' and args.require_free_shipping:
+    parser.error("--require-free-shipping isn't supported by the 'incremental' engine, use 'sweep' or 'breakpoints' instead")
+
+  return args
+
+# Plans a stream of stock snapshots against one base catalog, reusing the MILP between them
+class BatchPlanner:
+  def __init__(
+    self, catalog, min_stacks, max_stacks, mode,
+    engine='milp', compact=False, solver_options=None, free_shipping_threshold=None, stacks_multiple=1, stacks_offset=0,
+  ):
+    if engine not in ENGINES:
+      raise ValueError(f"Unknown engine: {engine}")
+    # The threshold couples every supplement together, so a stock change can't be swapped in one supplement at a time
+    if engine == 'incremental' and free_shipping_threshold is not None:
+      raise ValueError("The 'incremental' engine can't require free shipping, use 'sweep' or 'breakpoints' instead")
+
+    self.catalog = SupplementCatalog.from_records(catalog)
+    self.min_stacks = min_stacks
+    self.max_stacks = max_stacks
+    self.mode = mode
+    self.engine = engine
+    self.compact = compact
+    self.free_shipping_threshold = free_shipping_threshold
+    self.lattice = {'stacks_multiple': stacks_multiple, 'stacks_offset': stacks_offset}
+    self.solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+    # The direct searches don't use a MILP solver at all
+    self.solver = None if engine in (*SEARCH_ENGINES, 'incremental') else self.solver_options.describe()
+
+    # Built on the first 'milp' (or 'incremental') snapshot, along with the stock levels it currently has
+    self.model = None
+    self.model_stock = None
+
+  # Retarget the planner at new stack bounds, keeping its MILP (the incremental planner's objective vector covers the
+  # stacks values themselves, so that one is rebuilt on the next snapshot)
+  def set_stack_bounds(self, min_stacks, max_stacks):
+    self.min_stacks = min_stacks
+    self.max_stacks = max_stacks
+    if self.engine == 'incremental':
+      self.model = None
+    elif self.model is not None:
+      self.model.set_stack_bounds(min_stacks, max_stacks)
+
+  # The base catalog with a snapshot's stock levels (mapping of label to units on hand) substituted in
+  def snapshot_catalog(self, current_stock):
+    return self.catalog.with_stock_levels(current_stock)
+
+  def solve(self, catalog):
+    if self.engine in SEARCH_ENGINES and self.free_shipping_threshold is not None:
+      # Both direct searches take the threshold through the same exact search over stacks values
+      return free_shipping_stacks(
+        catalog, self.min_stacks, self.max_stacks, self.mode, self.free_shipping_threshold, **self.lattice,
+      )
+    elif self.engine in SEARCH_ENGINES:
+      return SEARCH_ENGINES[self.engine](catalog, self.min_stacks, self.max_stacks, self.mode, **self.lattice)
+    elif self.engine == 'array':
+      return solve_array_model(
+        catalog, self.min_stacks, self.max_stacks, self.mode,
+        solver_options=self.solver_options, free_shipping_threshold=self.free_shipping_threshold, **self.lattice,
+      )
+    elif self.engine == 'incremental':
+      if self.model is None:
+        self.model = IncrementalPlanner(catalog, self.min_stacks, self.max_stacks, self.mode, **self.lattice)
+        return self.model.solution()
+      return self.model.update_current_stock(catalog.column('current_stock'))
+
+    stock = catalog.column('current_stock')
+    if self.model is None:
+      self.model = PurchaseModel(
+        catalog, self.min_stacks, self.max_stacks, self.mode,
+        compact=self.compact, free_shipping_threshold=self.free_shipping_threshold, **self.lattice,
+      )
+    else:
+      # Only rebuild the constraints of the supplements whose stock actually changed
+      changed = np.flatnonzero(stock != self.model_stock)
+      if len(changed):
+        self.model.set_current_stock({self.catalog.labels[i]: int(stock[i]) for i in changed})
+    self.model_stock = stock.copy()
+
+    return self.model.solve(solver_options=self.solver_options)
+
+  # Plan a single snapshot, returning a PurchasePlan
+  def plan(self, current_stock):
+    catalog = self.snapshot_catalog(current_stock)
+    solution = self.solve(catalog)
+
+    return make_plan(
+      catalog, solution, self.min_stacks, self.max_stacks, self.mode, self.engine, self.solver,
+      free_shipping_threshold=self.free_shipping_threshold, **self.lattice,
+    )
+
+# JSON-friendly summary of a plan: status, totals and the bottles to buy of each supplement we're buying any of
+def plan_record(plan):
+  record = {'status': plan.status, 'stacks': plan.stacks, 'objective': plan.objective}
+
+  if plan.has_solution:
+    record.update({
+      'total_cost': round(plan.total_cost, 2),
+      'total_leftover_cost': round(plan.total_leftover_cost, 2),
+      'total_adjusted_leftover_cost': round(plan.total_adjusted_leftover_cost, 2),
+      'purchases': {purchase.label: purchase.bottles_purchased for purchase in plan.purchased},
+    })
+
+  return record
+
+# Plan a single JSON line snapshot, returning its result record
+def plan_line(planner, line_number, line):
+  snapshot_id = None
+  try:
+    snapshot = json.loads(line)
+    if not isinstance(snapshot, dict):
+      raise ValueError(f"Expected a JSON object, not {type(snapshot).__name__}")
+
+    snapshot_id = snapshot.get('id')
+    current_stock = snapshot.get('current_stock', {})
+    if not isinstance(current_stock, dict):
+      raise ValueError("current_stock must be an object mapping label to units on hand")
+
+    return {'id': snapshot_id, **plan_record(planner.plan(current_stock))}
+  except ValueError as e:
+    return {'id': snapshot_id, 'error': f"line {line_number}: {e}"}
+  except Exception as e:
+    # Anything else (eg. the solver failing) only fails this snapshot, with the traceback on stderr
+    traceback.print_exc(file=sys.stderr)
+    return {'id': snapshot_id, 'error': f"line {line_number}: {type(e).__name__}: {e}"}
+
+# Number the JSON lines, skipping blank ones
+def numbered_lines(lines):
+  return ((line_number, line) for line_number, line in enumerate(lines, start=1) if line.strip())
+
+# Plan each JSON line snapshot in turn, yielding a result record per line
+def run_batch(planner, lines):
+  for line_number, line in numbered_lines(lines):
+    yield plan_line(planner, line_number, line)
+
+# Set up a worker process with its own BatchPlanner (see parallel.WorkerPool)
+def init_batch_worker(
+  catalog, min_stacks, max_stacks, mode, engine, compact, solver_options, free_shipping_threshold, stacks_multiple,
+  stacks_offset,
+):
+  worker_state['planner'] = BatchPlanner(
+    catalog, min_stacks, max_stacks, mode,
+    engine=engine, compact=compact, solver_options=solver_options, free_shipping_threshold=free_shipping_threshold,
+    stacks_multiple=stacks_multiple, stacks_offset=stacks_offset,
+  )
+
+# Plan a (line number, line) pair in a worker process
+def plan_worker_line(numbered_line):
+  return plan_line(worker_state['planner'], *numbered_line)
+
+# Main function
+def main():
+  args = parse_args()
+
+  catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else supplements
+  planner_args = (
+    SupplementCatalog.from_records(catalog), args.min_stacks, args.max_stacks, get_mode_enum(args.mode),
+    args.engine, args.compact, SolverOptions.from_args(args), free_shipping_threshold(args), args.stacks_multiple,
+    args.stacks_offset,
+  )
+
+  with (
+    WorkerPool(init_batch_worker, planner_args, workers=args.workers) as pool,
+    nullcontext(sys.stdin) if args.input == '-' else open(args.input) as input_file,
+    nullcontext(sys.stdout) if args.output == '-' else open(args.output, 'w') as output_file,
+  ):
+    for record in pool.imap(plan_worker_line, numbered_lines(input_file)):
+      output_file.write(json.dumps(record))
+      output_file.write("\n")
+      # Results are usable as soon as each snapshot is planned
+      output_file.flush()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,74 @@
+# Compare CBC's effort on the leftover-bought model with a global big M vs the per-supplement tight big M values
+#
+# Usage:
+#   python -m benchmarks.big_m
+#   python -m benchmarks.big_m --sizes 100 1000 --json
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from tabulate import tabulate
+
+from catalog_generator import generate_catalog
+from cbc_log import read_cbc_log
+from optimization_mode import OptimizationMode
+from optimize_bottles_min_leftover_units_or_cost_of_leftover_bought import PurchaseModel
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Benchmark global vs tight big M in the leftover-bought model.")
+
+  parser.add_argument('--sizes', type=int, nargs='+', default=[25, 50, 100], help="Catalog sizes to benchmark (default: 25 50 100)")
+  parser.add_argument('--seed', type=int, default=0, help="Random seed for the generated catalogs (default: 0)")
+  parser.add_argument('--min-stacks', type=int, default=7 * 4, help="Minimum number of stacks (default: 7 * 4 days)")
+  parser.add_argument('--max-stacks', type=int, default=7 * 4 * 3, help="Maximum number of stacks (default: 7 * 4 * 3 days)")
+  parser.add_argument(
+    '--modes', type=str, nargs='+', default=[mode.value for mode in OptimizationMode],
+    choices=[mode.value for mode in OptimizationMode], help="Optimization modes to benchmark (default: all)"
+  )
+  parser.add_argument('--json', action='store_true', help="Print one JSON object per run instead of a table")
+
+  return parser.parse_args()
+
+def run(catalog, min_stacks, max_stacks, mode, tight_big_m):
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    log_path = os.path.join(tmp_dir, "cbc.log")
+
+    start = time.perf_counter()
+    model = PurchaseModel(catalog, min_stacks, max_stacks, mode, tight_big_m=tight_big_m)
+    solution = model.solve(log_path=log_path)
+    seconds = time.perf_counter() - start
+
+    stats = read_cbc_log(log_path)
+
+  return {
+    'big_m': 'tight' if tight_big_m else 'global',
+    'status': solution.status,
+    'objective': solution.objective,
+    'nodes': stats.get('nodes'),
+    'iterations': stats.get('iterations'),
+    'solver_seconds': stats.get('wallclock_seconds'),
+    'total_seconds': round(seconds, 4),
+  }
+
+def main():
+  args = parse_args()
+
+  rows = []
+  for size in args.sizes:
+    catalog = generate_catalog(size, args.seed)
+    for mode_str in args.modes:
+      mode = OptimizationMode(mode_str)
+      for tight_big_m in (False, True):
+        result = {'size': size, 'mode': mode.value, **run(catalog, args.min_stacks, args.max_stacks, mode, tight_big_m)}
+        if args.json:
+          print(json.dumps(result), flush=True)
+        rows.append(result)
+
+  if not args.json:
+    print(tabulate([list(row.values()) for row in rows], headers=list(rows[0].keys())))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,121 @@
+# Startup cost of each CLI entry point: how long its imports take (from python -X importtime, over and above a bare
+# interpreter's) and whether it pulled in a module it shouldn't have (pulp, NumPy and tabulate are only for the code
+# paths that solve or print a table, not for listing subcommands or -h). Exits non-zero on either.
+#
+# Usage:
+#   python -m benchmarks.import_time
+#   python -m benchmarks.import_time --budget 150 --repeat 10
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import cli
+from cli import COMMANDS, SCRIPT_COMMANDS
+from lazy_imports import tabulate
+
+# Modules no entry point should import just to parse its arguments
+DEFAULT_FORBIDDEN = ('numpy', 'pulp', 'tabulate')
+
+# Import time (ms, over a bare interpreter's) no entry point should go over, which importing NumPy or pulp eagerly does
+DEFAULT_BUDGET_MS = 250
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Benchmark the import time of each CLI entry point.")
+
+  parser.add_argument(
+    '--commands', type=str, nargs='+', default=None, choices=[name for name in COMMANDS if name not in SCRIPT_COMMANDS],
+    metavar='COMMAND',
+    help="Subcommands to benchmark with -h (default: every one that parses arguments, ie. all but the standalone scripts)"
+  )
+  parser.add_argument('--repeat', type=int, default=5, help="Runs of each entry point, reporting the median (default: 5)")
+  parser.add_argument(
+    '--forbid', type=str, nargs='*', default=list(DEFAULT_FORBIDDEN),
+    help=f"Modules that mustn't be imported (default: {' '.join(DEFAULT_FORBIDDEN)})"
+  )
+  parser.add_argument(
+    '--budget', type=float, default=DEFAULT_BUDGET_MS,
+    help=f"Exit non-zero if any entry point's median import time (over a bare interpreter's) exceeds this many ms (default: {DEFAULT_BUDGET_MS})"
+  )
+  parser.add_argument('--json', action='store_true', help="Print one JSON object per entry point instead of a table")
+
+  return parser.parse_args()
+
+# Run the python arguments once, returning the total import time (ms), wall clock time (ms) and modules imported
+def run(args):
+  start = time.perf_counter()
+  result = subprocess.run(
+    [sys.executable, '-X', 'importtime', *args], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+  )
+  wall_ms = (time.perf_counter() - start) * 1000
+  if result.returncode != 0:
+    raise ValueError(f"{' '.join(args)} exited with {result.returncode}:\n{result.stderr}")
+
+  import_us = 0
+  modules = set()
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+
+    _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+    modules.add(name.strip())
+    # Only the top level imports, as each one's cumulative time already includes everything it imported
+    if not name.startswith("  "):
+      import_us += int(cumulative_us)
+
+  return import_us / 1000, wall_ms, modules
+
+# Median import/wall time of the python arguments over repeat runs, with the forbidden modules any run imported
+def measure(args, repeat, forbidden):
+  imports, walls, imported = [], [], set()
+  for _ in range(repeat):
+    import_ms, wall_ms, modules = run(args)
+    imports.append(import_ms)
+    walls.append(wall_ms)
+    imported |= {name.split('.')[0] for name in modules} & forbidden
+
+  return statistics.median(imports), statistics.median(walls), sorted(imported)
+
+def main():
+  args = parse_args()
+
+  commands = args.commands or [name for name in COMMANDS if name not in SCRIPT_COMMANDS]
+  entry_points = [('cli', [cli.__file__, '-h'])] + [(f"cli {name}", [cli.__file__, name, '-h']) for name in commands]
+
+  baseline_ms, _baseline_wall_ms, _imported = measure(['-c', 'pass'], args.repeat, set())
+
+  rows = []
+  for name, entry_args in entry_points:
+    import_ms, wall_ms, imported = measure(entry_args, args.repeat, set(args.forbid))
+    result = {
+      'entry_point': name,
+      'import_ms': round(import_ms - baseline_ms, 1),
+      'wall_ms': round(wall_ms, 1),
+      'forbidden_imports': imported,
+    }
+    if args.json:
+      print(json.dumps(result), flush=True)
+    rows.append(result)
+
+  if not args.json:
+    print(tabulate(
+      [[row['entry_point'], row['import_ms'], row['wall_ms'], ", ".join(row['forbidden_imports'])] for row in rows],
+      headers=["Entry Point", "Import ms (over python)", "Wall ms", "Forbidden Imports"],
+    ))
+
+  failures = [f"{row['entry_point']} imported {', '.join(row['forbidden_imports'])}" for row in rows if row['forbidden_imports']]
+  failures += [
+    f"{row['entry_point']} took {row['import_ms']}ms to import (budget: {args.budget:g}ms)"
+    for row in rows if row['import_ms'] > args.budget
+  ]
+
+  for failure in failures:
+    print(failure, file=sys.stderr)
+  if failures:
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
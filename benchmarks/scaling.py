@@ -0,0 +1,358 @@
+# Time model build, solve and reporting for every formulation (including the standalone and legacy scripts) across a
+# range of synthetic catalog sizes, recording peak memory, to see where each one stops scaling and to spot regressions
+# between releases.
+#
+# Each case runs in its own forked process (so peak memory isn't polluted by earlier cases, and a case that blows
+# through --timeout can be killed along with its CBC subprocess). Once a formulation times out or fails at some size,
+# the larger sizes are skipped for it.
+#
+# Usage:
+#   python -m benchmarks.scaling
+#   python -m benchmarks.scaling --sizes 10 1000 100000 1000000 --formulations sweep breakpoints array
+#   python -m benchmarks.scaling --output results.json
+#   python -m benchmarks.scaling --output new.json --baseline old.json
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import runpy
+import signal
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pulp
+from tabulate import tabulate
+
+import supplements_data
+from array_model import ArrayModel
+from catalog_generator import generate_catalog
+from optimization_mode import OptimizationMode
+from optimize_bottles_min_leftover_units_or_cost import PurchaseModel as BasePurchaseModel
+from optimize_bottles_min_leftover_units_or_cost_of_leftover_bought import PurchaseModel as BoughtPurchaseModel
+from purchase_plan import make_plan, print_plan
+from stacks_search import SEARCH_ENGINES, catalog_arrays
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump this whenever the result format (or what a phase measures) changes
+RESULTS_VERSION = 1
+
+BASE_MODES = (OptimizationMode.LEFTOVER_UNITS, OptimizationMode.LEFTOVER_UNITS_COST)
+ALL_MODES = tuple(OptimizationMode)
+
+# Accumulates the wall clock time spent in each named phase
+class PhaseTimer:
+  def __init__(self):
+    self.phases = {}
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+# Print the plan for a solution, the same way the CLIs do (stdout is sent to /dev/null while benchmarking)
+def report(catalog, solution, min_stacks, max_stacks, mode, engine):
+  print_plan(make_plan(catalog, solution, min_stacks, max_stacks, mode, engine))
+
+def purchase_model_runner(model_class, compact):
+  def run(catalog, min_stacks, max_stacks, mode, timer):
+    with timer.phase('build'):
+      model = model_class(catalog, min_stacks, max_stacks, mode, compact=compact)
+    with timer.phase('solve'):
+      solution = model.solve()
+    with timer.phase('report'):
+      report(catalog, solution, min_stacks, max_stacks, mode, 'milp')
+
+    return solution.status, solution.objective
+
+  return run
+
+def run_array_model(catalog, min_stacks, max_stacks, mode, timer):
+  with timer.phase('build'):
+    model = ArrayModel(*catalog_arrays(catalog), min_stacks, max_stacks, mode)
+  with timer.phase('solve'):
+    solution = model.solve()
+  with timer.phase('report'):
+    report(catalog, solution, min_stacks, max_stacks, mode, 'array')
+
+  return solution.status, solution.objective
+
+def search_engine_runner(engine):
+  def run(catalog, min_stacks, max_stacks, mode, timer):
+    # The direct searches have no separate model to build
+    timer.phases['build'] = 0.0
+    with timer.phase('solve'):
+      solution = SEARCH_ENGINES[engine](catalog, min_stacks, max_stacks, mode)
+    with timer.phase('report'):
+      report(catalog, solution, min_stacks, max_stacks, mode, engine)
+
+    return solution.status, solution.objective
+
+  return run
+
+# Run one of the standalone scripts against the catalog (they all read supplements_data.supplements at import time, and
+# use their own hardcoded stack bounds/objectives). Everything before prob.solve() counts as build, everything after as
+# reporting.
+def script_runner(path):
+  def run(catalog, min_stacks, max_stacks, mode, timer):
+    supplements_data.supplements = catalog
+
+    original_solve = pulp.LpProblem.solve
+    marks = {}
+
+    def timed_solve(self, *args, **kwargs):
+      marks['solve_start'] = time.perf_counter()
+      try:
+        return original_solve(self, *args, **kwargs)
+      finally:
+        marks['solve_end'] = time.perf_counter()
+
+    pulp.LpProblem.solve = timed_solve
+    try:
+      start = time.perf_counter()
+      script_globals = runpy.run_path(path, run_name='__main__')
+      end = time.perf_counter()
+    finally:
+      pulp.LpProblem.solve = original_solve
+
+    timer.phases['build'] = marks['solve_start'] - start
+    timer.phases['solve'] = marks['solve_end'] - marks['solve_start']
+    timer.phases['report'] = end - marks['solve_end']
+
+    prob = next(value for value in script_globals.values() if isinstance(value, pulp.LpProblem))
+    status = pulp.LpStatus[prob.status]
+    return status, pulp.value(prob.objective) if status == 'Optimal' else None
+
+  return run
+
+# A formulation to benchmark, and the optimization modes it supports (None for scripts that don't take a mode)
+Formulation = namedtuple("Formulation", ["run", "modes"])
+
+def script_formulations():
+  formulations = {
+    'constrain_usage_pct': Formulation(
+      script_runner(os.path.join(REPO_ROOT, "optimize_bottles_min_leftover_units_constrain_usage_pct.py")), (None,)
+    ),
+  }
+
+  legacy_dir = os.path.join(REPO_ROOT, "legacy")
+  for filename in sorted(os.listdir(legacy_dir)):
+    if filename.startswith("optimize_supplements_w") and filename.endswith(".py"):
+      name = "legacy." + filename[len("optimize_supplements_"):-len(".py")]
+      formulations[name] = Formulation(script_runner(os.path.join(legacy_dir, filename)), (None,))
+
+  return formulations
+
+FORMULATIONS = {
+  'or_cost': Formulation(purchase_model_runner(BasePurchaseModel, compact=False), BASE_MODES),
+  'or_cost_compact': Formulation(purchase_model_runner(BasePurchaseModel, compact=True), BASE_MODES),
+  'leftover_bought': Formulation(purchase_model_runner(BoughtPurchaseModel, compact=False), ALL_MODES),
+  'leftover_bought_compact': Formulation(purchase_model_runner(BoughtPurchaseModel, compact=True), ALL_MODES),
+  'array': Formulation(run_array_model, ALL_MODES),
+  **{engine: Formulation(search_engine_runner(engine), ALL_MODES) for engine in SEARCH_ENGINES},
+  **script_formulations(),
+}
+
+# Peak resident memory (in MB) of this process, or of its (waited for) child processes such as CBC
+def max_rss_mb(who=resource.RUSAGE_SELF):
+  return resource.getrusage(who).ru_maxrss / 1024
+
+# Run a single case inside the forked child, sending the result back over the connection
+def run_case(connection, formulation, size, seed, min_stacks, max_stacks, mode, trace_memory):
+  # Own process group, so a timeout can kill any CBC subprocess along with us
+  os.setpgrp()
+
+  # Silence the scripts' (and CBC's) output
+  devnull = os.open(os.devnull, os.O_WRONLY)
+  os.dup2(devnull, 1)
+  os.dup2(devnull, 2)
+
+  try:
+    catalog = generate_catalog(size, seed)
+    catalog_rss = max_rss_mb()
+
+    if trace_memory:
+      tracemalloc.start()
+
+    timer = PhaseTimer()
+    status, objective = FORMULATIONS[formulation].run(catalog, min_stacks, max_stacks, mode, timer)
+
+    result = {
+      'status': status,
+      'objective': objective,
+      **{f"{phase}_seconds": round(seconds, 4) for phase, seconds in timer.phases.items()},
+      'total_seconds': round(sum(timer.phases.values()), 4),
+      'catalog_rss_mb': round(catalog_rss, 1),
+      'max_rss_mb': round(max_rss_mb(), 1),
+      'solver_max_rss_mb': round(max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
+    if trace_memory:
+      result['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+  except Exception as error:
+    result = {'status': 'error', 'error': repr(error)}
+
+  connection.send(result)
+  connection.close()
+
+# Run a case in a forked process, killing it (and its process group) if it takes longer than the timeout
+def run_isolated(formulation, size, seed, min_stacks, max_stacks, mode, timeout, trace_memory):
+  context = multiprocessing.get_context('fork')
+  receiver, sender = context.Pipe(duplex=False)
+
+  process = context.Process(
+    target=run_case, args=(sender, formulation, size, seed, min_stacks, max_stacks, mode, trace_memory)
+  )
+  process.start()
+  sender.close()
+
+  if receiver.poll(timeout):
+    result = receiver.recv()
+  else:
+    result = {'status': 'timeout'}
+    try:
+      os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+      pass
+
+  process.join()
+  return result
+
+# Environment details, so results from different machines/releases can be told apart
+def metadata(args):
+  try:
+    commit = subprocess.run(
+      ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+
+  return {
+    'version': RESULTS_VERSION,
+    'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    'commit': commit,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'pulp': pulp.__version__,
+    'numpy': np.__version__,
+    'seed': args.seed,
+    'min_stacks': args.min_stacks,
+    'max_stacks': args.max_stacks,
+    'timeout': args.timeout,
+  }
+
+def case_key(result):
+  return result['formulation'], result['mode'], result['size']
+
+# Compare total_seconds against a previous --output file, returning the cases that got slower by more than threshold
+def find_regressions(results, baseline_path, threshold):
+  with open(baseline_path) as baseline_file:
+    baseline = {case_key(result): result for result in json.load(baseline_file)['results']}
+
+  regressions = []
+  for result in results:
+    previous = baseline.get(case_key(result))
+    if previous is None or 'total_seconds' not in previous:
+      continue
+
+    if 'total_seconds' not in result:
+      # Used to finish, now times out or fails
+      regressions.append({**result, 'baseline_seconds': previous['total_seconds'], 'ratio': None})
+    elif result['total_seconds'] > previous['total_seconds'] * threshold:
+      ratio = result['total_seconds'] / max(previous['total_seconds'], 1e-9)
+      regressions.append({**result, 'baseline_seconds': previous['total_seconds'], 'ratio': round(ratio, 2)})
+
+  return regressions
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Benchmark build/solve/report time and peak memory of every formulation.")
+
+  parser.add_argument(
+    '--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+    help="Catalog sizes to benchmark (default: 10 100 1000 10000)"
+  )
+  parser.add_argument(
+    '--formulations', type=str, nargs='+', default=list(FORMULATIONS), choices=list(FORMULATIONS), metavar='FORMULATION',
+    help=f"Formulations to benchmark (default: all): {', '.join(FORMULATIONS)}"
+  )
+  parser.add_argument(
+    '--modes', type=str, nargs='+', default=[mode.value for mode in OptimizationMode],
+    choices=[mode.value for mode in OptimizationMode], help="Optimization modes to benchmark, where supported (default: all)"
+  )
+  parser.add_argument('--seed', type=int, default=0, help="Random seed for the generated catalogs (default: 0)")
+  parser.add_argument('--min-stacks', type=int, default=7 * 4, help="Minimum number of stacks (default: 7 * 4 days)")
+  parser.add_argument('--max-stacks', type=int, default=7 * 4 * 2, help="Maximum number of stacks (default: 7 * 4 * 2 days)")
+  parser.add_argument('--timeout', type=float, default=120, help="Seconds before a case is killed (default: 120)")
+  parser.add_argument(
+    '--trace-memory', action='store_true',
+    help="Optional: Also record the peak Python heap (tracemalloc), at the cost of slowing down the timings"
+  )
+  parser.add_argument('--json', action='store_true', help="Print one JSON object per case instead of a table")
+  parser.add_argument('--output', type=str, default=None, help="Optional: Write the metadata and results to a JSON file")
+  parser.add_argument(
+    '--baseline', type=str, default=None,
+    help="Optional: Previous --output file to compare against, exiting non-zero if any case regressed"
+  )
+  parser.add_argument(
+    '--regression-threshold', type=float, default=1.25,
+    help="Slowdown ratio (vs --baseline) that counts as a regression (default: 1.25)"
+  )
+
+  return parser.parse_args()
+
+def main():
+  args = parse_args()
+  modes = [OptimizationMode(mode_str) for mode_str in args.modes]
+
+  results = []
+  for formulation in args.formulations:
+    for mode in FORMULATIONS[formulation].modes:
+      if mode is not None and mode not in modes:
+        continue
+
+      stopped = False
+      for size in sorted(args.sizes):
+        result = {'formulation': formulation, 'mode': mode.value if mode else None, 'size': size}
+        if stopped:
+          result['status'] = 'skipped'
+        else:
+          result.update(run_isolated(
+            formulation, size, args.seed, args.min_stacks, args.max_stacks, mode, args.timeout, args.trace_memory
+          ))
+          stopped = result['status'] in ('timeout', 'error')
+
+        if args.json:
+          print(json.dumps(result), flush=True)
+        results.append(result)
+
+  if not args.json:
+    headers = list(dict.fromkeys(key for result in results for key in result))
+    print(tabulate([[result.get(key) for key in headers] for result in results], headers=headers))
+
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      json.dump({'metadata': metadata(args), 'results': results}, output_file, indent=2)
+
+  if args.baseline:
+    regressions = find_regressions(results, args.baseline, args.regression_threshold)
+    if regressions:
+      print(f"\n{len(regressions)} regression(s) vs {args.baseline}:\n", file=sys.stderr)
+      print(tabulate(
+        [[r['formulation'], r['mode'], r['size'], r['status'], r['baseline_seconds'], r.get('total_seconds'), r['ratio']]
+         for r in regressions],
+        headers=['formulation', 'mode', 'size', 'status', 'baseline_seconds', 'total_seconds', 'ratio'],
+      ), file=sys.stderr)
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
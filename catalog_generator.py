@@ -0,0 +1,108 @@
+# NOTE: The only real catalog we have is the 18 rows in supplements_data, which is far too small to see how any of the
+# formulations scale. This generates seeded synthetic catalogs (in the same format as supplements_data.supplements) with
+# roughly the same mix of bottle sizes, doses, stock levels and prices, at any size from a handful of rows up to 1M+.
+#
+# Usage:
+#   python catalog_generator.py --size 1000 --seed 0 > catalog.jsonl
+#   python catalog_generator.py --size 1000 --seed 0 --format csv > catalog.csv
+
+import argparse
+import csv
+import json
+import sys
+
+from catalog_io import FIELDS
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Common bottle sizes, and how often each turns up
+BOTTLE_SIZES = [30, 60, 90, 100, 120, 180, 240, 250]
+BOTTLE_SIZE_WEIGHTS = [0.08, 0.3, 0.2, 0.12, 0.12, 0.08, 0.05, 0.05]
+
+# Daily doses (units per stack), and how often each turns up
+DAILY_DOSES = [1, 2, 3, 4]
+DAILY_DOSE_WEIGHTS = [0.55, 0.3, 0.1, 0.05]
+
+# Fraction of supplements with nothing currently in stock
+OUT_OF_STOCK_FRACTION = 0.3
+
+# Bottle prices are a lognormal per-unit price (median ~$0.35/unit) times the bottle size, clamped to a sensible range
+UNIT_PRICE_MEDIAN = 0.35
+UNIT_PRICE_SIGMA = 0.6
+MIN_BOTTLE_COST = 5.0
+MAX_BOTTLE_COST = 150.0
+
+# Label stems, including the sort of punctuation real labels have (apostrophes, parentheses, hyphens)
+LABEL_STEMS = [
+  "L-Tyrosine",
+  "Citicoline (CDP Choline)",
+  "St Johns Wort",
+  "Bacopa Extract",
+  "Acetyl-L-Carnitine (ALCAR)",
+  "Rhodiola Extract",
+  "NAC (N-Acetyl Cysteine)",
+  "Vitamin B-Complex",
+  "Pyridoxal 5'-Phosphate Caps",
+  "L-Methylfolate",
+  "Vitamin B12",
+  "Zinc",
+  "Vitamin D-3",
+  "DHA-500",
+  "Magnesium Malate",
+  "SAMe",
+]
+
+# Generate a seeded synthetic catalog of `size` supplements
+def generate_catalog(size, seed=0):
+  rng = np.random.default_rng(seed)
+
+  bottle_size = rng.choice(BOTTLE_SIZES, size=size, p=BOTTLE_SIZE_WEIGHTS)
+  daily_dose = rng.choice(DAILY_DOSES, size=size, p=DAILY_DOSE_WEIGHTS)
+
+  unit_price = rng.lognormal(np.log(UNIT_PRICE_MEDIAN), UNIT_PRICE_SIGMA, size=size)
+  bottle_cost = np.round(np.clip(unit_price * bottle_size, MIN_BOTTLE_COST, MAX_BOTTLE_COST), 2)
+
+  # In stock supplements have anywhere up to two bottles' worth left
+  current_stock = np.floor(rng.random(size) * (2 * bottle_size + 1)).astype(np.int64)
+  current_stock[rng.random(size) < OUT_OF_STOCK_FRACTION] = 0
+
+  stems = rng.integers(len(LABEL_STEMS), size=size)
+
+  return [
+    {
+      'label': f"{LABEL_STEMS[stem]} #{i + 1}",
+      'bottle_size': bottle,
+      'bottle_cost': cost,
+      'daily_dose': dose,
+      'current_stock': stock,
+    }
+    for i, (stem, bottle, cost, dose, stock) in enumerate(zip(
+      stems.tolist(), bottle_size.tolist(), bottle_cost.tolist(), daily_dose.tolist(), current_stock.tolist()
+    ))
+  ]
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Generate a seeded synthetic supplement catalog as JSON lines or CSV.")
+
+  parser.add_argument('--size', type=int, required=True, help="Number of supplements to generate")
+  parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+  parser.add_argument('--format', type=str, choices=['jsonl', 'csv'], default='jsonl', help="Output format (default: 'jsonl')")
+
+  return parser.parse_args()
+
+def main():
+  args = parse_args()
+
+  catalog = generate_catalog(args.size, args.seed)
+
+  if args.format == 'csv':
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(FIELDS), lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(catalog)
+  else:
+    for supp in catalog:
+      print(json.dumps(supp))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,168 @@
+# NOTE: supplements_data is a Python literal, so changing inventory means editing code. This loads a catalog from a CSV
+# or JSON lines file instead (eg. the nightly inventory export, or catalog_generator's output), streaming it a row at a
+# time so the raw text is never held in memory alongside the parsed catalog. Each row is validated and converted to
+# the same types as supplements_data, and any problem is reported with the file and line it came from.
+#
+# CSV files need a header row naming (at least) the catalog fields; each JSON line is an object with those fields.
+# Any other columns/keys are ignored. The format is picked from the file extension, and '-' reads JSON lines from stdin.
+#
+# iter_catalog() yields the rows as dicts (load_catalog() collects them into a list), while load_catalog_arrays() fills
+# the columns straight into typed buffers, never keeping a dict per row, for the engines that work on arrays.
+
+import array
+import csv
+import json
+import math
+import os
+import sys
+from contextlib import nullcontext
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Catalog fields and the type each is converted to
+FIELDS = {
+  'label': str,
+  'bottle_size': int,
+  'bottle_cost': float,
+  'daily_dose': int,
+  'current_stock': int,
+}
+
+# Fields that must be strictly positive (the rest just can't be negative)
+POSITIVE_FIELDS = ('bottle_size', 'daily_dose')
+
+# Largest whole number of units a field can hold: the engines all work in float64, which holds whole numbers exactly up
+# to 2^53 (well inside the int64 columns a SupplementCatalog stores them in, so nothing wraps when it's cast)
+MAX_WHOLE_NUMBER = 2 ** 53
+
+CATALOG_FORMATS = ('csv', 'jsonl')
+
+# A catalog row that's missing a field, has a value of the wrong type/range or repeats a label
+class CatalogError(ValueError):
+  def __init__(self, path, line_number, message):
+    super().__init__(f"{path}:{line_number}: {message}")
+    self.path = path
+    self.line_number = line_number
+
+# Pick the catalog format from a file's extension ('-' is stdin, read as JSON lines)
+def catalog_format(path):
+  if path == '-':
+    return 'jsonl'
+
+  extension = os.path.splitext(path)[1].lower()
+  if extension == '.csv':
+    return 'csv'
+  elif extension in ('.jsonl', '.ndjson'):
+    return 'jsonl'
+  else:
+    raise ValueError(f"Can't tell the catalog format of {path} (expected a .csv or .jsonl file)")
+
+# Convert a single field's raw value (a string from CSV, or a JSON value) to its catalog type
+def convert_field(name, value):
+  if value is None or (isinstance(value, str) and not value.strip()):
+    raise ValueError(f"missing {name}")
+
+  if FIELDS[name] is str:
+    if not isinstance(value, str):
+      raise ValueError(f"{name} must be a string, not {value!r}")
+    return value.strip()
+
+  if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+    raise ValueError(f"{name} must be a number, not {value!r}")
+
+  try:
+    number = float(value)
+  except ValueError:
+    raise ValueError(f"{name} must be a number, not {value!r}") from None
+
+  if not math.isfinite(number):
+    raise ValueError(f"{name} must be finite, not {value!r}")
+  if number < 0 or (number == 0 and name in POSITIVE_FIELDS):
+    raise ValueError(f"{name} must be {'positive' if name in POSITIVE_FIELDS else 'non-negative'}, not {value!r}")
+
+  if FIELDS[name] is int:
+    # Allow eg. "90.0", but not a fractional number of units
+    if not number.is_integer():
+      raise ValueError(f"{name} must be a whole number, not {value!r}")
+    if number > MAX_WHOLE_NUMBER:
+      raise ValueError(f"{name} must be at most {MAX_WHOLE_NUMBER}, not {value!r}")
+    return int(number)
+
+  return number
+
+# Yield (line number, raw row) pairs from a catalog file, one row at a time
+def read_rows(catalog_file, format, path):
+  if format == 'csv':
+    reader = csv.DictReader(catalog_file)
+    missing = [name for name in FIELDS if name not in (reader.fieldnames or [])]
+    if missing:
+      raise CatalogError(path, 1, f"missing column(s) {', '.join(missing)} in the CSV header")
+
+    for row in reader:
+      # line_num is the last line read, which differs from the row's first line only for quoted multi-line fields
+      yield reader.line_num, row
+  else:
+    for line_number, line in enumerate(catalog_file, start=1):
+      if not line.strip():
+        continue
+
+      try:
+        row = json.loads(line)
+      except json.JSONDecodeError as e:
+        raise CatalogError(path, line_number, f"invalid JSON ({e.msg})") from None
+      if not isinstance(row, dict):
+        raise CatalogError(path, line_number, f"expected a JSON object, not {type(row).__name__}")
+
+      yield line_number, row
+
+# Stream a catalog file as validated supplement dicts (in the same format as supplements_data.supplements)
+def iter_catalog(path, format=None):
+  format = format or catalog_format(path)
+  if format not in CATALOG_FORMATS:
+    raise ValueError(f"Unknown catalog format: {format}")
+
+  labels = set()
+
+  # utf-8-sig skips the byte order mark spreadsheets like to put at the start of CSV exports
+  with nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig') as catalog_file:
+    for line_number, row in read_rows(catalog_file, format, path):
+      try:
+        supp = {name: convert_field(name, row.get(name)) for name in FIELDS}
+      except ValueError as e:
+        raise CatalogError(path, line_number, str(e)) from None
+
+      # The models key their variables by label, so each one has to be unique
+      if supp['label'] in labels:
+        raise CatalogError(path, line_number, f"duplicate label {supp['label']!r}")
+      labels.add(supp['label'])
+
+      yield supp
+
+# Load a whole catalog file as a list of supplement dicts
+def load_catalog(path, format=None):
+  return list(iter_catalog(path, format))
+
+# Load a catalog file as its labels and numeric columns (the same arrays as stacks_search.catalog_arrays), filling
+# compact typed buffers a row at a time rather than keeping a dict per row
+def load_catalog_arrays(path, format=None):
+  labels = []
+  columns = {name: array.array('d') for name in FIELDS if name != 'label'}
+
+  for supp in iter_catalog(path, format):
+    labels.append(supp['label'])
+    for name, column in columns.items():
+      column.append(supp[name])
+
+  return (
+    labels,
+    *(np.frombuffer(column, dtype=np.float64) if column else np.zeros(0) for column in columns.values()),
+  )
+
+# Add the catalog file argument to an optimizer CLI
+def add_catalog_argument(parser):
+  parser.add_argument(
+    '--catalog', type=str, default=None, metavar='PATH',
+    help="Optional: Load the supplement catalog from a .csv or .jsonl file ('-' for JSON lines on stdin) instead of supplements_data"
+  )
@@ -0,0 +1,27 @@
+import re
+
+# Summary lines CBC prints at the end of a solve, mapped to the stat name and type we parse them into
+CBC_SUMMARY_PATTERNS = {
+  'result': (re.compile(r"^Result - (.+)$", re.M), str),
+  'objective': (re.compile(r"^Objective value:\s+(\S+)", re.M), float),
+  'lower_bound': (re.compile(r"^Lower bound:\s+(\S+)", re.M), float),
+  'gap': (re.compile(r"^Gap:\s+(\S+)", re.M), float),
+  'nodes': (re.compile(r"^Enumerated nodes:\s+(\d+)", re.M), int),
+  'iterations': (re.compile(r"^Total iterations:\s+(\d+)", re.M), int),
+  'cpu_seconds': (re.compile(r"^Time \(CPU seconds\):\s+(\S+)", re.M), float),
+  'wallclock_seconds': (re.compile(r"^Time \(Wallclock seconds\):\s+(\S+)", re.M), float),
+}
+
+# Parse the solver statistics (nodes, iterations, gap, etc) out of a CBC log
+def parse_cbc_log(text):
+  stats = {}
+  for name, (pattern, cast) in CBC_SUMMARY_PATTERNS.items():
+    match = pattern.search(text)
+    if match:
+      stats[name] = cast(match.group(1))
+
+  return stats
+
+def read_cbc_log(path):
+  with open(path) as log_file:
+    return parse_cbc_log(log_file.read())
@@ -0,0 +1,107 @@
+# NOTE: A single entry point for every formulation, where each subcommand runs the module that implements it (along
+# with its own arguments) exactly as `python -m <module>` would. Nothing here imports a formulation until its
+# subcommand is picked, so listing the subcommands (or a subcommand's -h) never pays for a solver it doesn't run (see
+# lazy_imports, and benchmarks.import_time for keeping it that way).
+#
+# Usage:
+#   python cli.py --help
+#   python cli.py optimize --mode adjusted_leftover_units_cost --engine sweep
+#   python cli.py pareto --max-stacks 84 --workers 4
+
+import argparse
+import runpy
+import sys
+
+# Subcommand name -> (module run for it, description)
+COMMANDS = {
+  'optimize': (
+    'optimize_bottles_min_leftover_units_or_cost',
+    "Minimize leftover units/cost over every purchased bottle",
+  ),
+  'optimize-leftover-bought': (
+    'optimize_bottles_min_leftover_units_or_cost_of_leftover_bought',
+    "Minimize leftover units/cost over only the supplements bought",
+  ),
+  'optimize-usage-pct': (
+    'optimize_bottles_min_leftover_units_constrain_usage_pct',
+    "Minimize leftover units with a minimum usage percentage of each bottle bought",
+  ),
+  'batch': ('batch', "Plan a stream of JSON stock updates, one plan per line"),
+  'parallel': ('parallel', "Plan many modes/stack bounds across a pool of worker processes"),
+  'pareto': ('pareto_frontier', "Pareto frontier of total cost vs leftovers vs stacks"),
+  'rolling-horizon': ('rolling_horizon_planner', "Multi-period purchase schedule over a rolling horizon"),
+  'cycles': ('cycle_search', "Rank reorder cycle lengths by their leftovers"),
+  'serve': ('plan_service', "Localhost HTTP plan service"),
+  'generate-catalog': ('catalog_generator', "Generate a seeded synthetic catalog"),
+  'legacy-lcm': ('legacy.lcm_bottles', "Legacy: LCM of the bottle durations"),
+  'legacy-lcm-with-max': ('legacy.lcm_bottles_with_max', "Legacy: LCM of the bottle durations, with a maximum"),
+  'legacy-w1-usage-pct': (
+    'legacy.optimize_supplements_w1_max_stacks_constrain_usage_pct',
+    "Legacy: Maximize stacks with a minimum usage percentage",
+  ),
+  'legacy-w1-usage-pct-last-bottle': (
+    'legacy.optimize_supplements_w1_max_stacks_constrain_usage_pct_last_bottle',
+    "Legacy: Maximize stacks with a minimum usage percentage of the last bottle",
+  ),
+  'legacy-w2-min-leftovers': (
+    'legacy.optimize_supplements_w2_max_stacks_min_leftovers',
+    "Legacy: Maximize stacks and minimize leftovers",
+  ),
+  'legacy-w2-min-leftovers-weekly': (
+    'legacy.optimize_supplements_w2_max_stacks_min_leftovers_constrain_weekly',
+    "Legacy: Maximize stacks and minimize leftovers, in whole weeks",
+  ),
+  'legacy-w3-min-leftover-cost': (
+    'legacy.optimize_supplements_w3_max_stacks_min_leftover_cost_min_total_cost',
+    "Legacy: Maximize stacks, minimize leftover cost and total cost",
+  ),
+  'legacy-w3-min-leftover-cost-usage-pct': (
+    'legacy.optimize_supplements_w3_max_stacks_min_leftover_cost_min_total_cost_constrain_usage_pct',
+    "Legacy: Maximize stacks, minimize leftover cost and total cost, with a minimum usage percentage",
+  ),
+  'legacy-w3-min-leftovers': (
+    'legacy.optimize_supplements_w3_max_stacks_min_leftovers_min_total_cost',
+    "Legacy: Maximize stacks, minimize leftovers and total cost",
+  ),
+}
+
+# Subcommands that run a standalone script, which does all its work on import and so takes no arguments (not even -h)
+SCRIPT_COMMANDS = tuple(name for name, (module, _description) in COMMANDS.items() if module.startswith('legacy.')) + (
+  'optimize-usage-pct',
+)
+
+# Define CLI arguments (everything after the subcommand is left for its module to parse)
+def parse_args(argv=None):
+  width = max(len(name) for name in COMMANDS)
+  commands = "\n".join(f"  {name:<{width}}  {description}" for name, (_module, description) in COMMANDS.items())
+
+  parser = argparse.ArgumentParser(
+    description="Optimize supplement purchasing strategy, with a subcommand for each formulation.",
+    epilog=f"subcommands:\n{commands}\n\nRun a subcommand with -h for its own options.",
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+  )
+
+  parser.add_argument('command', choices=COMMANDS, metavar='command', help="Subcommand to run (see below)")
+  parser.add_argument('args', nargs=argparse.REMAINDER, help="Arguments for the subcommand")
+
+  args = parser.parse_args(argv)
+  if args.command in SCRIPT_COMMANDS and args.args:
+    parser.error(f"{args.command} doesn't take any arguments")
+
+  return args
+
+# Run a subcommand's module as __main__ with its arguments in sys.argv (and as sys.modules['__main__'], so any worker
+# processes it spawns import it rather than us)
+def run_command(command, args):
+  module, _description = COMMANDS[command]
+
+  sys.argv[1:] = args
+  runpy.run_module(module, run_name='__main__', alter_sys=True)
+
+# Main function
+def main():
+  args = parse_args()
+  run_command(args.command, args.args)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,147 @@
+# NOTE: legacy/lcm_bottles looks for a reorder rhythm as the exact LCM of every supplement's days per bottle, ie. the
+# shortest cycle that uses up every bottle exactly. With 18 supplements that's astronomically long (and only gets worse
+# with a bigger catalog), while legacy/lcm_bottles_with_max just clamps it to a year. Rather than insisting on zero
+# leftovers, this scores every candidate cycle length from min_cycle to max_cycle days at once: buying the fewest whole
+# bottles of each supplement that cover a cycle, how many units (or how much cost) are left over at the end of it. The
+# best few cycles are the ones worth reordering on, and an exact LCM within the bound still comes out on top with no
+# leftovers at all.
+#
+# A cycle is scored from empty (ie. ignoring current_stock), as it's the rhythm that repeats, not the next order. This
+# is the same objective as stacks_search.sweep_stacks with no stock on hand, where leftovers are counted for every
+# supplement (each one needs at least a bottle a cycle, so the adjusted modes would score the same).
+#
+# Usage:
+#   python cycle_search.py --max-cycle 365 --top 10 --mode leftover_units_cost
+
+import argparse
+import time
+from collections import namedtuple
+
+from catalog_io import add_catalog_argument
+from lazy_imports import lazy_import, tabulate
+from optimization_mode import COST_MODES, OptimizationMode, get_mode_enum
+from stacks_search import bottles_needed, catalog_arrays, leftover_weights, stacks_objective
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+np = lazy_import('numpy')
+
+# Modes a cycle can be ranked by (see above for why the adjusted modes aren't separate)
+CYCLE_MODES = (OptimizationMode.LEFTOVER_UNITS, OptimizationMode.LEFTOVER_UNITS_COST)
+
+# Decimal places leftovers are compared to when ranking, so cycles that only differ by floating point round-off tie
+# (and the shorter one wins)
+RANK_DECIMALS = 9
+
+# A ranked cycle length, with leftover in the units of the mode's objective and bottles_purchased (each cycle) aligned
+# to the catalog
+CycleCandidate = namedtuple("CycleCandidate", ["days", "leftover", "total_cost", "bottles_purchased"])
+
+# Leftovers at the end of every cycle length in cycle_range, buying the fewest bottles that cover it from empty
+def cycle_leftovers(cycle_range, bottle_size, bottle_cost, daily_dose, mode):
+  if mode not in CYCLE_MODES:
+    raise ValueError(f"Unsupported optimization mode for a cycle: {mode}")
+
+  weights = leftover_weights(bottle_size, bottle_cost, mode)
+
+  return stacks_objective(cycle_range, bottle_size, daily_dose, np.zeros_like(bottle_size), weights, adjusted=False)
+
+# Rank every cycle length in [min_cycle, max_cycle] days by the mode's leftovers, returning the top (fewest leftovers,
+# then shortest) as CycleCandidates in rank order
+def rank_cycles(supplements, min_cycle, max_cycle, mode, top=10):
+  if min_cycle < 1:
+    raise ValueError(f"A cycle must be at least 1 day, not {min_cycle}")
+  if min_cycle > max_cycle:
+    return []
+
+  bottle_size, bottle_cost, daily_dose, _current_stock = catalog_arrays(supplements)
+  cycle_range = np.arange(min_cycle, max_cycle + 1, dtype=np.float64)
+
+  leftover = cycle_leftovers(cycle_range, bottle_size, bottle_cost, daily_dose, mode)
+  ranked = np.lexsort((cycle_range, np.round(leftover, RANK_DECIMALS)))[:top]
+
+  candidates = []
+  for i in ranked:
+    bottles = bottles_needed(cycle_range[i], bottle_size, daily_dose, 0.0)
+    candidates.append(CycleCandidate(
+      int(cycle_range[i]), float(leftover[i]), float(bottles @ bottle_cost), bottles.astype(np.int64),
+    ))
+
+  return candidates
+
+# Print the ranked cycles, then what the best one buys of each supplement
+def print_cycles(catalog, candidates, mode):
+  leftover_format = "${:.2f}" if mode in COST_MODES else "{:.2f}"
+
+  table = []
+  for rank, candidate in enumerate(candidates):
+    table.append([
+      rank + 1,
+      candidate.days,
+      f"{candidate.days / 7:.2f}",
+      leftover_format.format(candidate.leftover),
+      f"${candidate.total_cost:.2f}",
+      f"${candidate.total_cost / candidate.days:.2f}",
+      int(candidate.bottles_purchased.sum()),
+    ])
+
+  leftover_heading = f"Leftover {'Cost' if mode in COST_MODES else 'Units'}"
+  headers = ["Rank", "Cycle (days)", "Weeks", leftover_heading, "Cost per Cycle", "Cost per Day", "Bottles per Cycle"]
+  print(tabulate(table, headers=headers))
+
+  if not candidates:
+    return
+
+  best = candidates[0]
+  bottle_size, _bottle_cost, daily_dose, _current_stock = catalog.arrays()
+  leftover_units = best.bottles_purchased * bottle_size - best.days * daily_dose
+
+  table = list(zip(
+    catalog.labels,
+    daily_dose.tolist(),
+    bottle_size.tolist(),
+    best.bottles_purchased.tolist(),
+    leftover_units.tolist(),
+  ))
+  print(f"\nBest cycle: {best.days} days (approx {best.days / 7:.2f} weeks)\n")
+  print(tabulate(table, headers=["Supplement", "Daily Dose", "Bottle Size", "Bottles per Cycle", "Leftover Units"]))
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Rank reorder cycle lengths by the leftovers at the end of each cycle.")
+
+  parser.add_argument(
+    '--min-cycle', type=int, default=1,
+    help="Shortest cycle length to consider, in days (default: 1)"
+  )
+  parser.add_argument(
+    '--max-cycle', type=int, default=365,
+    help="Longest cycle length to consider, in days (default: 365)"
+  )
+  parser.add_argument(
+    '--top', type=int, default=10,
+    help="Number of cycle lengths to report (default: 10)"
+  )
+  parser.add_argument(
+    '--mode', type=str, choices=[mode.value for mode in CYCLE_MODES], default='leftover_units',
+    help="Leftovers to rank by: 'leftover_units' or 'leftover_units_cost' (default: 'leftover_units')"
+  )
+  add_catalog_argument(parser)
+
+  return parser.parse_args()
+
+# Main function
+def main():
+  args = parse_args()
+
+  catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else SupplementCatalog.from_records(supplements)
+  mode = get_mode_enum(args.mode)
+
+  start = time.perf_counter()
+  candidates = rank_cycles(catalog, args.min_cycle, args.max_cycle, mode, top=args.top)
+  seconds = time.perf_counter() - start
+
+  print_cycles(catalog, candidates, mode)
+  print(f"\nRanked {max(args.max_cycle - args.min_cycle + 1, 0)} cycle lengths in {seconds * 1000:.1f}ms")
+
+if __name__ == "__main__":
+  main()
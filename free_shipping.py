@@ -0,0 +1,242 @@
+# NOTE: Requiring free shipping (the total cost of the bottles purchased reaching a threshold, eg. $80) couples every
+# supplement together, so the cheapest plan at a fixed stacks value is no longer just the fewest bottles of each. The
+# MILP models take it as one more constraint (see PurchaseModel/ArrayModel). For the direct searches, this keeps it
+# exact without a MILP: at each stacks value, start from the fewest bottles covering it (as stacks_search does), and if
+# they fall short of the threshold by some deficit, add the extra bottles that make it up for the least extra leftovers.
+#
+# That's a covering knapsack over extra bottles, solved by dynamic programming over the deficit in whole cents:
+#   - An extra bottle of a supplement costs its bottle_cost and adds bottle_size * weight to the objective, where
+#     weight is the mode's per-unit leftover weight (see stacks_search.leftover_weights).
+#   - In the adjusted modes, the first bottle of a supplement we weren't otherwise buying also brings the leftovers we
+#     already had of it into the objective, as a one-off charge.
+#   - table[x] is the least objective added by extra bottles costing at least x cents, built up one supplement at a
+#     time, where adding any number of a supplement's bottles is a cumulative minimum over each residue of x modulo its
+#     bottle_cost (so each supplement costs one vectorized pass over the table).
+#   - Supplements that another one beats on both counts (at least as much cost for no more leftovers) never need to be
+#     considered, which leaves very few for the DP however big the catalog is.
+#
+# In the non-adjusted modes the extra bottles' costs don't depend on the stacks value, so one table (up to the largest
+# deficit) prices every stacks value at once, while the adjusted modes build one per stacks value that falls short
+# (cheapest first, stopping once the rest can't beat the best so far, as extra bottles only ever add to the objective).
+#
+# Usage:
+#   solution = free_shipping_stacks(catalog, 28, 56, OptimizationMode.LEFTOVER_UNITS_COST, 80.0)
+
+import math
+
+from lazy_imports import lazy_import
+from optimization_mode import ADJUSTED_MODES
+from stacks_search import (
+  OBJECTIVE_TOLERANCE, StacksSolution, best_index, bottles_needed, catalog_arrays, leftover_weights, stacks_cost,
+  stacks_lattice, stacks_objective,
+)
+
+np = lazy_import('numpy')
+
+DEFAULT_FREE_SHIPPING_THRESHOLD = 80.0
+
+# Most rows of a supplement's DP table (the deficit over its bottle_cost) to add its bottles a row at a time
+MAX_LOOP_ROWS = 128
+
+# Prices to whole cents, as the DP's resolution
+def to_cents(amount):
+  return np.rint(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64)
+
+# Threshold in whole cents (any fraction of a cent still has to be reached)
+def threshold_cents(threshold):
+  return math.ceil(round(threshold * 100, 6))
+
+# Objective per extra bottle of each supplement, and the one-off charge for the first one (with bottles bought at the
+# stacks value)
+def extra_bottle_objective(stacks, bottles, bottle_size, daily_dose, current_stock, weights, adjusted):
+  gain = bottle_size * weights
+  if not adjusted:
+    return gain, np.zeros_like(gain)
+
+  # The leftovers of a supplement we weren't buying (current stock covers stacks) only count once we buy a bottle
+  fixed = np.where(bottles > 0, 0.0, (current_stock - stacks * daily_dose) * weights)
+
+  return gain, fixed
+
+# Indices of the supplements worth considering for extra bottles: those with a cost, that no other supplement beats
+# (costing at least as much, capped at the deficit, for no more objective, with no one-off charge)
+def candidate_extras(cost, gain, fixed, deficit):
+  capped = np.minimum(cost, deficit)
+  priced = np.flatnonzero(cost > 0)
+  if not len(priced):
+    return priced
+
+  # Pareto frontier of the supplements without a one-off charge, from the most expensive down
+  plain = priced[fixed[priced] == 0]
+  order = plain[np.lexsort((gain[plain], -capped[plain]))]
+  lowest_gain = np.minimum.accumulate(gain[order])
+  frontier = order[np.concatenate([[True], gain[order][1:] < lowest_gain[:-1]])] if len(order) else order
+
+  # Those with a one-off charge, unless a frontier supplement costing at least as much has no more objective
+  charged = priced[fixed[priced] > 0]
+  if len(frontier) and len(charged):
+    # Reversed, the frontier's costs and gains both increase, so the lowest gain costing at least as much is the first
+    frontier_cost = capped[frontier][::-1]
+    frontier_gain = gain[frontier][::-1]
+    position = np.searchsorted(frontier_cost, capped[charged], side='left')
+    reaching = position < len(frontier)
+    beaten = np.zeros(len(charged), dtype=bool)
+    beaten[reaching] = frontier_gain[position[reaching]] <= gain[charged][reaching]
+    charged = charged[~beaten]
+
+  return np.concatenate([frontier, charged])
+
+# Least objective added by buying one or more bottles of a supplement on top of prev: first[x] is the first bottle
+# bought on top of prev[x - cost] (every table is 0 for a deficit already covered), and each further one adds gain
+def add_extra_bottles(prev, cost, gain, fixed):
+  deficit = len(prev) - 1
+  first = np.empty(deficit + 1)
+  first[:cost + 1] = prev[0]
+  first[cost + 1:] = prev[1:max(deficit + 1 - cost, 1)]
+  first += gain + fixed
+
+  # more[x] = min(first[x], more[x - cost] + gain), down each residue of x modulo cost, ie. each column of the table
+  # laid out cost cents to a row
+  rows = -(-(deficit + 1) // cost)
+  padded = np.full(rows * cost, np.inf)
+  padded[:deficit + 1] = first
+  grid = padded.reshape(rows, cost)
+  if rows <= MAX_LOOP_ROWS:
+    # A vectorized pass per row beats a strided cumulative minimum down the columns, unless there are a lot of them
+    for row in range(1, rows):
+      np.minimum(grid[row], grid[row - 1] + gain, out=grid[row])
+  else:
+    offsets = np.arange(rows)[:, None] * gain
+    grid[:] = np.minimum.accumulate(grid - offsets, axis=0) + offsets
+
+  return first, padded[:deficit + 1]
+
+# DP tables over every deficit in [0, deficit] cents for the given supplements, returning the final table along with
+# each supplement's (prev, first, more) tables to backtrack through
+def extra_bottle_tables(deficit, cost, gain, fixed, candidates):
+  table = np.full(deficit + 1, np.inf)
+  table[0] = 0.0
+
+  stages = []
+  for i in candidates:
+    first, more = add_extra_bottles(table, int(cost[i]), gain[i], fixed[i])
+    stages.append((i, table, first, more))
+    table = np.minimum(table, more)
+
+  return table, stages
+
+# Walk back through the DP tables from a deficit, returning the extra bottles of each supplement
+def backtrack_extra_bottles(deficit, cost, stages, size):
+  extra = np.zeros(size, dtype=np.int64)
+
+  x = deficit
+  for i, prev, first, more in reversed(stages):
+    tolerance = OBJECTIVE_TOLERANCE * max(1.0, abs(prev[x])) if np.isfinite(prev[x]) else 0.0
+    # Not buying any of this supplement is at least as good
+    if prev[x] <= more[x] + tolerance:
+      continue
+
+    # Further bottles while they do better than buying the first one here (which may not cover the deficit at all)
+    c = int(cost[i])
+    while not np.isfinite(first[x]) or more[x] < first[x] - OBJECTIVE_TOLERANCE * max(1.0, abs(first[x])):
+      extra[i] += 1
+      x = max(x - c, 0)
+    extra[i] += 1
+    x = max(x - c, 0)
+
+  return extra
+
+# Fewest bottles covering the stacks value whose total cost reaches the threshold, with the least leftovers (by the
+# mode's weights). Returns None if the threshold can't be reached (no supplement has a price).
+def free_shipping_bottles(stacks, bottle_size, bottle_cost, daily_dose, current_stock, mode, threshold):
+  cost = to_cents(bottle_cost)
+  weights = leftover_weights(bottle_size, bottle_cost, mode)
+
+  bottles = bottles_needed(stacks, bottle_size, daily_dose, current_stock).astype(np.int64)
+  deficit = threshold_cents(threshold) - int(bottles @ cost)
+  if deficit <= 0:
+    return bottles
+
+  gain, fixed = extra_bottle_objective(
+    stacks, bottles, bottle_size, daily_dose, current_stock, weights, mode in ADJUSTED_MODES,
+  )
+  table, stages = extra_bottle_tables(deficit, cost, gain, fixed, candidate_extras(cost, gain, fixed, deficit))
+  if not np.isfinite(table[deficit]):
+    return None
+
+  return bottles + backtrack_extra_bottles(deficit, cost, stages, len(bottles))
+
+# Search every stacks value in [min_stacks, max_stacks] (on the stacks lattice) for the optimum whose total cost reaches
+# the threshold
+def free_shipping_stacks(supplements, min_stacks, max_stacks, mode, threshold, stacks_multiple=1, stacks_offset=0):
+  stacks_range = stacks_lattice(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+  if not len(stacks_range):
+    return StacksSolution("Infeasible", None, None, None)
+
+  bottle_size, bottle_cost, daily_dose, current_stock = catalog_arrays(supplements)
+  cost = to_cents(bottle_cost)
+  weights = leftover_weights(bottle_size, bottle_cost, mode)
+  adjusted = mode in ADJUSTED_MODES
+
+  objective = stacks_objective(stacks_range, bottle_size, daily_dose, current_stock, weights, adjusted)
+
+  # Cents short of the threshold with just the fewest bottles at each stacks value
+  base_cost = stacks_cost(stacks_range, bottle_size, cost.astype(np.float64), daily_dose, current_stock)
+  deficits = threshold_cents(threshold) - np.rint(base_cost).astype(np.int64)
+  short = np.flatnonzero(deficits > 0)
+
+  if len(short) and not adjusted:
+    # One table prices every stacks value
+    gain, fixed = extra_bottle_objective(None, None, bottle_size, daily_dose, current_stock, weights, adjusted)
+    deficit = int(deficits[short].max())
+    table, _stages = extra_bottle_tables(deficit, cost, gain, fixed, candidate_extras(cost, gain, fixed, deficit))
+    objective[short] += table[deficits[short]]
+  elif len(short):
+    # Every cent of the deficit adds at least the lowest objective per cent of any supplement's bottle, which bounds each
+    # stacks value from below: go from the lowest bound up, and once one can't beat the best found so far, neither can
+    # any after it
+    priced = cost > 0
+    rate = (bottle_size * weights / np.where(priced, cost, 1))[priced].min() if priced.any() else np.inf
+    bound = objective[short] + deficits[short] * rate
+    best = objective[deficits <= 0].min() if len(short) < len(stacks_range) else np.inf
+
+    ranking = np.argsort(bound, kind='stable')
+    order, bound = short[ranking], bound[ranking]
+    for position, index in enumerate(order):
+      if bound[position] > best + OBJECTIVE_TOLERANCE * max(1.0, abs(best)):
+        objective[order[position:]] = np.inf
+        break
+
+      stacks = stacks_range[index]
+      bottles = bottles_needed(stacks, bottle_size, daily_dose, current_stock)
+      gain, fixed = extra_bottle_objective(stacks, bottles, bottle_size, daily_dose, current_stock, weights, adjusted)
+      deficit = int(deficits[index])
+      table, _stages = extra_bottle_tables(deficit, cost, gain, fixed, candidate_extras(cost, gain, fixed, deficit))
+      objective[index] += table[deficit]
+      best = min(best, objective[index])
+
+  if not np.isfinite(objective).any():
+    return StacksSolution("Infeasible", None, None, None)
+
+  stacks = int(stacks_range[best_index(objective)])
+  bottles = free_shipping_bottles(stacks, bottle_size, bottle_cost, daily_dose, current_stock, mode, threshold)
+  leftover = current_stock + bottles * bottle_size - stacks * daily_dose
+  if adjusted:
+    leftover = np.where(bottles > 0, leftover, 0)
+
+  return StacksSolution("Optimal", stacks, bottles.tolist(), float(leftover @ weights))
+
+# Threshold the total cost has to reach given the CLI arguments, or None if free shipping isn't required
+def free_shipping_threshold(args):
+  return args.free_shipping_threshold if args.require_free_shipping else None
+
+# Add the free shipping arguments to an optimizer CLI
+def add_free_shipping_arguments(parser):
+  parser.add_argument(
+    '--require-free-shipping', action='store_true',
+    help="Optional: Require free shipping, ie. the total cost of the bottles purchased to reach --free-shipping-threshold"
+  )
+  parser.add_argument(
+    '--free-shipping-threshold', type=float, default=DEFAULT_FREE_SHIPPING_THRESHOLD,
+    help=f"Total cost that qualifies for free shipping, with --require-free-shipping (default: {DEFAULT_FREE_SHIPPING_THRESHOLD:g})"
+  )
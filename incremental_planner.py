@@ -0,0 +1,143 @@
+# NOTE: Day to day, only current_stock changes; bottle sizes, doses and prices hardly ever do. Rather than re-solving
+# from scratch for every inventory update, IncrementalPlanner keeps the objective at every candidate stacks value (the
+# same vector sweep_stacks builds, over the same stacks lattice) along with the bottles bought at the current optimum.
+# A stock change for some supplements then only swaps those supplements' contributions out of the objective vector, so
+# an update costs O(changed supplements x candidate stacks values) however big the catalog is:
+#   - If the optimal stacks value doesn't move, only the changed supplements' bottle counts are recomputed.
+#   - If it does move, every bottle count is recomputed for the new stacks value (a "re-solve", though still without
+#     building a model or starting CBC).
+#
+# Picking the optimum uses the same tolerance and tie break (the largest stacks value) as the direct searches, so it
+# gives the same plan as a full run. The running sums pick up a little floating point error with each update, so the
+# planner tracks a bound on it, and whenever a candidate is close enough to the tie threshold that the error could
+# change the pick, it recomputes the objective vector from scratch first.
+#
+# Usage:
+#   planner = IncrementalPlanner(catalog, 28, 56, OptimizationMode.ADJUSTED_LEFTOVER_UNITS_COST)
+#   solution = planner.set_current_stock({"Vitamin B12": 30, "DHA-500": 12})
+
+from catalog_io import convert_field
+from lazy_imports import lazy_import
+from optimization_mode import ADJUSTED_MODES
+from stacks_search import (
+  OBJECTIVE_TOLERANCE, StacksSolution, bottles_needed, leftover_weights, stacks_lattice, stacks_objective,
+)
+from supplement_catalog import SupplementCatalog, validate_columns
+
+np = lazy_import('numpy')
+
+# Keeps a plan up to date as stock levels change, touching only the supplements that changed
+class IncrementalPlanner:
+  def __init__(self, supplements, min_stacks, max_stacks, mode, stacks_multiple=1, stacks_offset=0):
+    self.catalog = SupplementCatalog.from_records(supplements)
+    self.min_stacks = min_stacks
+    self.max_stacks = max_stacks
+    self.mode = mode
+
+    self.bottle_size, bottle_cost, self.daily_dose, current_stock = self.catalog.arrays()
+    # Our own copy, kept in sync with every update
+    self.current_stock = current_stock.copy()
+    self.weights = leftover_weights(self.bottle_size, bottle_cost, mode)
+    self.adjusted = mode in ADJUSTED_MODES
+    self.stacks_range = stacks_lattice(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+
+    # Number of updates, and how many of them moved the optimal stacks value or needed the objective recomputed
+    self.updates = 0
+    self.resolves = 0
+    self.resyncs = 0
+
+    self.index = None
+    self.bottles = None
+    if len(self.stacks_range):
+      self.resync()
+      self.index = self.best_index()
+      self.bottles = self.bottles_at(self.index)
+
+  # Recompute the objective vector from scratch, clearing the accumulated rounding error
+  def resync(self):
+    self.objective = stacks_objective(
+      self.stacks_range, self.bottle_size, self.daily_dose, self.current_stock, self.weights, self.adjusted,
+    )
+    self.error = 0.0
+
+  # Objective vector contribution of some supplements at the given stock levels
+  def contribution(self, indices, current_stock):
+    return stacks_objective(
+      self.stacks_range, self.bottle_size[indices], self.daily_dose[indices], current_stock, self.weights[indices],
+      self.adjusted,
+    )
+
+  # Best stacks index, as stacks_search.best_index picks it from a freshly computed objective
+  def best_index(self):
+    best = self.objective.min()
+    threshold = best + OBJECTIVE_TOLERANCE * max(1.0, abs(best))
+
+    # Resync first if the accumulated error could move any candidate across the tie threshold
+    if self.error > 0 and np.any(np.abs(self.objective - threshold) <= 2 * self.error):
+      self.resync()
+      self.resyncs += 1
+      return self.best_index()
+
+    return int(np.flatnonzero(self.objective <= threshold)[-1])
+
+  # Fewest bottles of each supplement (or just some of them) covering the candidate stacks value at index
+  def bottles_at(self, index, indices=slice(None)):
+    stacks = self.stacks_range[index]
+    bottles = bottles_needed(stacks, self.bottle_size[indices], self.daily_dose[indices], self.current_stock[indices])
+
+    return bottles.astype(np.int64)
+
+  # Current optimum, with bottles_purchased aligned to the catalog
+  def solution(self):
+    if self.index is None:
+      return StacksSolution("Infeasible", None, None, None)
+
+    return StacksSolution(
+      "Optimal", int(self.stacks_range[self.index]), self.bottles.copy(), float(self.objective[self.index]),
+    )
+
+  # Update current_stock for some supplements (mapping of label to units on hand), returning the new optimum
+  def set_current_stock(self, current_stock):
+    index = self.catalog.index()
+    stock = self.current_stock.copy()
+
+    for label, units in current_stock.items():
+      if label not in index:
+        raise ValueError(f"Unknown supplement: {label!r}")
+      stock[index[label]] = convert_field('current_stock', units)
+
+    return self.update_current_stock(stock)
+
+  # Update to a whole current_stock column, returning the new optimum (only the supplements that differ are touched)
+  def update_current_stock(self, current_stock):
+    current_stock = np.asarray(current_stock, dtype=np.float64)
+    changed = np.flatnonzero(current_stock != self.current_stock)
+    if not len(changed):
+      return self.solution()
+
+    new_stock = current_stock[changed]
+    validate_columns({'current_stock': new_stock})
+
+    self.updates += 1
+    if self.index is None:
+      self.current_stock[changed] = new_stock
+      return self.solution()
+
+    removed = self.contribution(changed, self.current_stock[changed])
+    added = self.contribution(changed, new_stock)
+    self.objective += added - removed
+    self.current_stock[changed] = new_stock
+
+    # Bound on the rounding error each update adds: the freshly summed contributions, plus the subtraction and addition
+    eps = np.finfo(np.float64).eps
+    self.error += eps * (len(changed) + 2) * (np.abs(removed).max() + np.abs(added).max() + np.abs(self.objective).max())
+
+    index = self.best_index()
+    if index == self.index:
+      self.bottles[changed] = self.bottles_at(index, changed)
+    else:
+      self.index = index
+      self.bottles = self.bottles_at(index)
+      self.resolves += 1
+
+    return self.solution()
@@ -0,0 +1,34 @@
+# NOTE: pulp, NumPy and tabulate take a good chunk of the startup time of every entry point, yet `-h` or a bad argument
+# never needs them (nor does a cached/vectorized engine need pulp). Rather than importing them at module load, modules
+# bind them through here, so they're only actually imported the first time something on the code path uses them.
+#
+# Usage:
+#   pulp = lazy_import('pulp')
+#   np = lazy_import('numpy')
+#   from lazy_imports import tabulate
+
+import importlib.util
+import sys
+
+# A module that's only executed on its first attribute access (or the module itself, if something already imported it)
+def lazy_import(name):
+  if name in sys.modules:
+    return sys.modules[name]
+
+  spec = importlib.util.find_spec(name)
+  if spec is None:
+    raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+
+  loader = importlib.util.LazyLoader(spec.loader)
+  spec.loader = loader
+  module = importlib.util.module_from_spec(spec)
+  sys.modules[name] = module
+  loader.exec_module(module)
+
+  return module
+
+# tabulate.tabulate, imported on the first table printed
+def tabulate(*args, **kwargs):
+  from tabulate import tabulate
+
+  return tabulate(*args, **kwargs)
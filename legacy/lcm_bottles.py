@@ -1,9 +1,12 @@
 # ChatGPT ref: https://chatgpt.com/c/66ebad21-42c8-8008-b192-a651f6a6a9c5
 
+# NOTE: See cycle_search for ranking every cycle length up to a bound by its leftovers, rather than the exact LCM
+
 import math
 from functools import reduce
 from tabulate import tabulate
 
+from supplement_catalog import SupplementCatalog
 from supplements_data import supplements
 
 # Function to calculate LCM of two numbers
@@ -14,34 +17,32 @@ def lcm(a, b):
 def lcm_multiple(numbers):
   return reduce(lcm, numbers)
 
-# Calculate days of supply for each supplement (how long one bottle lasts)
-for supplement in supplements:
-  supplement["days_supply"] = supplement["bottle_size"] // supplement["daily_dose"]
+catalog = SupplementCatalog.from_records(supplements)
 
-# Extract the list of days_supply for LCM calculation
-days_supplies = [supplement["days_supply"] for supplement in supplements]
+# Columns as (exact) python ints, since the LCM of a large catalog easily overflows int64
+bottle_size = catalog.column('bottle_size').astype(object)
+daily_dose = catalog.column('daily_dose').astype(object)
+
+# Calculate days of supply for each supplement (how long one bottle lasts)
+days_supply = bottle_size // daily_dose
 
-# Calculate the overall LCM for all the supplements
-overall_lcm = lcm_multiple(days_supplies)
+# Calculate the overall LCM for all the supplements (only the distinct days_supply values matter)
+overall_lcm = lcm_multiple(sorted(set(days_supply.tolist())))
 
 # Calculate how many bottles are needed for each supplement to last the overall LCM period
-for supplement in supplements:
-  supplement["bottles_needed"] = overall_lcm // supplement["days_supply"]
+bottles_needed = overall_lcm // days_supply
 
 # # Output the results
-# for supplement in supplements:
-#   print(f"{supplement['label']}: Needs {supplement['bottles_needed']} bottles to cover {overall_lcm} days.")
+# for label, bottles in zip(catalog.labels, bottles_needed):
+#   print(f"{label}: Needs {bottles} bottles to cover {overall_lcm} days.")
 
 # Output the results
-table_data = [
-  [
-    supplement["label"],
-    supplement["daily_dose"],
-    supplement["bottle_size"],
-    supplement["days_supply"],
-    supplement["bottles_needed"]
-  ]
-  for supplement in supplements
-]
+table_data = list(zip(
+  catalog.labels,
+  daily_dose.tolist(),
+  bottle_size.tolist(),
+  days_supply.tolist(),
+  bottles_needed.tolist(),
+))
 table_headers = ["Supplement", "Daily Dose", "Bottle Size", "Days per Bottle", "Bottles Needed"]
 print(tabulate(table_data, table_headers, tablefmt="simple"))
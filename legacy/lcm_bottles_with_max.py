@@ -1,11 +1,14 @@
 # ChatGPT ref: https://chatgpt.com/c/66ebad21-42c8-8008-b192-a651f6a6a9c5
 
+# NOTE: See cycle_search for ranking every cycle length up to a bound by its leftovers, rather than the exact LCM
+
 # TODO: I'm not sure if this is actually working properly currently..
 
 import math
 from functools import reduce
 from tabulate import tabulate
 
+from supplement_catalog import SupplementCatalog
 from supplements_data import supplements
 
 # Set a maximum reference period (e.g., 360 days)
@@ -19,52 +22,54 @@ def lcm(a, b):
 def lcm_multiple(numbers):
   return reduce(lcm, numbers)
 
-# Calculate days of supply for each supplement (how long one bottle lasts)
-for supplement in supplements:
-  supplement["days_supply"] = supplement["bottle_size"] // supplement["daily_dose"]
+# Ceiling division that stays exact for python ints (unlike math.ceil(a / b))
+def ceil_div(a, b):
+  return -(-a // b)
+
+catalog = SupplementCatalog.from_records(supplements)
 
-# Extract the list of days_supply for LCM calculation
-days_supplies = [supplement["days_supply"] for supplement in supplements]
+# Columns as (exact) python ints, since the LCM of a large catalog easily overflows int64
+bottle_size = catalog.column('bottle_size').astype(object)
+daily_dose = catalog.column('daily_dose').astype(object)
 
-# Calculate the overall LCM for all the supplements
-overall_lcm = lcm_multiple(days_supplies)
+# Calculate days of supply for each supplement (how long one bottle lasts)
+days_supply = bottle_size // daily_dose
+
+# Calculate the overall LCM for all the supplements (only the distinct days_supply values matter)
+overall_lcm = lcm_multiple(sorted(set(days_supply.tolist())))
 capped_lcm = min(overall_lcm, max_period)
 
-for supplement in supplements:
-  # Calculate how many bottles are needed for each supplement to last the overall LCM period
-  # supplement["bottles_needed"] = overall_lcm / supplement["days_supply"]
-  # supplement["bottles_needed_capped"] = capped_lcm / supplement["days_supply"]
-  supplement["bottles_needed"] = math.ceil(overall_lcm / supplement["days_supply"])
-  supplement["bottles_needed_capped"] = math.ceil(capped_lcm / supplement["days_supply"])
+# Calculate how many bottles are needed for each supplement to last the overall LCM period
+# bottles_needed = overall_lcm / days_supply
+# bottles_needed_capped = capped_lcm / days_supply
+bottles_needed = ceil_div(overall_lcm, days_supply)
+bottles_needed_capped = ceil_div(capped_lcm, days_supply)
 
-  # Calculate total units consumed and excess leftover units for each supplement
-  total_units_provided = supplement["bottles_needed"] * supplement["bottle_size"]
-  total_units_provided_capped = supplement["bottles_needed_capped"] * supplement["bottle_size"]
+# Calculate total units consumed and excess leftover units for each supplement
+total_units_provided = bottles_needed * bottle_size
+total_units_provided_capped = bottles_needed_capped * bottle_size
 
-  total_units_consumed = supplement["daily_dose"] * overall_lcm
-  total_units_consumed_capped = supplement["daily_dose"] * capped_lcm
+total_units_consumed = daily_dose * overall_lcm
+total_units_consumed_capped = daily_dose * capped_lcm
 
-  supplement["leftover_units"] = total_units_provided - total_units_consumed
-  supplement["leftover_units_capped"] = total_units_provided_capped - total_units_consumed_capped
+leftover_units = total_units_provided - total_units_consumed
+leftover_units_capped = total_units_provided_capped - total_units_consumed_capped
 
 # # Output the results
-# for supplement in supplements:
-#   print(f"{supplement['label']}: Needs {supplement['bottles_needed']} bottles to cover {overall_lcm} days.")
+# for label, bottles in zip(catalog.labels, bottles_needed):
+#   print(f"{label}: Needs {bottles} bottles to cover {overall_lcm} days.")
 
 # Output the results
-table_data = [
-  [
-    supplement["label"],
-    supplement["daily_dose"],
-    supplement["bottle_size"],
-    supplement["days_supply"],
-    supplement["bottles_needed"],
-    supplement["leftover_units"],
-    supplement["bottles_needed_capped"],
-    supplement["leftover_units_capped"]
-  ]
-  for supplement in supplements
-]
+table_data = list(zip(
+  catalog.labels,
+  daily_dose.tolist(),
+  bottle_size.tolist(),
+  days_supply.tolist(),
+  bottles_needed.tolist(),
+  leftover_units.tolist(),
+  bottles_needed_capped.tolist(),
+  leftover_units_capped.tolist(),
+))
 table_headers = [
   "Supplement",
   "Daily Dose",
@@ -6,15 +6,20 @@
 
 # TODO: would it make sense to include a constraint that we want to be able to make full weeks of doses (since that's how we lay them out)
 
-from pulp import LpMaximize, LpProblem, LpVariable, lpSum, LpStatus
+from pulp import LpMaximize, LpMinimize, LpProblem, LpVariable, lpSum, LpStatus
 from tabulate import tabulate
 
+from lexicographic import print_weighting, solve_weighted
 from supplements_data import supplements
 
 # Set the weights of the 2 variables being optimised for
 w1, w2 = 10, 1
 # w1, w2 = 10, 5
 
+# Set to True to solve the objectives one at a time, in their priority order (see objectives below), rather than as the
+# weighted sum of them
+solve_lexicographically = False
+
 # Set a realistic minimum/maximum limit for the number of daily stacks (so the problem has non-infinite bounds)
 s_min = 0
 s_max = 4 * 4 * 7 # approx 4 months (4 * 4 weeks) of daily stacks
@@ -44,6 +49,14 @@ total_unused_units = lpSum(r[supp['label']] for supp in supplements)
 #   against minimizing the total unused units across all supplements (total_unused_units).
 problem += (w1 * s) - (w2 * total_unused_units)
 
+# The weights of the sum above, and its objectives in priority order for solving them one at a time instead (see
+# lexicographic)
+weights = {"w1": w1, "w2": w2}
+objectives = [
+  ("stacks", s, LpMaximize),
+  ("unused_units", total_unused_units, LpMinimize),
+]
+
 # Constraint: Min/max daily stacks
 problem += s >= s_min
 problem += s <= s_max
@@ -64,11 +77,11 @@ for supp in supplements:
   problem += r[label] == total_units_available - total_units_required
 
 # Solve the problem
-problem.solve()
+stages = solve_weighted(problem, objectives, lexicographic=solve_lexicographically)
 
 # Check if the problem was solved optimally
 if LpStatus[problem.status] == 'Optimal':
-  print(f"Objective function weights: w1={w1}, w2={w2}")
+  print_weighting(weights, stages)
   print(f"Minimum allowed number of daily stacks: {s_min}")
   print(f"Maximum allowed number of daily stacks: {s_max}")
   print(f"Optimal number of daily stacks: {int(s.varValue)}")
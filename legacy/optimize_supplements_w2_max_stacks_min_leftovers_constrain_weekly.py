@@ -8,9 +8,10 @@
 
 # TODO: would it make sense to include an optional constraint so that we don't try and buy a bottle when we only need less than 50% of it? Or is that already handled by trying to minimise the leftovers?
 
-from pulp import LpMaximize, LpProblem, LpVariable, lpSum, LpStatus
+from pulp import LpMaximize, LpMinimize, LpProblem, LpVariable, lpSum, LpStatus
 from tabulate import tabulate
 
+from lexicographic import print_weighting, solve_weighted
 from supplements_data import supplements
 
 # Set the weights of the 2 variables being optimised for
@@ -18,6 +19,10 @@ from supplements_data import supplements
 w1, w2 = 10, 5
 # w1, w2 = 1, 2
 
+# Set to True to solve the objectives one at a time, in their priority order (see objectives below), rather than as the
+# weighted sum of them
+solve_lexicographically = False
+
 # Set a realistic minimum/maximum limit for the number of daily stacks (so the problem has non-infinite bounds)
 s_min = 0
 # s_min = 1 * 4 * 7 # approx 1 month (1 * 4 weeks) of daily stacks
@@ -59,6 +64,14 @@ total_unused_units = lpSum(r[supp['label']] for supp in supplements)
 #   against minimizing the total unused units across all supplements (total_unused_units).
 problem += (w1 * s) - (w2 * total_unused_units)
 
+# The weights of the sum above, and its objectives in priority order for solving them one at a time instead (see
+# lexicographic)
+weights = {"w1": w1, "w2": w2}
+objectives = [
+  ("stacks", s, LpMaximize),
+  ("unused_units", total_unused_units, LpMinimize),
+]
+
 # TODO: attempt to reframe the problem so both objectives are in terms of units
 # total_daily_dose_units = sum(supplement["daily_dose"] for supplement in supplements)
 # problem += (w1 * (total_daily_dose_units * s)) - (w2 * total_unused_units)
@@ -88,12 +101,12 @@ for supp in supplements:
   problem += r[label] == total_units_available - total_units_required
 
 # Solve the problem
-problem.solve()
+stages = solve_weighted(problem, objectives, lexicographic=solve_lexicographically)
 
 # Check if the problem was solved optimally
 if LpStatus[problem.status] == 'Optimal':
   print(f"Enforce weekly packs: {enforce_weekly_packs}")
-  print(f"Objective function weights: w1={w1}, w2={w2}")
+  print_weighting(weights, stages)
   print(f"Minimum allowed number of daily stacks: {s_min}")
   print(f"Maximum allowed number of daily stacks: {s_max}")
   print(f"Optimal number of daily stacks: {int(s.varValue)}")
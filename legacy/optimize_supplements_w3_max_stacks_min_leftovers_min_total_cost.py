@@ -8,14 +8,19 @@
 
 # TODO: would it make sense to include an optional constraint so that we don't try and buy a bottle when we only need less than 50% of it? Or is that already handled by trying to minimise the leftovers?
 
-from pulp import LpMaximize, LpProblem, LpVariable, lpSum, LpStatus
+from pulp import LpMaximize, LpMinimize, LpProblem, LpVariable, lpSum, LpStatus
 from tabulate import tabulate
 
+from lexicographic import print_weighting, solve_weighted
 from supplements_data import supplements
 
 # Set the weights of the 3 variables being optimized for
 w1, w2, w3 = 10, 5, 5
 
+# Set to True to solve the objectives one at a time, in their priority order (see objectives below), rather than as the
+# weighted sum of them
+solve_lexicographically = False
+
 # Set a realistic minimum/maximum limit for the number of daily stacks (so the problem has non-infinite bounds)
 # s_min = 0
 s_min = 1 * 4 * 7 # approx 1 month (1 * 4 weeks) of daily stacks
@@ -62,6 +67,15 @@ total_cost = lpSum(supp['bottle_cost'] * x[supp['label']] for supp in supplement
 #   minimizing the total cost (total_cost), and minimizing the total unused units (total_unused_units).
 problem += (w1 * s) - (w2 * total_unused_units) - (w3 * total_cost)
 
+# The weights of the sum above, and its objectives in priority order for solving them one at a time instead (see
+# lexicographic)
+weights = {"w1": w1, "w2": w2, "w3": w3}
+objectives = [
+  ("stacks", s, LpMaximize),
+  ("unused_units", total_unused_units, LpMinimize),
+  ("total_cost", total_cost, LpMinimize),
+]
+
 # Constraint: Min/max daily stacks
 problem += s >= s_min
 problem += s <= s_max
@@ -91,13 +105,13 @@ for supp in supplements:
   problem += r[label] == total_units_available - total_units_required
 
 # Solve the problem
-problem.solve()
+stages = solve_weighted(problem, objectives, lexicographic=solve_lexicographically)
 
 # Check if the problem was solved optimally
 if LpStatus[problem.status] == 'Optimal':
   print(f"Enforce weekly packs: {enforce_weekly_packs}")
   print(f"Require free shipping: {require_free_shipping}")
-  print(f"Objective function weights: w1={w1}, w2={w2}, w3={w3}")
+  print_weighting(weights, stages)
   print(f"Minimum allowed number of daily stacks: {s_min}")
   print(f"Maximum allowed number of daily stacks: {s_max}")
   print(f"Optimal number of daily stacks: {int(s.varValue)}")
@@ -0,0 +1,99 @@
+# NOTE: The legacy w2/w3 scripts fold maximizing stacks, minimizing leftovers and minimizing total cost into a single
+# weighted sum, where the weights are fragile (a big enough cost difference can outweigh a stack) and mixing their
+# scales makes the solver's numerics worse. Solving lexicographically gives exact priority semantics instead: solve for
+# the first objective, fix its optimum as a constraint, then solve for the next objective on the same live model, and
+# so on. Each stage warm starts (with CBC) from the previous stage's solution, which stays feasible once that stage's
+# optimum is fixed, and the model is never rebuilt.
+#
+# The legacy scripts hand solve_weighted their objectives in an explicit priority order, which solves either the
+# weighted sum they set up as they always have, or (with their solve_lexicographically flag) each objective in turn in
+# that order. The weights only ever scale the weighted sum, so retuning them can't reorder the stages.
+#
+# Usage:
+#   stages = solve_lexicographic(problem, [("stacks", s, LpMaximize), ("total_cost", total_cost, LpMinimize)])
+#   stages = solve_weighted(problem, objectives, lexicographic=solve_lexicographically)
+
+from collections import namedtuple
+
+from lazy_imports import lazy_import
+from solver_options import DEFAULT_SOLVER_OPTIONS
+
+pulp = lazy_import('pulp')
+
+# Slack allowed when fixing a stage's optimum, so the solver's round-off can't make the next stage infeasible
+FIX_TOLERANCE = 1e-6
+
+# Outcome of a single stage: its status and the optimal value of its objective
+LexicographicStage = namedtuple("LexicographicStage", ["name", "status", "value"])
+
+# Solve a PuLP problem for each (name, expression, sense) objective in priority order, fixing each optimum (give or take
+# relative_slack of it) before moving on to the next. Stops at the first stage without a solution, and returns the
+# stages solved. The problem is left with the last stage's solution, but its own objective and constraints.
+def solve_lexicographic(problem, objectives, solver_options=None, relative_slack=0.0, msg=False):
+  solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+
+  objective, sense = problem.objective, problem.sense
+  fixed = []
+  stages = []
+
+  try:
+    for stage, (name, expression, stage_sense) in enumerate(objectives):
+      problem.sense = stage_sense
+      problem.setObjective(expression)
+
+      problem.solve(solver_options.solver(msg=msg, warm_start=stage > 0))
+
+      status = pulp.LpStatus[problem.status]
+      if status != 'Optimal':
+        stages.append(LexicographicStage(name, status, None))
+        break
+
+      # Stopped early (eg. on the time limit) with a solution that isn't proven optimal, which is still fine to fix
+      if problem.sol_status == pulp.LpSolutionIntegerFeasible:
+        status = 'Feasible'
+
+      value = pulp.value(expression)
+      stages.append(LexicographicStage(name, status, value))
+
+      # Hold this stage's objective at its optimum for the stages after it
+      if stage < len(objectives) - 1:
+        slack = max(FIX_TOLERANCE, relative_slack * abs(value))
+        if stage_sense == pulp.LpMaximize:
+          constraint = expression >= value - slack
+        else:
+          constraint = expression <= value + slack
+
+        constraint_name = f"Lexicographic_{name}"
+        problem += constraint, constraint_name
+        fixed.append(constraint_name)
+  finally:
+    # Put the model back as we found it, so it can be solved again
+    for constraint_name in fixed:
+      del problem.constraints[constraint_name]
+    problem.objective, problem.sense = objective, sense
+
+  return stages
+
+# Print each stage's result
+def print_stages(stages):
+  for stage in stages:
+    value = "N/A" if stage.value is None else f"{stage.value:.2f}"
+    print(f"  {stage.name}: {value} ({stage.status})")
+
+# Solve a problem set up with the weighted sum of its (name, expression, sense) objectives, or with lexicographic, each
+# of them in turn in the priority order given. Returns the lexicographic stages solved (None for the weighted sum).
+def solve_weighted(problem, objectives, lexicographic=False):
+  if not lexicographic:
+    problem.solve()
+    return None
+
+  return solve_lexicographic(problem, objectives)
+
+# Print how solve_weighted solved the problem: the weights (by name) of the weighted sum, or each lexicographic stage's
+# result
+def print_weighting(weights, stages):
+  if stages is None:
+    print(f"Objective function weights: {', '.join(f'{name}={weight}' for name, weight in weights.items())}")
+  else:
+    print("Lexicographic objectives (in priority order):")
+    print_stages(stages)
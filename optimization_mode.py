@@ -0,0 +1,32 @@
+from enum import Enum
+
+class OptimizationMode(Enum):
+  LEFTOVER_UNITS = "leftover_units"
+  LEFTOVER_UNITS_COST = "leftover_units_cost"
+  ADJUSTED_LEFTOVER_UNITS = "adjusted_leftover_units"
+  ADJUSTED_LEFTOVER_UNITS_COST = "adjusted_leftover_units_cost"
+
+# Modes that only count the leftovers of supplements we actually purchased bottles of
+ADJUSTED_MODES = {
+  OptimizationMode.ADJUSTED_LEFTOVER_UNITS,
+  OptimizationMode.ADJUSTED_LEFTOVER_UNITS_COST,
+}
+
+# Modes that weight leftover units by their per-unit cost
+COST_MODES = {
+  OptimizationMode.LEFTOVER_UNITS_COST,
+  OptimizationMode.ADJUSTED_LEFTOVER_UNITS_COST,
+}
+
+# Map CLI argument to OptimizationMode enum
+def get_mode_enum(mode_str):
+  if mode_str == "leftover_units":
+    return OptimizationMode.LEFTOVER_UNITS
+  elif mode_str == "leftover_units_cost":
+    return OptimizationMode.LEFTOVER_UNITS_COST
+  elif mode_str == "adjusted_leftover_units":
+    return OptimizationMode.ADJUSTED_LEFTOVER_UNITS
+  elif mode_str == "adjusted_leftover_units_cost":
+    return OptimizationMode.ADJUSTED_LEFTOVER_UNITS_COST
+  else:
+    raise ValueError(f"Unknown mode: {mode_str}")
@@ -1,3 +1,5 @@
+import math
+
 import pulp
 from tabulate import tabulate
 
@@ -18,7 +20,21 @@ max_stacks = 365  # Maximum number of stacks (days)
 min_usage_pct = 0.1  # Minimum usage percentage of the last bottle
 # min_usage_pct = 0.6  # Minimum usage percentage of the last bottle
 
-M = 100000  # Big M for big-M method
+M = 100000  # Global big M for big-M method (only used when tight_big_m is False)
+tight_big_m = True  # Derive the tightest valid big M for each supplement instead of using the global M
+
+# Tightest valid big M values for a supplement:
+#   - the most bottles we'd ever buy is just enough to cover max_stacks (any more would leave more than a whole bottle
+#     over, breaking the usage % constraint)
+#   - without a purchase, the most leftover units we could have is the current stock left over after min_stacks
+def big_m(supp):
+  if not tight_big_m:
+    return M, M
+
+  max_bottles = math.ceil(max(0, max_stacks * supp['daily_dose'] - supp['current_stock']) / supp['bottle_size'])
+  max_leftover = max(0, supp['current_stock'] - min_stacks * supp['daily_dose'])
+
+  return max_bottles, max_leftover
 
 # Initialize the LP problem
 prob = pulp.LpProblem("SupplementPurchasing", pulp.LpMinimize)
@@ -40,6 +56,7 @@ for supp in supplements:
   daily_dose = supp['daily_dose']
   bottle_size = supp['bottle_size']
   current_stock = supp['current_stock']
+  bottles_m, leftover_m = big_m(supp)
 
   # Ensure total available units cover the required units
   prob += (
@@ -53,7 +70,7 @@ for supp in supplements:
     f"PurchaseIndicatorLowerBound_{label}"
   )
   prob += (
-    bottles_purchased[label] <= M * purchase_indicator[label],
+    bottles_purchased[label] <= bottles_m * purchase_indicator[label],
     f"PurchaseIndicatorUpperBound_{label}"
   )
 
@@ -73,7 +90,7 @@ for supp in supplements:
     (purchase_indicator[label] * (1 - min_usage_pct) * bottle_size)
     +
     # When bottles not purchased, use big M to make this constraint irrelevant
-    ((1 - purchase_indicator[label]) * M),
+    ((1 - purchase_indicator[label]) * leftover_m),
     f"LeftoverUnitsUsagePercentConstraint_{label}"
   )
 
@@ -87,7 +104,7 @@ print("Configuration:")
 print(f"  min_stacks={min_stacks}")
 print(f"  max_stacks={max_stacks}")
 print(f"  min_usage_pct={min_usage_pct}")
-print(f"  M={M}")
+print(f"  M={'per-supplement (tight)' if tight_big_m else M}")
 
 # Check the solution status
 status = pulp.LpStatus[prob.status]
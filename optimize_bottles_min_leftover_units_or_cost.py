@@ -3,117 +3,105 @@
 #   version (or some other way) to decide if we calculate it? Then we would be optimising based on the actual cost to buy more, not counting what we
 #   already have on hand. Will it make much real world difference either way?
 
-# TODO: Add an optional constraint for free shipping (>$80)
-#   # Set to True to require free shipping (total cost must be > $80)
-#   require_free_shipping = True
-#
-#   # Compute total cost of bottles purchased
-#   total_cost = lpSum(supp['bottle_cost'] * x[supp['label']] for supp in supplements)
-#
-#   # Compute total cost of unused supplements
-#   unused_cost = lpSum((supp['bottle_cost'] / supp['bottle_size']) * unused_units[supp['label']] for supp in supplements)
-#
-#   # Conditional constraint: Require free shipping if the total cost must be greater than $80
-#   if require_free_shipping:
-#     problem += total_cost >= 80
+import contextlib
+import math
+
+from free_shipping import free_shipping_bottles
+from lazy_imports import lazy_import
+from optimization_mode import ADJUSTED_MODES, OptimizationMode
+from optimizer import optimize as optimize_with_model, run_cli
+from profiling import NULL_PROFILER
+from solver_options import DEFAULT_SOLVER_OPTIONS
+from stacks_search import StacksSolution, catalog_arrays, lattice_bounds
 
-# TODO: Add an optional constraint to enforce weekly packs?
-#   # Set to True to enforce weekly packs (s must be divisible by 7)
-#   enforce_weekly_packs = False
+pulp = lazy_import('pulp')
 
-#   # Conditional variable: k Number of Weeks (only used if weekly packs are enforced)
-#   if enforce_weekly_packs:
-#     k = LpVariable('k', lowBound=0, cat='Integer')
+# Reusable MILP model: the variables and constraints are built once, after which the stack bounds, stock levels and
+# objective can all be changed in place before re-solving (warm starting CBC from the previous incumbent).
 #
-#   # Conditional constraint: Ensure that s is divisible by 7 (s = 7 * k) if weekly packs are enforced
-#   if enforce_weekly_packs:
-#     problem += stacks == 7 * k
-
-import argparse
-
-import pulp
-from tabulate import tabulate
-from enum import Enum
-
-from supplements_data import supplements
-
-class OptimizationMode(Enum):
-  LEFTOVER_UNITS = "leftover_units"
-  LEFTOVER_UNITS_COST = "leftover_units_cost"
-
-# Map CLI argument to OptimizationMode enum
-def get_mode_enum(mode_str):
-  if mode_str == "leftover_units":
-    return OptimizationMode.LEFTOVER_UNITS
-  elif mode_str == "leftover_units_cost":
-    return OptimizationMode.LEFTOVER_UNITS_COST
-  else:
-    raise ValueError(f"Unknown mode: {mode_str}")
-
-# Define CLI arguments
-def parse_args():
-  parser = argparse.ArgumentParser(description="Optimize supplement purchasing strategy.")
-
-  parser.add_argument(
-    '--min-stacks', type=int, default=7 * 4,
-    help="Minimum number of stacks (default: 7 * 4 days)"
-  )
-  parser.add_argument(
-    '--max-stacks', type=int, default=7 * 4 * 2,
-    help="Maximum number of stacks (default: 7 * 4 * 2 days)"
-  )
-  parser.add_argument(
-    '--mode', type=str, choices=['leftover_units', 'leftover_units_cost'], default='leftover_units',
-    help="Optimization mode: 'leftover_units' or 'leftover_units_cost' (default: 'leftover_units_cost')"
-  )
-  # parser.add_argument(
-  #   '--require-free-shipping', action='store_true',
-  #   help="Optional: Require free shipping if total cost exceeds $80"
-  # )
-  # parser.add_argument(
-  #   '--enforce-weekly-packs', action='store_true',
-  #   help="Optional: Enforce weekly packs (stacks divisible by 7)"
-  # )
-
-  return parser.parse_args()
+# The 'compact' build substitutes the leftover units/cost definitions directly into the constraints and objective rather
+# than creating variables (and equality constraints) for them, so only the decision variables that matter are emitted.
+# The reported quantities are recomputed from stacks/bottles after the solve either way.
+class PurchaseModel:
+  def __init__(
+    self, supplements, min_stacks, max_stacks, mode,
+    compact=False, profiler=None, free_shipping_threshold=None, stacks_multiple=1, stacks_offset=0,
+  ):
+    self.compact = compact
+    self.free_shipping_threshold = free_shipping_threshold
+    self.stacks_multiple = stacks_multiple
+    self.stacks_offset = stacks_offset
+    self.profiler = profiler or NULL_PROFILER
+
+    # Our own copy of the catalog, kept in sync with any stock level changes
+    self.supplements = [dict(supp) for supp in supplements]
+    self.supplements_by_label = {supp['label']: supp for supp in self.supplements}
+
+    # Previous optimal stacks value, used to warm start the next solve
+    self.incumbent_stacks = None
+
+    # Initialize the LP problem
+    self.prob = pulp.LpProblem("SupplementPurchasing", pulp.LpMinimize)
+
+    with self.profiler.phase('variables'):
+      # Decision variable: number of stacks (integer between min_stacks and max_stacks). On a stacks lattice (eg. whole
+      # weeks), stacks is stacks_multiple * StacksSteps + stacks_offset instead, substituted in everywhere, so CBC only
+      # branches over the steps rather than around a divisibility constraint
+      if stacks_multiple == 1 and stacks_offset == 0:
+        self.stacks_variable = self.stacks = pulp.LpVariable("Stacks", cat='Integer')
+      else:
+        self.stacks_variable = pulp.LpVariable("StacksSteps", cat='Integer')
+        self.stacks = stacks_multiple * self.stacks_variable + stacks_offset
+      self.bound_stacks(min_stacks, max_stacks)
 
-# Main function
-def main():
-  args = parse_args()
+      self.add_variables()
+
+    # Each supplement's constraints, kept so they can be rebuilt in place when the stack bounds or stock levels change
+    self.supplement_constraints = {}
 
-  # Parameters from CLI arguments
-  min_stacks = args.min_stacks     # Minimum number of stacks (days)
-  max_stacks = args.max_stacks     # Maximum number of stacks (days)
-  mode = get_mode_enum(args.mode)
-  # require_free_shipping = args.require_free_shipping
-  # enforce_weekly_packs = args.enforce_weekly_packs
+    # Constraints and Objective Function
+    with self.profiler.phase('constraints'):
+      constraints = [(supp, self.build_supplement_constraints(supp)) for supp in self.supplements]
+    with self.profiler.phase('add_constraints'):
+      for supp, supp_constraints in constraints:
+        self.add_supplement_constraints(supp, supp_constraints)
 
-  # Initialize the LP problem
-  prob = pulp.LpProblem("SupplementPurchasing", pulp.LpMinimize)
+      # Require free shipping: the total cost of the bottles purchased must reach the threshold
+      if free_shipping_threshold is not None:
+        total_cost = pulp.lpSum(self.bottles_purchased[supp['label']] * supp['bottle_cost'] for supp in self.supplements)
+        self.prob += total_cost >= free_shipping_threshold, "FreeShipping"
 
-  # Decision variable: number of stacks (integer between min_stacks and max_stacks)
-  stacks = pulp.LpVariable("Stacks", lowBound=min_stacks, upBound=max_stacks, cat='Integer')
+    with self.profiler.phase('objective'):
+      self.set_mode(mode)
 
-  # Decision variables: number of bottles to purchase (integer >=0) and leftover units (continuous >=0) for each supplement
-  bottles_purchased = {supp['label']: pulp.LpVariable(f"BottlesPurchased_{supp['label']}", lowBound=0, cat='Integer') for supp in supplements}
-  leftover_units = {supp['label']: pulp.LpVariable(f"LeftoverUnits_{supp['label']}", lowBound=0, cat='Continuous') for supp in supplements}
-  leftover_units_cost = {supp['label']: pulp.LpVariable(f"LeftoverUnitsCost_{supp['label']}", lowBound=0, cat='Continuous') for supp in supplements}
+  def add_variables(self):
+    supplements = self.supplements
 
-  # TODO
-  # # Optional constraint for free shipping (>$80)
-  # if require_free_shipping:
-  #   total_cost = pulp.lpSum(bottles_purchased[supp['label']] * supp['bottle_cost'] for supp in supplements)
-  #   prob += total_cost >= 80, "FreeShippingConstraint"
+    # Decision variables: number of bottles to purchase (integer >=0) and leftover units (continuous >=0) for each supplement
+    self.bottles_purchased = {supp['label']: pulp.LpVariable(f"BottlesPurchased_{supp['label']}", lowBound=0, cat='Integer') for supp in supplements}
 
-  # TODO
-  # # Optional constraint to enforce weekly packs (divisible by 7)
-  # if enforce_weekly_packs:
-  #   weekly_packs = pulp.LpVariable('k', lowBound=0, cat='Integer')
-  #   prob += stacks == 7 * k, "WeeklyPacksConstraint"
+    if not self.compact:
+      self.leftover_units = {supp['label']: pulp.LpVariable(f"LeftoverUnits_{supp['label']}", lowBound=0, cat='Continuous') for supp in supplements}
+      self.leftover_units_cost = {supp['label']: pulp.LpVariable(f"LeftoverUnitsCost_{supp['label']}", lowBound=0, cat='Continuous') for supp in supplements}
 
-  # Constraints and Objective Function
+  # Leftover units for a supplement: a variable in the full model, or its definition substituted in the compact one
+  def leftover_units_expression(self, supp):
+    if self.compact:
+      return supp['current_stock'] + (self.bottles_purchased[supp['label']] * supp['bottle_size']) - (self.stacks * supp['daily_dose'])
+
+    return self.leftover_units[supp['label']]
+
+  def leftover_units_cost_expression(self, supp):
+    if self.compact:
+      return self.leftover_units_expression(supp) * (supp['bottle_cost'] / supp['bottle_size'])
+
+    return self.leftover_units_cost[supp['label']]
+
+  # Constraints (and their names) for a single supplement, built from its current stock level and the stack bounds
+  def build_supplement_constraints(self, supp):
+    stacks = self.stacks
+    bottles_purchased = self.bottles_purchased
 
-  for supp in supplements:
     label = supp['label']
     daily_dose = supp['daily_dose']
     bottle_size = supp['bottle_size']
@@ -121,137 +109,188 @@ def main():
     current_stock = supp['current_stock']
 
     # Ensure total available units cover the required units
-    prob += (
+    constraints = [(
       current_stock + (bottles_purchased[label] * bottle_size) >= stacks * daily_dose,
       f"Balance_{label}"
-    )
+    )]
+
+    # The compact model uses the definitions below directly, with Balance_* keeping the leftover units non-negative
+    if self.compact:
+      return constraints
+
+    leftover_units = self.leftover_units
+    leftover_units_cost = self.leftover_units_cost
 
     # Define leftover units
-    prob += (
+    constraints.append((
       leftover_units[label] == current_stock + (bottles_purchased[label] * bottle_size) - (stacks * daily_dose),
       f"LeftoverUnits_{label}"
-    )
+    ))
 
     # Ensure leftover units are non-negative
     # TODO: Since we set lowBound=0 when defining it, I'm not sure we explicitly need to add this constraint here?
-    prob += (
+    constraints.append((
       leftover_units[label] >= 0,
       f"NonNegativeLeftover_{label}"
-    )
+    ))
 
     # Define leftover units cost
-    prob += (
+    constraints.append((
       leftover_units_cost[label] == leftover_units[label] * (bottle_cost / bottle_size),
       f"LeftoverUnitsCost_{label}"
-    )
+    ))
+
+    return constraints
+
+  def add_supplement_constraints(self, supp, constraints):
+    for constraint, name in constraints:
+      self.prob += constraint, name
+
+    self.supplement_constraints.setdefault(supp['label'], []).extend(constraint for constraint, _ in constraints)
+
+  # Rebuild a supplement's constraints in place, keeping their names and position in the model
+  def refresh_supplement_constraints(self, supp):
+    replacements = self.build_supplement_constraints(supp)
+
+    for constraint, (replacement, _) in zip(self.supplement_constraints[supp['label']], replacements):
+      constraint.clear()
+      constraint.update(replacement)
+      constraint.constant = replacement.constant
+
+  # Objective expression and name for the given mode
+  def objective(self, mode):
+    if mode == OptimizationMode.LEFTOVER_UNITS:
+      # Objective function: Minimize total leftover units
+      return pulp.lpSum([self.leftover_units_expression(supp) for supp in self.supplements]), "MinimizeTotalLeftoverUnits"
+    elif mode == OptimizationMode.LEFTOVER_UNITS_COST:
+      # Objective function: Minimize total cost of leftover units
+      return pulp.lpSum([self.leftover_units_cost_expression(supp) for supp in self.supplements]), "MinimizeTotalLeftoverUnitsCost"
+    else:
+      raise ValueError(f"Unknown optimization mode: {mode}")
 
   # Set the optimization objective based on the selected mode
-  if mode == OptimizationMode.LEFTOVER_UNITS:
-    # Objective function: Minimize total leftover units
-    prob += pulp.lpSum([leftover_units[label] for label in leftover_units]), "MinimizeTotalLeftoverUnits"
-  elif mode == OptimizationMode.LEFTOVER_UNITS_COST:
-    # Objective function: Minimize total cost of leftover units
-    prob += pulp.lpSum([leftover_units_cost[label] for label in leftover_units]), "MinimizeTotalLeftoverUnitsCost"
-  else:
-    raise ValueError(f"Unknown optimization mode: {mode}")
-
-  # Solve the problem
-  prob.solve()
-
-  # TODO: should we iterate over the CLI args here instead of manually hardcoding what we're outputting?
-  print("Configuration:")
-  print(f"  min_stacks={min_stacks}")
-  print(f"  max_stacks={max_stacks}")
-  print(f"  mode={mode}")
-
-  # Check the solution status
-  status = pulp.LpStatus[prob.status]
-  print("\nStatus:", pulp.LpStatus[prob.status])
-
-  if status != 'Optimal':
-    print(f"\nProblem could not be solved optimally.")
-  else:
-    # Print the results
-    table = []
-    total_cost = 0
-    total_leftover_cost = 0
-
-    for supp in supplements:
+  def set_mode(self, mode):
+    expression, name = self.objective(mode)
+    self.prob.setObjective(expression)
+    self.prob.objective.name = name
+    self.mode = mode
+
+  # Bound the stacks variable, keeping the first and last stacks values on the lattice within the bounds (min_stacks >
+  # max_stacks if there are none)
+  def bound_stacks(self, min_stacks, max_stacks):
+    self.min_stacks, self.max_stacks = lattice_bounds(min_stacks, max_stacks, self.stacks_multiple, self.stacks_offset)
+    self.stacks_variable.lowBound = (self.min_stacks - self.stacks_offset) // self.stacks_multiple
+    self.stacks_variable.upBound = (self.max_stacks - self.stacks_offset) // self.stacks_multiple
+
+  def set_stack_bounds(self, min_stacks, max_stacks):
+    self.bound_stacks(min_stacks, max_stacks)
+
+  # Update current_stock for some supplements (mapping of label to units on hand)
+  def set_current_stock(self, current_stock):
+    for label, stock in current_stock.items():
+      supp = self.supplements_by_label[label]
+      supp['current_stock'] = stock
+      self.refresh_supplement_constraints(supp)
+
+    # The compact objective has current_stock substituted into it, so rebuild it too
+    if self.compact:
+      self.set_mode(self.mode)
+
+  # Fewest bottles covering the given stacks value for a supplement, and the leftover units that leaves
+  @staticmethod
+  def bottles_and_leftover(supp, stacks):
+    bottles = math.ceil(max(0, stacks * supp['daily_dose'] - supp['current_stock']) / supp['bottle_size'])
+    leftover = supp['current_stock'] + bottles * supp['bottle_size'] - stacks * supp['daily_dose']
+
+    return bottles, leftover
+
+  # Bottles to seed the warm start with at the given stacks value: the fewest covering it, or with free shipping
+  # required, the ones whose total cost reaches the threshold for the least leftovers (see free_shipping)
+  def initial_bottles(self, stacks):
+    bottles = [self.bottles_and_leftover(supp, stacks)[0] for supp in self.supplements]
+    if self.free_shipping_threshold is None:
+      return bottles
+
+    free_shipping = free_shipping_bottles(
+      stacks, *catalog_arrays(self.supplements), self.mode, self.free_shipping_threshold,
+    )
+    # The threshold can't be reached at all, so there's no feasible solution to seed
+    return bottles if free_shipping is None else free_shipping.tolist()
+
+  # Seed every variable with a feasible solution for the given stacks value, so CBC can warm start from it, returning
+  # the bottles purchased it seeds
+  def set_initial_values(self, stacks):
+    self.stacks_variable.setInitialValue((stacks - self.stacks_offset) // self.stacks_multiple)
+
+    bottles = self.initial_bottles(stacks)
+    for supp, supp_bottles in zip(self.supplements, bottles):
       label = supp['label']
-      daily_dose = supp['daily_dose']
-      bottle_size = supp['bottle_size']
-      current_stock = supp['current_stock']
-      bottle_cost = supp['bottle_cost']
-
-      purchased_bottles = int(bottles_purchased[label].varValue)
-      total_units_available = current_stock + purchased_bottles * bottle_size
-      total_units_needed = stacks.varValue * daily_dose
-
-      leftover = leftover_units[label].varValue
-      leftover_cost = leftover_units_cost[label].varValue
-      total_leftover_cost += leftover_cost
-
-      cost = purchased_bottles * bottle_cost
-      total_cost += cost
-
-      if purchased_bottles > 0:
-          # Calculate leftover and usage percentage relative to a purchased bottle
-          leftover_pct = f"{leftover / bottle_size * 100:.2f}%"
-          usage_pct = f"{(1 - (leftover / bottle_size)) * 100:.2f}%"
-      else:
-        # No bottles purchased, leftover_pct and usage_pct should be N/A
-        leftover_pct = "N/A"
-        usage_pct = "N/A"
-
-      table.append([
-        label,
-        daily_dose,
-        current_stock,
-        purchased_bottles,
-        bottle_size,
-        total_units_available,
-        total_units_needed,
-        leftover,
-        leftover_pct,
-        usage_pct,
-        f"${bottle_cost:.2f}",
-        f"${cost:.2f}",
-        f"${leftover_cost:.2f}",
-      ])
-
-    headers = [
-      "Supplement",
-      "Daily Dose",
-      "Current Stock",
-      "Bottles Purchased",
-      "Bottle Size",
-      "Total Units Available",
-      "Total Units Needed",
-      "Leftover Units",
-      "Leftover %",
-      "Usage %",
-      "Bottle Cost",
-      "Total Cost",
-      "Leftover Cost",
-    ]
-
-    print(f"\nFull Results Table:\n")
-    print(f"{tabulate(table, headers=headers)}")
-
-    # Filter for entries where bottles were purchased
-    filtered_table = [row for row in table if row[3] > 0]  # row[3] corresponds to 'Bottles Purchased'
-
-    # Print the filtered table with only purchased bottles
-    if filtered_table:
-      print(f"\nFiltered Table (Bottles to purchase):\n")
-      print(f"{tabulate(filtered_table, headers=headers)}")
+      leftover = supp['current_stock'] + supp_bottles * supp['bottle_size'] - stacks * supp['daily_dose']
+
+      self.bottles_purchased[label].setInitialValue(supp_bottles)
+      if not self.compact:
+        self.leftover_units[label].setInitialValue(leftover)
+        self.leftover_units_cost[label].setInitialValue(leftover * (supp['bottle_cost'] / supp['bottle_size']))
+
+    return bottles
+
+  def solve(self, msg=False, log_path=None, solver_options=None):
+    solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+    min_stacks, max_stacks = self.min_stacks, self.max_stacks
+    # No stacks value on the lattice within the bounds
+    if min_stacks > max_stacks:
+      return StacksSolution("Infeasible", None, None, None)
+
+    # Warm start from the previous incumbent, moved back inside the current stack bounds so it stays feasible
+    warm_start = self.incumbent_stacks is not None
+    if warm_start:
+      with self.profiler.phase('warm_start'):
+        self.set_initial_values(min(max(self.incumbent_stacks, min_stacks), max_stacks))
+
+    # Solve the problem (when profiling, CBC always logs to a file, which the profiler echoes if msg is set)
+    if solver_options.backend == 'cbc':
+      solver_log = self.profiler.solver_log(log_path, msg)
     else:
-      print("\nNo bottles to purchase in the solution.")
+      solver_log = contextlib.nullcontext(log_path)
+
+    with solver_log as solver_log_path:
+      solver = solver_options.solver(msg=msg and solver_log_path is None, warm_start=warm_start, log_path=solver_log_path)
+
+      with (
+        self.profiler.phase('cbc'),
+        self.profiler.instrument(self.prob, 'writeMPS', 'write_mps'),
+        self.profiler.instrument(solver, 'writesol', 'write_warm_start'),
+        self.profiler.instrument(solver, 'readsol_MPS', 'read_solution'),
+      ):
+        self.prob.solve(solver)
+
+    status = pulp.LpStatus[self.prob.status]
+    if status != 'Optimal':
+      return StacksSolution(status, None, None, None)
+
+    # Stopped early (eg. on the time limit) with a solution that isn't proven optimal
+    if self.prob.sol_status == pulp.LpSolutionIntegerFeasible:
+      status = 'Feasible'
+
+    self.incumbent_stacks = int(round(pulp.value(self.stacks)))
+
+    return StacksSolution(
+      status,
+      self.incumbent_stacks,
+      [int(self.bottles_purchased[supp['label']].varValue) for supp in self.supplements],
+      pulp.value(self.prob.objective),
+    )
 
-    print(f"\nTotal Cost: ${total_cost:.2f}")
-    print(f"Total Leftover Cost: ${total_leftover_cost:.2f}")
+# Optimize the purchasing strategy for a catalog of supplements with this model, returning a structured PurchasePlan
+# (see optimizer.optimize for the options)
+def optimize(supplements, min_stacks, max_stacks, mode, **options):
+  return optimize_with_model(PurchaseModel, supplements, min_stacks, max_stacks, mode, **options)
 
-    print(f"\nOptimal number of stacks (days): {int(stacks.varValue)} (approx {stacks.varValue / 7:.2f} weeks)")
+# Main function
+def main():
+  # This model only counts the leftovers of every supplement, so it has no adjusted modes (or leftovers to report)
+  modes = [mode.value for mode in OptimizationMode if mode not in ADJUSTED_MODES]
+  run_cli(PurchaseModel, "Optimize supplement purchasing strategy.", modes, show_adjusted=False)
 
 if __name__ == "__main__":
   main()
@@ -0,0 +1,172 @@
+# NOTE: Both MILP formulations (optimize_bottles_min_leftover_units_or_cost and its _of_leftover_bought extension) are
+# run the same way, and only differ in their PurchaseModel and the modes it supports. This holds that shared driver:
+# optimize() solves a catalog with any of the engines (building the given model class for the 'milp' one), going
+# through the plan cache when there is one, and run_cli() is the whole command line tool around it.
+#
+# Usage:
+#   plan = optimize(PurchaseModel, supplements, 28, 56, OptimizationMode.LEFTOVER_UNITS_COST, engine='sweep')
+#   run_cli(PurchaseModel, "Optimize supplement purchasing strategy.", ['leftover_units', 'leftover_units_cost'])
+
+import argparse
+import sys
+
+from array_model import solve_array_model
+from catalog_io import add_catalog_argument
+from free_shipping import add_free_shipping_arguments, free_shipping_stacks, free_shipping_threshold
+from optimization_mode import get_mode_enum
+from plan_cache import DEFAULT_MAX_ENTRIES, PlanCache, cache_key
+from profiling import NULL_PROFILER, Profiler
+from purchase_plan import make_plan
+from report_writers import add_report_arguments, machine_readable_stdout, write_report
+from solver_options import DEFAULT_SOLVER_OPTIONS, SolverOptions, add_solver_arguments
+from stacks_search import SEARCH_ENGINES, add_stacks_lattice_arguments
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements as default_supplements
+
+# Define CLI arguments, offering the given modes
+def parse_args(description, modes):
+  parser = argparse.ArgumentParser(description=description)
+
+  parser.add_argument(
+    '--min-stacks', type=int, default=7 * 4,
+    help="Minimum number of stacks (default: 7 * 4 days)"
+  )
+  parser.add_argument(
+    '--max-stacks', type=int, default=7 * 4 * 2,
+    help="Maximum number of stacks (default: 7 * 4 * 2 days)"
+  )
+  parser.add_argument(
+    '--mode', type=str, choices=modes, default='leftover_units',
+    help="Optimization mode (default: 'leftover_units_cost')"
+  )
+  parser.add_argument(
+    '--engine', type=str, choices=['milp', 'array', *SEARCH_ENGINES], default='milp',
+    help="Solver engine: 'milp' (MILP via PuLP, solved with --solver), 'array' (the compact MILP built from NumPy arrays and solved by CBC directly), 'sweep' (direct vectorized search over every stacks value) or 'breakpoints' (direct search over only the stacks values where a bottle count changes) (default: 'milp')"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+  parser.add_argument(
+    '--compact', action='store_true',
+    help="Optional: Build the compact MILP, substituting the leftover units/cost definitions directly instead of creating variables and constraints for them"
+  )
+  parser.add_argument(
+    '--cache', type=str, default=None,
+    help="Optional: Path to an on-disk cache of previous solutions (SQLite), reused when the catalog, stack bounds and mode repeat"
+  )
+  parser.add_argument(
+    '--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+    help=f"Maximum number of cached solutions before the least recently used are evicted (default: {DEFAULT_MAX_ENTRIES})"
+  )
+  parser.add_argument(
+    '--profile', type=str, nargs='?', const='-', default=None, metavar='PATH',
+    help="Optional: Write a JSON breakdown of the time and memory allocated in each phase (building, writing the MPS file, CBC, parsing its solution, reporting), along with CBC's statistics, to PATH (or stderr if no PATH is given). Tracing allocations slows the run down somewhat"
+  )
+  add_report_arguments(parser)
+  add_free_shipping_arguments(parser)
+  add_stacks_lattice_arguments(parser)
+
+  return parser.parse_args()
+
+# Optimize the purchasing strategy for a catalog of supplements, building model_class (a PurchaseModel) for the 'milp'
+# engine, returning a structured PurchasePlan
+def optimize(
+  model_class, supplements, min_stacks, max_stacks, mode,
+  engine='milp', msg=False, cache=None, compact=False, profiler=None, solver_options=None, free_shipping_threshold=None,
+  stacks_multiple=1, stacks_offset=0, purchases_only=False,
+):
+  profiler = profiler or NULL_PROFILER
+  solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+  # The direct searches don't use a MILP solver at all
+  solver = None if engine in SEARCH_ENGINES else solver_options.describe()
+  lattice = {'stacks_multiple': stacks_multiple, 'stacks_offset': stacks_offset}
+
+  def solve():
+    if engine in SEARCH_ENGINES and free_shipping_threshold is not None:
+      # Both direct searches take the threshold through the same exact search over stacks values
+      with profiler.phase('solve'):
+        return free_shipping_stacks(
+          supplements, min_stacks, max_stacks, mode, free_shipping_threshold, **lattice,
+        )
+    elif engine in SEARCH_ENGINES:
+      with profiler.phase('solve'):
+        return SEARCH_ENGINES[engine](supplements, min_stacks, max_stacks, mode, **lattice)
+    elif engine == 'milp':
+      with profiler.phase('build'):
+        model = model_class(
+          supplements, min_stacks, max_stacks, mode,
+          compact=compact, profiler=profiler, free_shipping_threshold=free_shipping_threshold, **lattice,
+        )
+      with profiler.phase('solve'):
+        return model.solve(msg=msg, solver_options=solver_options)
+    elif engine == 'array':
+      return solve_array_model(
+        supplements, min_stacks, max_stacks, mode,
+        msg=msg, profiler=profiler, solver_options=solver_options, free_shipping_threshold=free_shipping_threshold,
+        **lattice,
+      )
+    else:
+      raise ValueError(f"Unknown engine: {engine}")
+
+  if cache is None:
+    solution = solve()
+  else:
+    # A MILP solve stopped within a gap of optimal may return a different solution, so the gap settings are part of the key
+    key_options = {} if engine in SEARCH_ENGINES else solver_options.cache_options()
+    # Only part of the key when set, so plans cached without them still hit
+    if free_shipping_threshold is not None:
+      key_options['free_shipping_threshold'] = free_shipping_threshold
+    if stacks_multiple != 1 or stacks_offset != 0:
+      key_options.update(lattice)
+    key = cache_key(supplements, min_stacks, max_stacks, mode, **key_options)
+
+    # On a hit, the plan reports the engine (and solver) that originally produced the cached solution
+    solution, engine, solver = cache.get_or_solve(key, engine, solve, solver)
+
+  with profiler.phase('plan'):
+    return make_plan(
+      supplements, solution, min_stacks, max_stacks, mode, engine, solver,
+      free_shipping_threshold=free_shipping_threshold, purchases_only=purchases_only, **lattice,
+    )
+
+# Command line tool for a PurchaseModel class offering the given modes, with show_adjusted reporting the adjusted
+# leftovers too
+def run_cli(model_class, description, modes, show_adjusted=True):
+  args = parse_args(description, modes)
+
+  # Parameters from CLI arguments
+  min_stacks = args.min_stacks     # Minimum number of stacks (days)
+  max_stacks = args.max_stacks     # Maximum number of stacks (days)
+  mode = get_mode_enum(args.mode)
+
+  cache = PlanCache(args.cache, max_entries=args.cache_max_entries) if args.cache else None
+
+  profiler = Profiler() if args.profile else None
+
+  # Stream the catalog in from a file, if given, straight into a columnar SupplementCatalog
+  with (profiler or NULL_PROFILER).phase('load_catalog'):
+    catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else default_supplements
+
+  plan = optimize(
+    model_class, catalog, min_stacks, max_stacks, mode,
+    engine=args.engine, msg=not machine_readable_stdout(args), cache=cache, compact=args.compact, profiler=profiler,
+    solver_options=SolverOptions.from_args(args), free_shipping_threshold=free_shipping_threshold(args),
+    stacks_multiple=args.stacks_multiple, stacks_offset=args.stacks_offset, purchases_only=args.purchases_only,
+  )
+
+  with (profiler or NULL_PROFILER).phase('report'):
+    write_report(plan, args, show_adjusted=show_adjusted)
+
+  if cache is not None:
+    stats = cache.stats()
+    # Kept out of a machine readable report on stdout
+    print(
+      f"\nCache: hits={stats['hits']} misses={stats['misses']} entries={stats['entries']}/{stats['max_entries']}",
+      file=sys.stderr if machine_readable_stdout(args) else sys.stdout,
+    )
+    cache.close()
+
+  if profiler is not None:
+    profiler.write(
+      args.profile,
+      engine=plan.engine, mode=mode.value, supplements=len(catalog), min_stacks=min_stacks, max_stacks=max_stacks,
+    )
@@ -0,0 +1,243 @@
+# NOTE: Every solve runs serially in one process, but most of our workloads are many independent solves (different
+# modes, stack bounds or inventories) over the same catalog. WorkerPool spreads them across a pool of worker processes:
+#   - Each worker is set up once by an initializer (eg. loading the catalog and building its planners), and keeps that
+#     state for every task it runs, so only the small task and its result cross the process boundary.
+#   - At most max_in_flight tasks are outstanding at once, so a long (or endless) stream of tasks is consumed only as
+#     fast as the workers get through it, and results come back in the order the tasks went in.
+#   - With a single worker (or a single core, or where worker processes can't be started) it runs everything in
+#     process instead, through exactly the same initializer and task functions.
+#
+# plan_many() uses it to plan a list of PlanTasks against one catalog. Workers send back just the StacksSolution (with
+# the bottles purchased as a compact int64 array), and the PurchasePlan is rebuilt from it in the parent.
+#
+# Usage:
+#   python parallel.py --modes leftover_units_cost adjusted_leftover_units_cost --max-stacks 56 84 112 --workers 4
+
+import argparse
+import os
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog_io import add_catalog_argument
+from free_shipping import add_free_shipping_arguments, free_shipping_threshold
+from lazy_imports import lazy_import, tabulate
+from optimization_mode import OptimizationMode, get_mode_enum
+from purchase_plan import make_plan
+from solver_options import DEFAULT_SOLVER_OPTIONS, SolverOptions, add_solver_arguments
+from stacks_search import SEARCH_ENGINES, add_stacks_lattice_arguments
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+np = lazy_import('numpy')
+
+# Per-process state set up by a pool's initializer (in each worker, or in this process when running in process)
+worker_state = {}
+
+# Most planners (ie. distinct mode/stacks lattice/free shipping threshold combinations, and engines in plan_service)
+# each worker keeps around
+MAX_PLANNERS = 16
+
+# A single solve: the mode and stack bounds, and optionally stock levels (mapping of label to units on hand) to
+# substitute into the catalog, the stacks lattice to consider (see stacks_search.lattice_bounds) and the total cost to
+# reach for free shipping (see free_shipping)
+PlanTask = namedtuple(
+  "PlanTask",
+  ["mode", "min_stacks", "max_stacks", "current_stock", "stacks_multiple", "stacks_offset", "free_shipping_threshold"],
+  defaults=(None, 1, 0, None),
+)
+
+# Pool of worker processes running tasks in order, with a bounded number in flight
+class WorkerPool:
+  def __init__(self, initializer, initargs=(), workers=None, max_in_flight=None):
+    workers = workers or os.cpu_count() or 1
+    self.max_in_flight = max_in_flight or 2 * workers
+    self.executor = None
+
+    if workers > 1:
+      try:
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+      except (OSError, NotImplementedError):
+        # eg. no working multiprocessing semaphores on this platform
+        self.executor = None
+
+    # Run in process instead
+    if self.executor is None:
+      initializer(*initargs)
+
+    self.workers = workers if self.executor is not None else 1
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    if self.executor is not None:
+      self.executor.shutdown(cancel_futures=True)
+      self.executor = None
+
+  # Apply fn (a module level function, so it can be sent to the workers) to each item, yielding the results in order.
+  # Items are only taken from the iterable as results are consumed, keeping at most max_in_flight outstanding.
+  def imap(self, fn, items):
+    if self.executor is None:
+      for item in items:
+        yield fn(item)
+      return
+
+    pending = deque()
+    for item in items:
+      pending.append(self.executor.submit(fn, item))
+      if len(pending) >= self.max_in_flight:
+        yield pending.popleft().result()
+
+    while pending:
+      yield pending.popleft().result()
+
+# Set up a worker for plan tasks: the catalog is sent (or inherited) once per worker, along with the solver settings
+def init_plan_worker(catalog, engine, compact, solver_options):
+  # Imported here as BatchPlanner lives in batch, which itself builds on this module
+  from batch import BatchPlanner
+
+  def planner(task):
+    return BatchPlanner(
+      catalog, task.min_stacks, task.max_stacks, task.mode,
+      engine=engine, compact=compact, solver_options=solver_options,
+      free_shipping_threshold=task.free_shipping_threshold, stacks_multiple=task.stacks_multiple,
+      stacks_offset=task.stacks_offset,
+    )
+
+  worker_state.clear()
+  worker_state.update(make_planner=planner, planners=OrderedDict())
+
+# Solve a PlanTask in a worker, reusing that worker's planner (and so its MILP) for the same mode, stacks lattice and
+# free shipping threshold, retargeted at the task's stack bounds, so a worker only builds one model per mode however
+# many bounds it's given
+def solve_plan_task(task):
+  key = (task.mode, task.stacks_multiple, task.stacks_offset, task.free_shipping_threshold)
+  planners = worker_state['planners']
+
+  planner = planners.pop(key, None)
+  if planner is None:
+    planner = worker_state['make_planner'](task)
+  elif (planner.min_stacks, planner.max_stacks) != (task.min_stacks, task.max_stacks):
+    planner.set_stack_bounds(task.min_stacks, task.max_stacks)
+
+  # Most recently used last, dropping the least recently used
+  planners[key] = planner
+  while len(planners) > MAX_PLANNERS:
+    planners.popitem(last=False)
+
+  solution = planner.solve(planner.snapshot_catalog(task.current_stock or {}))
+
+  # Send the bottles back as one array rather than a list of boxed ints
+  if solution.bottles_purchased is not None:
+    solution = solution._replace(bottles_purchased=np.asarray(solution.bottles_purchased, dtype=np.int64))
+
+  return solution
+
+# Plan each task against the catalog across a pool of workers, yielding a PurchasePlan per task in order
+def plan_many(catalog, tasks, engine='milp', compact=False, solver_options=None, workers=None, max_in_flight=None):
+  catalog = SupplementCatalog.from_records(catalog)
+  solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+  # The direct searches don't use a MILP solver at all
+  solver = None if engine in (*SEARCH_ENGINES, 'incremental') else solver_options.describe()
+
+  # The parent keeps the tasks it has in flight, to rebuild each plan from its solution
+  in_flight = deque()
+
+  def submitted():
+    for task in tasks:
+      in_flight.append(task)
+      yield task
+
+  with WorkerPool(
+    init_plan_worker, (catalog, engine, compact, solver_options), workers=workers, max_in_flight=max_in_flight,
+  ) as pool:
+    for solution in pool.imap(solve_plan_task, submitted()):
+      task = in_flight.popleft()
+      snapshot = catalog if task.current_stock is None else catalog.with_stock_levels(task.current_stock)
+
+      yield make_plan(
+        snapshot, solution, task.min_stacks, task.max_stacks, task.mode, engine, solver,
+        free_shipping_threshold=task.free_shipping_threshold, stacks_multiple=task.stacks_multiple,
+        stacks_offset=task.stacks_offset,
+      )
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Optimize supplement purchasing across a grid of modes and stack bounds in parallel.")
+
+  parser.add_argument(
+    '--modes', type=str, nargs='+', choices=[mode.value for mode in OptimizationMode],
+    default=[mode.value for mode in OptimizationMode],
+    help="Optimization modes to plan (default: all of them)"
+  )
+  parser.add_argument(
+    '--min-stacks', type=int, nargs='+', default=[7 * 4],
+    help="Minimum numbers of stacks to plan (default: 7 * 4 days)"
+  )
+  parser.add_argument(
+    '--max-stacks', type=int, nargs='+', default=[7 * 4 * 2],
+    help="Maximum numbers of stacks to plan (default: 7 * 4 * 2 days)"
+  )
+  parser.add_argument(
+    '--engine', type=str, choices=['milp', 'array', *SEARCH_ENGINES, 'incremental'], default='milp',
+    help="Solver engine: 'milp' (MILP via PuLP, solved with --solver), 'array' (the compact MILP built from NumPy arrays and solved by CBC directly), 'sweep' or 'breakpoints' (direct searches, without CBC), or 'incremental' (the direct search, updated with only the supplements whose stock changed between tasks) (default: 'milp')"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+  add_free_shipping_arguments(parser)
+  add_stacks_lattice_arguments(parser)
+  parser.add_argument(
+    '--compact', action='store_true',
+    help="Optional: Build the compact MILP, substituting the leftover units/cost definitions directly instead of creating variables and constraints for them"
+  )
+  parser.add_argument(
+    '--workers', type=int, default=None,
+    help="Optional: Number of worker processes, where 1 runs everything in process (default: one per core)"
+  )
+
+  args = parser.parse_args()
+  if args.engine == 'incremental' and args.require_free_shipping:
+    parser.error("--require-free-shipping isn't supported by the 'incremental' engine, use 'sweep' or 'breakpoints' instead")
+
+  return args
+
+# Main function
+def main():
+  args = parse_args()
+
+  catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else supplements
+
+  tasks = [
+    PlanTask(
+      get_mode_enum(mode), min_stacks, max_stacks,
+      stacks_multiple=args.stacks_multiple, stacks_offset=args.stacks_offset,
+      free_shipping_threshold=free_shipping_threshold(args),
+    )
+    for mode in args.modes
+    for min_stacks in args.min_stacks
+    for max_stacks in args.max_stacks
+  ]
+
+  plans = plan_many(
+    catalog, tasks,
+    engine=args.engine, compact=args.compact, solver_options=SolverOptions.from_args(args), workers=args.workers,
+  )
+
+  table = []
+  for plan in plans:
+    table.append([
+      plan.mode.value,
+      plan.min_stacks,
+      plan.max_stacks,
+      plan.status,
+      plan.stacks,
+      *([f"${plan.total_cost:.2f}", f"${plan.total_leftover_cost:.2f}", f"${plan.total_adjusted_leftover_cost:.2f}"] if plan.has_solution else [None] * 3),
+    ])
+
+  headers = ["Mode", "Min Stacks", "Max Stacks", "Status", "Stacks", "Total Cost", "Leftover Cost", "Adjusted Leftover Cost"]
+  print(tabulate(table, headers=headers))
+
+if __name__ == "__main__":
+  main()
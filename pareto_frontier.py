@@ -0,0 +1,227 @@
+# NOTE: The legacy w2/w3 scripts fold stacks, leftovers and total cost into one hand tuned weighted objective, and the
+# optimizers minimize a single OptimizationMode. This computes the whole non-dominated set of (total cost, leftover
+# units/cost, stacks) trade-offs instead, so buyers can pick a point on the curve.
+#
+# It's an epsilon-constraint method on stacks: for a fixed stacks value, buying the fewest bottles that cover it
+# minimizes total cost and leftovers at the same time (any extra bottle adds to both), so every Pareto optimal purchase
+# is the optimum at some fixed stacks value. We solve each stacks value in [min_stacks, max_stacks] (on the stacks
+# lattice), then keep the points that no other point beats on all of fewer total cost, fewer leftovers (per the mode's
+# objective) and more stacks. As the same bottles cover more stacks with fewer leftovers, that's every stacks value
+# just before total cost steps up, each with the leftovers it leaves.
+#
+# The 'sweep' engine scores every stacks value in one vectorized pass (as stacks_search.sweep_stacks does), while the
+# 'milp' engine solves the leftover_bought PurchaseModel with its stacks bounds pinned to each value in turn, reusing
+# the model (and warm starting from the previous stacks value) across a run of consecutive ones. Either way, the
+# chunks are spread across a pool of worker processes (see parallel).
+#
+# Usage:
+#   python pareto_frontier.py --mode adjusted_leftover_units_cost --max-stacks 112 --workers 4
+
+import argparse
+import bisect
+import math
+from collections import namedtuple
+
+from catalog_io import add_catalog_argument
+from lazy_imports import lazy_import, tabulate
+from optimization_mode import ADJUSTED_MODES, COST_MODES, OptimizationMode, get_mode_enum
+from optimize_bottles_min_leftover_units_or_cost_of_leftover_bought import PurchaseModel
+from parallel import WorkerPool, worker_state
+from solver_options import DEFAULT_SOLVER_OPTIONS, SolverOptions, add_solver_arguments
+from stacks_search import (
+  OBJECTIVE_TOLERANCE, add_stacks_lattice_arguments, bottles_needed, leftover_weights, stacks_cost, stacks_lattice,
+  stacks_objective,
+)
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+np = lazy_import('numpy')
+
+FRONTIER_ENGINES = ('sweep', 'milp')
+
+# Chunks of stacks values handed to each worker, so a slow chunk doesn't leave the other workers idle at the end
+CHUNKS_PER_WORKER = 4
+
+# A single non-dominated trade-off, with leftover in the units of the mode's objective and bottles_purchased aligned
+# to the catalog
+FrontierPoint = namedtuple("FrontierPoint", ["stacks", "total_cost", "leftover", "bottles_purchased"])
+
+# Set up a worker to solve chunks of stacks values against the catalog
+def init_frontier_worker(catalog, mode, engine, compact, solver_options, lattice):
+  worker_state.clear()
+  worker_state.update(
+    catalog=catalog, mode=mode, engine=engine, compact=compact, solver_options=solver_options, lattice=lattice,
+    model=None,
+  )
+
+# Solve each of a chunk of stacks values (consecutive ones on the lattice) in a worker, returning the stacks values
+# solved along with their total cost and objective
+def solve_frontier_chunk(stacks_range):
+  catalog, mode = worker_state['catalog'], worker_state['mode']
+
+  bottle_size, bottle_cost, daily_dose, current_stock = catalog.arrays()
+
+  if worker_state['engine'] == 'sweep':
+    weights = leftover_weights(bottle_size, bottle_cost, mode)
+
+    return (
+      stacks_range.astype(np.int64),
+      stacks_cost(stacks_range, bottle_size, bottle_cost, daily_dose, current_stock),
+      stacks_objective(stacks_range, bottle_size, daily_dose, current_stock, weights, mode in ADJUSTED_MODES),
+    )
+
+  # One model per worker, with the stacks bounds pinned to each value in turn (warm starting from the previous one)
+  model = worker_state['model']
+  if model is None:
+    start = int(stacks_range[0])
+    model = worker_state['model'] = PurchaseModel(
+      catalog, start, start, mode, compact=worker_state['compact'], **worker_state['lattice'],
+    )
+
+  solved = []
+  for stacks in stacks_range.astype(np.int64).tolist():
+    model.set_stack_bounds(stacks, stacks)
+    solution = model.solve(solver_options=worker_state['solver_options'])
+    if solution.stacks is not None:
+      solved.append((stacks, float(np.asarray(solution.bottles_purchased) @ bottle_cost), solution.objective))
+
+  stacks, cost, objective = zip(*solved) if solved else ((), (), ())
+
+  return np.array(stacks, dtype=np.int64), np.array(cost, dtype=np.float64), np.array(objective, dtype=np.float64)
+
+# Mask of the points (one per stacks value) that no other point beats on all of total cost (lower), leftover (lower) and
+# stacks (higher). Sweeping from the most stacks down, a point is dominated if any point already swept (ie. with more
+# stacks) has no more total cost and leftover, which the staircase of the swept points' (total cost, leftover) trade-offs
+# answers with one binary search: along it total cost increases and leftover decreases, so the least leftover costing
+# no more than a point is the last one there.
+def non_dominated(stacks, total_cost, leftover):
+  cost_tolerance = OBJECTIVE_TOLERANCE * np.maximum(1.0, np.abs(total_cost))
+  leftover_tolerance = OBJECTIVE_TOLERANCE * np.maximum(1.0, np.abs(leftover))
+
+  mask = np.zeros(len(stacks), dtype=bool)
+  staircase_cost, staircase_leftover = [], []
+
+  for i in np.lexsort((leftover, total_cost, -stacks)).tolist():
+    cost, left = float(total_cost[i]), float(leftover[i])
+
+    position = bisect.bisect_right(staircase_cost, cost + cost_tolerance[i])
+    mask[i] = position == 0 or staircase_leftover[position - 1] > left + leftover_tolerance[i]
+
+    # Onto the staircase, unless a point on it already has no more total cost and leftover, replacing those it beats
+    position = bisect.bisect_right(staircase_cost, cost)
+    if position and staircase_leftover[position - 1] <= left:
+      continue
+
+    start = end = bisect.bisect_left(staircase_cost, cost)
+    while end < len(staircase_cost) and staircase_leftover[end] >= left:
+      end += 1
+    staircase_cost[start:end] = [cost]
+    staircase_leftover[start:end] = [left]
+
+  return mask
+
+# Compute the frontier of (total cost, leftover, stacks) trade-offs over [min_stacks, max_stacks], as FrontierPoints in
+# increasing order of stacks
+def pareto_frontier(
+  catalog, min_stacks, max_stacks, mode,
+  engine='sweep', compact=False, solver_options=None, workers=None, stacks_multiple=1, stacks_offset=0,
+):
+  if engine not in FRONTIER_ENGINES:
+    raise ValueError(f"Unknown engine: {engine}")
+  stacks_range = stacks_lattice(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+  if not len(stacks_range):
+    return []
+
+  catalog = SupplementCatalog.from_records(catalog)
+  solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+  lattice = {'stacks_multiple': stacks_multiple, 'stacks_offset': stacks_offset}
+
+  with WorkerPool(
+    init_frontier_worker, (catalog, mode, engine, compact, solver_options, lattice), workers=workers,
+  ) as pool:
+    chunk_size = math.ceil(len(stacks_range) / (pool.workers * CHUNKS_PER_WORKER))
+    chunks = [stacks_range[start:start + chunk_size] for start in range(0, len(stacks_range), chunk_size)]
+
+    results = list(pool.imap(solve_frontier_chunk, chunks))
+
+  stacks, total_cost, leftover = (np.concatenate(column) for column in zip(*results))
+  mask = non_dominated(stacks, total_cost, leftover)
+
+  bottle_size, _bottle_cost, daily_dose, current_stock = catalog.arrays()
+
+  return [
+    FrontierPoint(
+      int(stacks[i]), float(total_cost[i]), float(leftover[i]),
+      bottles_needed(stacks[i], bottle_size, daily_dose, current_stock).astype(np.int64),
+    )
+    for i in np.flatnonzero(mask)
+  ]
+
+# Column heading for the mode's leftover measure
+def leftover_heading(mode):
+  return f"{'Adjusted ' if mode in ADJUSTED_MODES else ''}Leftover {'Cost' if mode in COST_MODES else 'Units'}"
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Compute the Pareto frontier of total cost vs leftovers vs stacks for supplement purchasing.")
+
+  parser.add_argument(
+    '--min-stacks', type=int, default=7 * 4,
+    help="Minimum number of stacks (default: 7 * 4 days)"
+  )
+  parser.add_argument(
+    '--max-stacks', type=int, default=7 * 4 * 2,
+    help="Maximum number of stacks (default: 7 * 4 * 2 days)"
+  )
+  parser.add_argument(
+    '--mode', type=str, choices=[mode.value for mode in OptimizationMode], default='leftover_units_cost',
+    help="Optimization mode, ie. which leftovers to trade off against total cost and stacks (default: 'leftover_units_cost')"
+  )
+  parser.add_argument(
+    '--engine', type=str, choices=FRONTIER_ENGINES, default='sweep',
+    help="Solver engine: 'sweep' (every stacks value scored in one vectorized pass, without CBC) or 'milp' (the MILP solved with its stacks pinned to each value, solved with --solver) (default: 'sweep')"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+  add_stacks_lattice_arguments(parser)
+  parser.add_argument(
+    '--compact', action='store_true',
+    help="Optional: Build the compact MILP, substituting the leftover units/cost definitions directly instead of creating variables and constraints for them"
+  )
+  parser.add_argument(
+    '--workers', type=int, default=None,
+    help="Optional: Number of worker processes, where 1 runs everything in process (default: one per core)"
+  )
+
+  return parser.parse_args()
+
+# Main function
+def main():
+  args = parse_args()
+
+  catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else supplements
+  mode = get_mode_enum(args.mode)
+
+  frontier = pareto_frontier(
+    catalog, args.min_stacks, args.max_stacks, mode,
+    engine=args.engine, compact=args.compact, solver_options=SolverOptions.from_args(args), workers=args.workers,
+    stacks_multiple=args.stacks_multiple, stacks_offset=args.stacks_offset,
+  )
+
+  table = []
+  for point in frontier:
+    table.append([
+      point.stacks,
+      f"{point.stacks / 7:.2f}",
+      f"${point.total_cost:.2f}",
+      f"${point.leftover:.2f}" if mode in COST_MODES else f"{point.leftover:.2f}",
+      f"${point.total_cost / point.stacks:.2f}" if point.stacks > 0 else "N/A",
+      int(np.count_nonzero(point.bottles_purchased)),
+    ])
+
+  headers = ["Stacks", "Weeks", "Total Cost", leftover_heading(mode), "Cost per Stack", "Supplements Purchased"]
+  print(tabulate(table, headers=headers))
+  considered = len(stacks_lattice(args.min_stacks, args.max_stacks, args.stacks_multiple, args.stacks_offset))
+  print(f"\n{len(frontier)} of {considered} stacks values are on the frontier")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,152 @@
+# NOTE: Most plans repeat the same catalog, stack bounds and mode, so we cache each engine's solution on disk (in a
+# small SQLite database) keyed by a canonical hash of just the inputs that affect it. Only the raw solution (status,
+# stacks, bottles purchased, objective) is stored; the PurchasePlan is rebuilt from the caller's catalog on a hit, so
+# labels and other unused fields can change freely without invalidating anything.
+#
+# The cache is bounded to max_entries rows, evicting the least recently used entries first.
+#
+# Alongside each solution we keep the engine (and MILP solver settings, if any) that produced it, so plans built from a
+# cache hit still report where their solution came from.
+
+import hashlib
+import json
+import sqlite3
+import time
+
+from lazy_imports import lazy_import
+from stacks_search import StacksSolution
+from supplement_catalog import SupplementCatalog
+
+np = lazy_import('numpy')
+
+# Bump this whenever the cached solution format (or the meaning of a cache key) changes
+CACHE_VERSION = 2
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+# Catalog fields that actually affect the solution (labels don't)
+KEY_FIELDS = ('bottle_size', 'bottle_cost', 'daily_dose', 'current_stock')
+
+# Canonical hash of the catalog fields, mode, stack bounds and any extra solve options
+def cache_key(supplements, min_stacks, max_stacks, mode, **options):
+  # Normalize to floats so eg. 90 and 90.0 hash the same (and a SupplementCatalog hashes the same as its dicts)
+  if isinstance(supplements, SupplementCatalog):
+    catalog = np.column_stack([supplements.column(name).astype(np.float64) for name in KEY_FIELDS]).tolist()
+  else:
+    catalog = [[float(supp[name]) for name in KEY_FIELDS] for supp in supplements]
+
+  payload = {
+    'version': CACHE_VERSION,
+    'catalog': catalog,
+    'min_stacks': min_stacks,
+    'max_stacks': max_stacks,
+    'mode': mode.value,
+    'options': options,
+  }
+  encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+
+  return hashlib.sha256(encoded).hexdigest()
+
+# On-disk LRU cache of solutions
+class PlanCache:
+  def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+    self.path = path
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+    self.connection = sqlite3.connect(path)
+    # WAL + NORMAL sync keeps the per-lookup LRU bookkeeping cheap
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    # Start afresh with a cache written by an older version (its keys would never match anyway)
+    if self.connection.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+      self.connection.execute("DROP TABLE IF EXISTS solutions")
+      self.connection.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS solutions ("
+      "  key TEXT PRIMARY KEY,"
+      "  engine TEXT NOT NULL,"
+      "  solver TEXT,"
+      "  solution TEXT NOT NULL,"
+      "  last_used REAL NOT NULL"
+      ")"
+    )
+    self.connection.execute("CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+    self.connection.commit()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    self.connection.close()
+
+  # Return (solution, engine, solver) for a key, or None on a miss
+  def get(self, key):
+    row = self.connection.execute("SELECT engine, solver, solution FROM solutions WHERE key = ?", (key,)).fetchone()
+    if row is None:
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    with self.connection:
+      self.connection.execute("UPDATE solutions SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    engine, solver, solution = row
+    return StacksSolution(**json.loads(solution)), engine, solver
+
+  def put(self, key, solution, engine, solver=None):
+    with self.connection:
+      self.connection.execute(
+        "INSERT OR REPLACE INTO solutions (key, engine, solver, solution, last_used) VALUES (?, ?, ?, ?, ?)",
+        (key, engine, solver, json.dumps(solution._asdict()), time.time()),
+      )
+      self.evict()
+
+  # Drop the least recently used entries beyond max_entries
+  def evict(self):
+    excess = len(self) - self.max_entries
+    if excess > 0:
+      self.connection.execute(
+        "DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY last_used ASC LIMIT ?)",
+        (excess,),
+      )
+      self.evictions += excess
+
+  # Look up a key, falling back to solve() (and caching its result) on a miss, returning (solution, engine, solver)
+  def get_or_solve(self, key, engine, solve, solver=None):
+    cached = self.get(key)
+    if cached is not None:
+      return cached
+
+    solution = solve()
+    # Only cache definitive results, never eg. 'Feasible', 'Not Solved' or 'Undefined'
+    if solution.status in ('Optimal', 'Infeasible'):
+      self.put(key, solution, engine, solver)
+
+    return solution, engine, solver
+
+  def clear(self):
+    with self.connection:
+      self.connection.execute("DELETE FROM solutions")
+
+  def __len__(self):
+    return self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+  def stats(self):
+    lookups = self.hits + self.misses
+
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / lookups if lookups else 0.0,
+      'evictions': self.evictions,
+      'entries': len(self),
+      'max_entries': self.max_entries,
+    }
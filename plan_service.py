@@ -0,0 +1,485 @@
+# NOTE: Other local tools want plans without paying for a Python startup (and the pulp import) every time, so this
+# serves them over HTTP from a long running process. Requests are handled with asyncio, while the CPU bound solves run
+# in a fixed pool of worker processes, each of which loads the catalog once and keeps a BatchPlanner (and so the same
+# PurchaseModel as optimize_bottles_min_leftover_units_or_cost_of_leftover_bought) per mode, stacks lattice, free
+# shipping threshold and engine, retargeted at each request's stack bounds rather than rebuilt for them.
+#
+# Each worker runs in its own process group, so when a request times out (or its client goes away) the worker is
+# killed along with any CBC subprocess it started, and a fresh one is spawned in its place. Once every worker is busy
+# and max_queue requests are already waiting for one, further requests are turned away with a 503 straight away rather
+# than queueing without bound.
+#
+# It only ever listens on a loopback address.
+#
+# Endpoints:
+#   GET  /health   worker/queue status
+#   POST /plan     plan against the catalog, eg. {"mode": "adjusted_leftover_units_cost", "min_stacks": 28,
+#                  "max_stacks": 56, "stacks_multiple": 7, "stacks_offset": 0, "free_shipping_threshold": 80,
+#                  "engine": "milp", "current_stock": {"Vitamin B12": 30}, "timeout": 10}
+#                  (every field is optional), returning the same JSON summary as batch
+#
+# Usage:
+#   python plan_service.py --port 8765 --workers 4
+#   curl -s localhost:8765/plan -d '{"mode": "leftover_units_cost"}'
+
+import argparse
+import ipaddress
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+
+from batch import ENGINES, BatchPlanner, plan_record
+from catalog_io import add_catalog_argument
+from lazy_imports import lazy_import
+from optimization_mode import get_mode_enum
+from parallel import MAX_PLANNERS
+from solver_options import SolverOptions, add_solver_arguments
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+# Only needed once we're actually serving
+asyncio = lazy_import('asyncio')
+
+# Limits on what we'll read of a request
+MAX_BODY_BYTES = 1024 * 1024
+REQUEST_READ_TIMEOUT = 10
+
+REASONS = {
+  200: "OK",
+  400: "Bad Request",
+  404: "Not Found",
+  405: "Method Not Allowed",
+  413: "Payload Too Large",
+  500: "Internal Server Error",
+  503: "Service Unavailable",
+  504: "Gateway Timeout",
+}
+
+class HTTPError(Exception):
+  def __init__(self, status, message):
+    super().__init__(message)
+    self.status = status
+    self.message = message
+
+# Worker process: set up once, then solve requests off the connection until it's closed
+def worker_main(connection, catalog, compact, solver_options):
+  # Own process group, so a timeout can kill any CBC subprocess along with us
+  os.setpgrp()
+
+  planners = OrderedDict()
+  connection.send(('ready', None))
+
+  while True:
+    try:
+      request = connection.recv()
+    except EOFError:
+      return
+
+    try:
+      response = ('ok', solve_request(planners, catalog, compact, solver_options, request))
+    except ValueError as e:
+      response = ('invalid', str(e))
+    except Exception as e:
+      response = ('error', f"{type(e).__name__}: {e}")
+
+    connection.send(response)
+
+# Plan a single (already validated) request, reusing the worker's planner (and so its MILP) for the same mode, stacks
+# lattice, free shipping threshold and engine, retargeted at the request's stack bounds (see parallel.solve_plan_task)
+def solve_request(planners, catalog, compact, solver_options, request):
+  key = (
+    request['mode'], request['stacks_multiple'], request['stacks_offset'], request['free_shipping_threshold'],
+    request['engine'],
+  )
+
+  planner = planners.pop(key, None)
+  if planner is None:
+    planner = BatchPlanner(
+      catalog, request['min_stacks'], request['max_stacks'], request['mode'],
+      engine=request['engine'], compact=compact, solver_options=solver_options,
+      free_shipping_threshold=request['free_shipping_threshold'], stacks_multiple=request['stacks_multiple'],
+      stacks_offset=request['stacks_offset'],
+    )
+  elif (planner.min_stacks, planner.max_stacks) != (request['min_stacks'], request['max_stacks']):
+    planner.set_stack_bounds(request['min_stacks'], request['max_stacks'])
+
+  # Most recently used last, dropping the least recently used
+  planners[key] = planner
+  while len(planners) > MAX_PLANNERS:
+    planners.popitem(last=False)
+
+  plan = planner.plan(request['current_stock'])
+
+  return {
+    'mode': plan.mode.value,
+    'min_stacks': plan.min_stacks,
+    'max_stacks': plan.max_stacks,
+    'stacks_multiple': plan.stacks_multiple,
+    'stacks_offset': plan.stacks_offset,
+    'free_shipping_threshold': plan.free_shipping_threshold,
+    'engine': plan.engine,
+    'solver': plan.solver,
+    **plan_record(plan),
+  }
+
+# Parent side handle on a worker process
+class Worker:
+  def __init__(self, context, args):
+    self.connection, worker_connection = context.Pipe()
+    self.process = context.Process(target=worker_main, args=(worker_connection, *args), daemon=True)
+    self.process.start()
+    worker_connection.close()
+
+    # Also set the process group from this side, so there's no window where killpg would miss the worker
+    try:
+      os.setpgid(self.process.pid, self.process.pid)
+    except OSError:
+      pass
+
+  # Wait (without blocking the event loop) for the worker's next message
+  async def receive(self, timeout=None):
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    fd = self.connection.fileno()
+
+    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    try:
+      await asyncio.wait_for(readable, timeout)
+    finally:
+      loop.remove_reader(fd)
+
+    return self.connection.recv()
+
+  # Kill the worker and everything in its process group (ie. CBC)
+  def kill(self):
+    try:
+      os.killpg(self.process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+      # Not yet in its own process group (ie. still starting up)
+      self.process.kill()
+
+    self.process.join()
+    self.connection.close()
+
+class SolveService:
+  def __init__(self, catalog, workers, max_queue, timeout, compact=False, solver_options=None):
+    # Spawned rather than forked, so workers don't inherit the listening socket or any client connections
+    self.context = multiprocessing.get_context('spawn')
+    self.worker_args = (SupplementCatalog.from_records(catalog), compact, solver_options)
+    self.worker_count = workers
+    self.max_queue = max_queue
+    self.timeout = timeout
+
+    self.workers = set()
+    self.idle = None
+    self.waiting = 0
+    self.busy = 0
+    # Replacement workers being spawned (kept so the tasks aren't garbage collected)
+    self.spawning = set()
+
+  async def start(self):
+    self.idle = asyncio.Queue()
+    await asyncio.gather(*(self.spawn() for _ in range(self.worker_count)))
+
+  async def spawn(self):
+    worker = Worker(self.context, self.worker_args)
+    self.workers.add(worker)
+
+    try:
+      await worker.receive()
+    except EOFError:
+      self.workers.discard(worker)
+      worker.kill()
+      raise RuntimeError("Worker process failed to start") from None
+
+    self.idle.put_nowait(worker)
+
+  # Kill a worker (eg. on a timeout) and spawn a replacement in the background
+  def replace(self, worker):
+    self.workers.discard(worker)
+    worker.kill()
+
+    task = asyncio.create_task(self.spawn())
+    self.spawning.add(task)
+    task.add_done_callback(self.spawning.discard)
+
+  def close(self):
+    for task in self.spawning:
+      task.cancel()
+    for worker in list(self.workers):
+      worker.kill()
+    self.workers.clear()
+
+  # Hand a request to the next free worker, within the timeout (covering both the wait for a worker and the solve)
+  async def solve(self, request, timeout):
+    if self.idle.empty() and self.waiting >= self.max_queue:
+      raise HTTPError(503, "All workers are busy and the queue is full")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    self.waiting += 1
+    try:
+      worker = await asyncio.wait_for(self.idle.get(), timeout)
+    except asyncio.TimeoutError:
+      raise HTTPError(504, f"Timed out after {timeout}s waiting for a worker") from None
+    finally:
+      self.waiting -= 1
+
+    self.busy += 1
+    try:
+      worker.connection.send(request)
+      status, result = await worker.receive(max(deadline - loop.time(), 0))
+    except asyncio.TimeoutError:
+      self.replace(worker)
+      worker = None
+      raise HTTPError(504, f"Timed out after {timeout}s solving") from None
+    except asyncio.CancelledError:
+      # The client went away (or we're shutting down), so stop the solve
+      self.replace(worker)
+      worker = None
+      raise
+    except (EOFError, OSError):
+      self.replace(worker)
+      worker = None
+      raise HTTPError(500, "Worker exited unexpectedly") from None
+    finally:
+      self.busy -= 1
+      if worker is not None:
+        self.idle.put_nowait(worker)
+
+    if status == 'invalid':
+      raise HTTPError(400, result)
+    elif status == 'error':
+      raise HTTPError(500, result)
+
+    return result
+
+  def health(self):
+    return {'status': 'ok', 'workers': len(self.workers), 'busy': self.busy, 'queued': self.waiting}
+
+  async def handle_connection(self, reader, writer):
+    start = time.perf_counter()
+    method = path = None
+
+    try:
+      method, path, body = await asyncio.wait_for(read_request(reader), REQUEST_READ_TIMEOUT)
+      status, payload = 200, await self.route(method, path, body, reader)
+    except HTTPError as e:
+      status, payload = e.status, {'error': e.message}
+    except asyncio.TimeoutError:
+      status, payload = 400, {'error': "Timed out reading the request"}
+    except (ConnectionError, asyncio.IncompleteReadError):
+      print(f"{method} {path} disconnected {time.perf_counter() - start:.3f}s", file=sys.stderr)
+      writer.close()
+      return
+    except Exception as e:
+      status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+    print(f"{method} {path} {status} {time.perf_counter() - start:.3f}s", file=sys.stderr)
+
+    try:
+      writer.write(http_response(status, payload))
+      await writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+  async def route(self, method, path, body, reader):
+    if path == '/health':
+      if method != 'GET':
+        raise HTTPError(405, f"{method} isn't supported on {path}")
+      return self.health()
+    elif path == '/plan':
+      if method != 'POST':
+        raise HTTPError(405, f"{method} isn't supported on {path}")
+
+      try:
+        fields = json.loads(body or b'{}')
+      except ValueError:
+        raise HTTPError(400, "Request body must be JSON") from None
+      request, timeout = parse_plan_request(fields, self.timeout)
+
+      return await self.solve_until_disconnected(request, timeout, reader)
+    else:
+      raise HTTPError(404, f"No such endpoint: {path}")
+
+  # Solve, cancelling (and so killing the worker) if the client disconnects before the plan is ready
+  async def solve_until_disconnected(self, request, timeout, reader):
+    solve = asyncio.ensure_future(self.solve(request, timeout))
+    disconnected = asyncio.ensure_future(reader.read(1))
+
+    try:
+      await asyncio.wait({solve, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+      if not solve.done() and disconnected.result() == b'':
+        solve.cancel()
+        raise ConnectionResetError("Client disconnected")
+
+      return await solve
+    finally:
+      disconnected.cancel()
+      if not solve.done():
+        solve.cancel()
+
+# Read an HTTP/1.1 request, returning its method, path and body
+async def read_request(reader):
+  try:
+    head = await reader.readuntil(b"\r\n\r\n")
+  except asyncio.LimitOverrunError:
+    raise HTTPError(413, "Request headers too large") from None
+
+  request_line, *header_lines = head.decode('latin-1').split("\r\n")
+  try:
+    method, target, _version = request_line.split(" ", 2)
+  except ValueError:
+    raise HTTPError(400, "Malformed request line") from None
+
+  headers = {}
+  for line in header_lines:
+    if line:
+      name, _, value = line.partition(":")
+      headers[name.strip().lower()] = value.strip()
+
+  try:
+    length = int(headers.get('content-length', 0))
+  except ValueError:
+    raise HTTPError(400, "Invalid Content-Length") from None
+  if length > MAX_BODY_BYTES:
+    raise HTTPError(413, f"Request body larger than {MAX_BODY_BYTES} bytes")
+
+  body = await reader.readexactly(length) if length > 0 else b''
+
+  return method, target.split("?", 1)[0], body
+
+def http_response(status, payload):
+  body = json.dumps(payload).encode()
+  headers = [
+    f"HTTP/1.1 {status} {REASONS[status]}",
+    "Content-Type: application/json",
+    f"Content-Length: {len(body)}",
+    "Connection: close",
+  ]
+  if status == 503:
+    headers.append("Retry-After: 1")
+
+  return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+# Validate a /plan request body, returning the request for a worker and its timeout
+def parse_plan_request(fields, max_timeout):
+  if not isinstance(fields, dict):
+    raise HTTPError(400, "Request body must be a JSON object")
+
+  try:
+    mode = get_mode_enum(fields.get('mode', 'leftover_units'))
+  except ValueError as e:
+    raise HTTPError(400, str(e)) from None
+
+  request = {'mode': mode, 'current_stock': fields.get('current_stock', {}), 'engine': fields.get('engine', 'milp')}
+  for name, default in (('min_stacks', 7 * 4), ('max_stacks', 7 * 4 * 2), ('stacks_multiple', 1), ('stacks_offset', 0)):
+    value = fields.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+      raise HTTPError(400, f"{name} must be an integer")
+    request[name] = value
+
+  if request['stacks_multiple'] < 1:
+    raise HTTPError(400, "stacks_multiple must be at least 1")
+
+  # Free shipping is only required when a threshold is given
+  threshold = fields.get('free_shipping_threshold')
+  if threshold is not None and (
+    isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not math.isfinite(threshold) or threshold < 0
+  ):
+    raise HTTPError(400, "free_shipping_threshold must be a non-negative number of dollars")
+  request['free_shipping_threshold'] = threshold
+
+  if request['engine'] not in ENGINES:
+    raise HTTPError(400, f"engine must be one of {', '.join(ENGINES)}")
+  if not isinstance(request['current_stock'], dict):
+    raise HTTPError(400, "current_stock must be an object mapping label to units on hand")
+
+  # Requests can ask for a shorter timeout than the service's, but not a longer one
+  timeout = fields.get('timeout', max_timeout)
+  if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+    raise HTTPError(400, "timeout must be a positive number of seconds")
+
+  return request, min(timeout, max_timeout)
+
+# Whether a host name/address only listens locally
+def is_loopback(host):
+  if host == 'localhost':
+    return True
+  try:
+    return ipaddress.ip_address(host).is_loopback
+  except ValueError:
+    return False
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Serve supplement purchasing plans over HTTP on localhost.")
+
+  parser.add_argument(
+    '--host', type=str, default='127.0.0.1',
+    help="Loopback address to listen on (default: 127.0.0.1)"
+  )
+  parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765)")
+  parser.add_argument(
+    '--workers', type=int, default=os.cpu_count() or 1,
+    help="Number of worker processes solving plans (default: one per core)"
+  )
+  parser.add_argument(
+    '--max-queue', type=int, default=None,
+    help="Optional: Most requests waiting for a free worker before more are turned away with a 503 (default: 2 per worker)"
+  )
+  parser.add_argument(
+    '--timeout', type=float, default=30,
+    help="Longest a request may take (waiting for a worker plus solving) before its worker is killed and it gets a 504, in seconds. Requests can ask for less (default: 30)"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+  parser.add_argument(
+    '--compact', action='store_true',
+    help="Optional: Build the compact MILP, substituting the leftover units/cost definitions directly instead of creating variables and constraints for them"
+  )
+
+  args = parser.parse_args()
+  if not is_loopback(args.host):
+    parser.error(f"--host must be a loopback address, not {args.host}")
+  if args.workers < 1:
+    parser.error("--workers must be at least 1")
+
+  return args
+
+async def serve(args):
+  catalog = SupplementCatalog.from_file(args.catalog) if args.catalog else supplements
+
+  service = SolveService(
+    catalog, args.workers, args.max_queue if args.max_queue is not None else 2 * args.workers, args.timeout,
+    compact=args.compact, solver_options=SolverOptions.from_args(args),
+  )
+
+  try:
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+      loop.add_signal_handler(signum, stop.set)
+
+    print(f"Serving plans on http://{args.host}:{args.port} with {args.workers} worker(s)", file=sys.stderr)
+    async with server:
+      await stop.wait()
+  finally:
+    service.close()
+
+# Main function
+def main():
+  asyncio.run(serve(parse_args()))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,149 @@
+# NOTE: When a plan is slow we want to know whether the time went into creating variables, adding constraints, writing
+# the MPS file, the CBC subprocess itself, parsing its solution or rendering the tables. A Profiler records the wall
+# clock time (and, when tracemalloc is enabled, the memory allocated) in each named phase, along with CBC's own
+# statistics (nodes, iterations, gap) parsed from its log, and renders the lot as JSON.
+#
+# Phases nest, and are reported by their dotted path (eg. 'solve.cbc.write_mps'). Each phase's self_seconds excludes
+# the time spent in its nested phases, so eg. the self time of 'solve.cbc' is essentially the CBC subprocess.
+#
+# Code that can be profiled takes an optional profiler and falls back to NULL_PROFILER, which does nothing.
+
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from cbc_log import parse_cbc_log, read_cbc_log
+
+class Profiler:
+  def __init__(self, trace_allocations=True):
+    self.trace_allocations = trace_allocations
+    self.phases = {}
+    self.solver_stats = []
+    self.stack = []
+    self.started = time.perf_counter()
+
+    if trace_allocations and not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+  # Time (and trace allocations within) a named phase, nested under whichever phase is currently running
+  @contextlib.contextmanager
+  def phase(self, name):
+    path = ".".join([frame['path'] for frame in self.stack[-1:]] + [name])
+    frame = {'path': path, 'children_seconds': 0.0, 'peak': 0}
+    # Registered up front, so phases are reported in the order they started
+    stats = self.phases.setdefault(path, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0})
+
+    if self.trace_allocations:
+      current, peak = tracemalloc.get_traced_memory()
+      # Fold the peak so far into the enclosing phase before resetting it for this one
+      if self.stack:
+        self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+      tracemalloc.reset_peak()
+      frame['start_memory'] = current
+
+    self.stack.append(frame)
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      seconds = time.perf_counter() - start
+      self.stack.pop()
+
+      stats['calls'] += 1
+      stats['seconds'] += seconds
+      stats['self_seconds'] += seconds - frame['children_seconds']
+
+      if self.trace_allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(frame['peak'], peak)
+        stats['allocated_bytes'] = stats.get('allocated_bytes', 0) + current - frame['start_memory']
+        stats['peak_bytes'] = max(stats.get('peak_bytes', 0), peak - frame['start_memory'])
+
+      if self.stack:
+        self.stack[-1]['children_seconds'] += seconds
+        if self.trace_allocations:
+          self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+
+  # Profile calls to obj.method_name (eg. a pulp internal) as a phase, for the duration of the block. Objects without
+  # that method (eg. a solver backend that doesn't write an MPS file) are left alone.
+  @contextlib.contextmanager
+  def instrument(self, obj, method_name, name):
+    if not hasattr(obj, method_name):
+      yield
+      return
+
+    method = getattr(obj, method_name)
+
+    def profiled(*args, **kwargs):
+      with self.phase(name):
+        return method(*args, **kwargs)
+
+    setattr(obj, method_name, profiled)
+    try:
+      yield
+    finally:
+      delattr(obj, method_name)
+
+  # CBC's log is the only place to get its statistics from, so capture it to a temporary file when the caller isn't
+  # already logging somewhere (echoing it afterwards if msg is set, as it would otherwise have been printed)
+  @contextlib.contextmanager
+  def solver_log(self, log_path=None, msg=False):
+    if log_path is not None:
+      yield log_path
+      self.solver_stats.append(read_cbc_log(log_path))
+      return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      log_path = os.path.join(tmp_dir, "cbc.log")
+      yield log_path
+
+      if os.path.exists(log_path):
+        with open(log_path) as log_file:
+          text = log_file.read()
+        self.solver_stats.append(parse_cbc_log(text))
+        if msg:
+          sys.stdout.write(text)
+
+  def report(self, **context):
+    phases = []
+    for path, stats in self.phases.items():
+      phase = {'phase': path, **stats}
+      phase['seconds'] = round(phase['seconds'], 6)
+      phase['self_seconds'] = round(phase['self_seconds'], 6)
+      phases.append(phase)
+
+    return {
+      **context,
+      'total_seconds': round(time.perf_counter() - self.started, 6),
+      'trace_allocations': self.trace_allocations,
+      'phases': phases,
+      'solver': self.solver_stats,
+    }
+
+  # Write the report as JSON to a path, or '-' for stderr (keeping it apart from the plan on stdout)
+  def write(self, path, **context):
+    text = json.dumps(self.report(**context), indent=2)
+
+    if path == '-':
+      print(text, file=sys.stderr)
+    else:
+      with open(path, 'w') as profile_file:
+        profile_file.write(text)
+        profile_file.write("\n")
+
+# Stand-in for code that isn't being profiled
+class NullProfiler:
+  def phase(self, name):
+    return contextlib.nullcontext()
+
+  def instrument(self, obj, method_name, name):
+    return contextlib.nullcontext()
+
+  def solver_log(self, log_path=None, msg=False):
+    return contextlib.nullcontext(log_path)
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,230 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from lazy_imports import lazy_import, tabulate
+from optimization_mode import OptimizationMode
+from supplement_catalog import catalog_columns
+
+np = lazy_import('numpy')
+
+# Purchase decision and resulting leftovers for a single supplement
+@dataclass(frozen=True)
+class SupplementPurchase:
+  label: str
+  daily_dose: float
+  current_stock: float
+  bottle_size: float
+  bottle_cost: float
+  bottles_purchased: int
+  total_units_available: float
+  total_units_needed: float
+  leftover_units: float
+  adjusted_leftover_units: float
+  cost: float
+  leftover_cost: float
+  adjusted_leftover_cost: float
+
+  # Leftover percentage relative to a purchased bottle (None when no bottles were purchased)
+  @property
+  def leftover_pct(self) -> Optional[float]:
+    if self.bottles_purchased > 0:
+      return self.leftover_units / self.bottle_size * 100
+    return None
+
+  # Usage percentage relative to a purchased bottle (None when no bottles were purchased)
+  @property
+  def usage_pct(self) -> Optional[float]:
+    if self.bottles_purchased > 0:
+      return (1 - (self.leftover_units / self.bottle_size)) * 100
+    return None
+
+# Result of a single optimizer run, along with the configuration that produced it
+@dataclass(frozen=True)
+class PurchasePlan:
+  status: str
+  mode: OptimizationMode
+  min_stacks: int
+  max_stacks: int
+  engine: str
+  stacks: Optional[int] = None
+  objective: Optional[float] = None
+  # Every supplement's SupplementPurchase, or with purchases_only just the ones we're buying any bottles of
+  purchases: list = field(default_factory=list)
+  purchases_only: bool = False
+  # Totals over every supplement, whether or not purchases has them all
+  total_cost: float = 0.0
+  total_leftover_cost: float = 0.0
+  total_adjusted_leftover_cost: float = 0.0
+  # MILP solver backend and settings that produced the solution (None for the direct searches)
+  solver: Optional[str] = None
+  # Total cost the bottles purchased had to reach for free shipping (None if it wasn't required)
+  free_shipping_threshold: Optional[float] = None
+  # Stacks values considered were stacks_multiple * k + stacks_offset
+  stacks_multiple: int = 1
+  stacks_offset: int = 0
+
+  @property
+  def is_optimal(self) -> bool:
+    return self.status == 'Optimal'
+
+  # Whether there's a solution to report, ie. it's optimal or the solver stopped early with a feasible one
+  @property
+  def has_solution(self) -> bool:
+    return self.stacks is not None
+
+  # Only the supplements we need to buy bottles of
+  @property
+  def purchased(self) -> list:
+    return [purchase for purchase in self.purchases if purchase.bottles_purchased > 0]
+
+# Build a PurchasePlan from an engine's StacksSolution, recomputing the reported quantities from stacks/bottles (a column
+# at a time, from either a SupplementCatalog or a list of supplement dicts). With purchases_only, SupplementPurchases
+# are only built for the supplements we're buying any bottles of, so a big catalog's full table is never materialized.
+def make_plan(
+  supplements, solution, min_stacks, max_stacks, mode, engine,
+  solver=None, free_shipping_threshold=None, stacks_multiple=1, stacks_offset=0, purchases_only=False,
+):
+  if solution.stacks is None:
+    return PurchasePlan(
+      solution.status, mode, min_stacks, max_stacks, engine,
+      purchases_only=purchases_only, solver=solver, free_shipping_threshold=free_shipping_threshold,
+      stacks_multiple=stacks_multiple, stacks_offset=stacks_offset,
+    )
+
+  columns = catalog_columns(supplements)
+  daily_dose = columns['daily_dose']
+  bottle_size = columns['bottle_size']
+  bottle_cost = columns['bottle_cost']
+  current_stock = columns['current_stock']
+  bottles_purchased = np.asarray(solution.bottles_purchased, dtype=np.int64)
+
+  total_units_available = current_stock + bottles_purchased * bottle_size
+  total_units_needed = solution.stacks * daily_dose
+
+  leftover = total_units_available - total_units_needed
+  adjusted_leftover = np.where(bottles_purchased > 0, leftover, 0)
+  unit_cost = bottle_cost / bottle_size
+  cost = bottles_purchased * bottle_cost
+  leftover_cost = leftover * unit_cost
+  adjusted_leftover_cost = adjusted_leftover * unit_cost
+
+  # Rows of only the supplements bought, picked out of the columns before any SupplementPurchase is built
+  rows = np.flatnonzero(bottles_purchased > 0) if purchases_only else slice(None)
+  labels = columns['label']
+
+  purchases = [
+    SupplementPurchase(*fields)
+    for fields in zip(
+      [labels[i] for i in rows] if purchases_only else labels,
+      daily_dose[rows].tolist(),
+      current_stock[rows].tolist(),
+      bottle_size[rows].tolist(),
+      bottle_cost[rows].tolist(),
+      bottles_purchased[rows].tolist(),
+      total_units_available[rows].tolist(),
+      total_units_needed[rows].tolist(),
+      leftover[rows].tolist(),
+      adjusted_leftover[rows].tolist(),
+      cost[rows].tolist(),
+      leftover_cost[rows].tolist(),
+      adjusted_leftover_cost[rows].tolist(),
+    )
+  ]
+
+  return PurchasePlan(
+    solution.status, mode, min_stacks, max_stacks, engine,
+    stacks=solution.stacks, objective=solution.objective, purchases=purchases, purchases_only=purchases_only,
+    total_cost=sum(cost.tolist()), total_leftover_cost=sum(leftover_cost.tolist()),
+    total_adjusted_leftover_cost=sum(adjusted_leftover_cost.tolist()), solver=solver,
+    free_shipping_threshold=free_shipping_threshold, stacks_multiple=stacks_multiple, stacks_offset=stacks_offset,
+  )
+
+# Format a percentage for the results table
+def format_pct(pct):
+  return "N/A" if pct is None else f"{pct:.2f}%"
+
+# A supplement's row of the results table
+def table_row(purchase, show_adjusted=True):
+  return [
+    purchase.label,
+    purchase.daily_dose,
+    purchase.current_stock,
+    purchase.bottles_purchased,
+    purchase.bottle_size,
+    purchase.total_units_available,
+    purchase.total_units_needed,
+    purchase.leftover_units,
+    *([purchase.adjusted_leftover_units] if show_adjusted else []),
+    format_pct(purchase.leftover_pct),
+    format_pct(purchase.usage_pct),
+    f"${purchase.bottle_cost:.2f}",
+    f"${purchase.cost:.2f}",
+    f"${purchase.leftover_cost:.2f}",
+    *([f"${purchase.adjusted_leftover_cost:.2f}"] if show_adjusted else []),
+  ]
+
+# Print the configuration, results tables and totals for a plan (with purchases_only, skipping the full results table)
+def print_plan(plan, show_adjusted=True, purchases_only=False):
+  print("Configuration:")
+  print(f"  min_stacks={plan.min_stacks}")
+  print(f"  max_stacks={plan.max_stacks}")
+  if plan.stacks_multiple != 1 or plan.stacks_offset != 0:
+    print(f"  stacks_multiple={plan.stacks_multiple}")
+    print(f"  stacks_offset={plan.stacks_offset}")
+  print(f"  mode={plan.mode}")
+  print(f"  engine={plan.engine}")
+  if plan.solver is not None:
+    print(f"  solver={plan.solver}")
+  if plan.free_shipping_threshold is not None:
+    print(f"  free_shipping_threshold={plan.free_shipping_threshold:g}")
+
+  # Check the solution status
+  print("\nStatus:", plan.status)
+
+  if not plan.has_solution:
+    print(f"\nProblem could not be solved optimally.")
+    return
+
+  if not plan.is_optimal:
+    print(f"\nSolver stopped early (eg. on its time limit), so this is the best solution found rather than a proven optimum.")
+
+  headers = [
+    "Supplement",
+    "Daily Dose",
+    "Current Stock",
+    "Bottles Purchased",
+    "Bottle Size",
+    "Total Units Available",
+    "Total Units Needed",
+    "Leftover Units",
+    *(["Adjusted Leftover Units"] if show_adjusted else []),
+    "Leftover %",
+    "Usage %",
+    "Bottle Cost",
+    "Total Cost",
+    "Leftover Cost",
+    *(["Adjusted Leftover Cost"] if show_adjusted else []),
+  ]
+
+  if not purchases_only:
+    table = [table_row(purchase, show_adjusted) for purchase in plan.purchases]
+
+    print(f"\nFull Results Table:\n")
+    print(f"{tabulate(table, headers=headers)}")
+
+  # Only the entries where bottles were purchased
+  filtered_table = [table_row(purchase, show_adjusted) for purchase in plan.purchased]
+
+  # Print the filtered table with only purchased bottles
+  if filtered_table:
+    print(f"\nFiltered Table (Bottles to purchase):\n")
+    print(f"{tabulate(filtered_table, headers=headers)}")
+  else:
+    print("\nNo bottles to purchase in the solution.")
+
+  print(f"\nTotal Cost: ${plan.total_cost:.2f}")
+  print(f"Total Leftover Cost: ${plan.total_leftover_cost:.2f}")
+  if show_adjusted:
+    print(f"Total Adjusted Leftover Cost: ${plan.total_adjusted_leftover_cost:.2f}")
+
+  print(f"\nOptimal number of stacks (days): {plan.stacks} (approx {plan.stacks / 7:.2f} weeks)")
@@ -0,0 +1,129 @@
+# NOTE: print_plan renders a plan for a person at a terminal: it builds the whole results table (and then a filtered
+# copy of it) as formatted strings and pads them all out through tabulate, which is fine for 18 supplements but slow and
+# memory hungry for a big catalog, and awkward for anything downstream to parse. The writers here stream a plan out a
+# row at a time instead, as CSV or JSON lines (to a file or stdout), with raw numbers rather than formatted ones, so an
+# ordering system can consume the plan directly. With purchases_only, only the supplements we're buying any bottles of
+# are written, filtered as they're streamed (and a plan made with make_plan's purchases_only never built the rest).
+#
+#   - csv: a header row, then one row per supplement (nothing but the header if there's no solution)
+#   - jsonl: a summary object for the plan (its configuration, status and totals), then one object per supplement
+#   - table: print_plan's tables, for small interactive runs
+#
+# Usage:
+#   python -m optimize_bottles_min_leftover_units_or_cost --output-format csv --purchases-only --output order.csv
+
+import csv
+import json
+import sys
+from contextlib import nullcontext, redirect_stdout
+
+from purchase_plan import print_plan
+
+REPORT_FORMATS = ('table', 'csv', 'jsonl')
+
+# Each supplement's fields, in the order they're written (the adjusted ones only where the mode reports them)
+ROW_FIELDS = (
+  'label', 'daily_dose', 'current_stock', 'bottles_purchased', 'bottle_size', 'total_units_available',
+  'total_units_needed', 'leftover_units', 'adjusted_leftover_units', 'leftover_pct', 'usage_pct', 'bottle_cost', 'cost',
+  'leftover_cost', 'adjusted_leftover_cost',
+)
+ADJUSTED_FIELDS = ('adjusted_leftover_units', 'adjusted_leftover_cost')
+
+# Fields written for each supplement
+def row_fields(show_adjusted=True):
+  return [name for name in ROW_FIELDS if show_adjusted or name not in ADJUSTED_FIELDS]
+
+# The plan's supplements, or just the ones we're buying any bottles of, one at a time
+def iter_purchases(plan, purchases_only=False):
+  for purchase in plan.purchases:
+    if not purchases_only or purchase.bottles_purchased > 0:
+      yield purchase
+
+# A single supplement's row, as a mapping of field name to its raw value (None for a percentage of no bottles)
+def purchase_row(purchase, fields):
+  return {name: getattr(purchase, name) for name in fields}
+
+# Configuration, status and totals of a plan
+def plan_summary(plan, show_adjusted=True):
+  summary = {
+    'status': plan.status,
+    'mode': plan.mode.value,
+    'min_stacks': plan.min_stacks,
+    'max_stacks': plan.max_stacks,
+    'stacks_multiple': plan.stacks_multiple,
+    'stacks_offset': plan.stacks_offset,
+    'engine': plan.engine,
+    'solver': plan.solver,
+    'free_shipping_threshold': plan.free_shipping_threshold,
+    'stacks': plan.stacks,
+    'objective': plan.objective,
+  }
+
+  if plan.has_solution:
+    summary['total_cost'] = plan.total_cost
+    summary['total_leftover_cost'] = plan.total_leftover_cost
+    if show_adjusted:
+      summary['total_adjusted_leftover_cost'] = plan.total_adjusted_leftover_cost
+
+  return summary
+
+# Write a plan as CSV, one row per supplement
+def write_csv_report(plan, file, show_adjusted=True, purchases_only=False):
+  fields = row_fields(show_adjusted)
+
+  writer = csv.writer(file)
+  writer.writerow(fields)
+  for purchase in iter_purchases(plan, purchases_only):
+    writer.writerow(['' if value is None else value for value in purchase_row(purchase, fields).values()])
+
+# Write a plan as JSON lines, its summary first and then one object per supplement
+def write_jsonl_report(plan, file, show_adjusted=True, purchases_only=False):
+  fields = row_fields(show_adjusted)
+
+  file.write(json.dumps(plan_summary(plan, show_adjusted)) + "\n")
+  for purchase in iter_purchases(plan, purchases_only):
+    file.write(json.dumps(purchase_row(purchase, fields)) + "\n")
+
+# Write a plan as print_plan's tables
+def write_table_report(plan, file, show_adjusted=True, purchases_only=False):
+  with redirect_stdout(file):
+    print_plan(plan, show_adjusted=show_adjusted, purchases_only=purchases_only)
+
+# Output format -> writer for it
+REPORT_WRITERS = {
+  'table': write_table_report,
+  'csv': write_csv_report,
+  'jsonl': write_jsonl_report,
+}
+
+# Open a report's output for writing ('-' is stdout, which is left open)
+def open_output(path):
+  if path == '-':
+    return nullcontext(sys.stdout)
+
+  # The csv module does its own line endings
+  return open(path, 'w', newline='')
+
+# Write a plan in the format and to the output given on the command line
+def write_report(plan, args, show_adjusted=True):
+  with open_output(args.output) as file:
+    REPORT_WRITERS[args.output_format](plan, file, show_adjusted=show_adjusted, purchases_only=args.purchases_only)
+
+# Whether the report is machine readable and going to stdout, so nothing else (eg. the solver's log) should be
+def machine_readable_stdout(args):
+  return args.output_format != 'table' and args.output == '-'
+
+# Add the report format/output arguments to an optimizer CLI
+def add_report_arguments(parser):
+  parser.add_argument(
+    '--output-format', type=str, choices=REPORT_FORMATS, default='table',
+    help="Report format: 'table' (for reading at a terminal), or 'csv'/'jsonl' (streamed a row per supplement, for other tools to consume) (default: 'table')"
+  )
+  parser.add_argument(
+    '--output', type=str, default='-', metavar='PATH',
+    help="Optional: Write the report to PATH rather than stdout (default: '-', ie. stdout)"
+  )
+  parser.add_argument(
+    '--purchases-only', action='store_true',
+    help="Optional: Only report the supplements with bottles to purchase"
+  )
@@ -0,0 +1,358 @@
+# NOTE: The optimizers buy everything for a single stacks horizon up front. This schedules purchases across a run of
+# periods instead (eg. a year of 4 week periods), tracking each supplement's stock as it carries over from one period
+# to the next. It's the same balance constraint as optimize_bottles_min_leftover_units_or_cost (current stock plus the
+# bottles bought must cover the period's doses, leaving the leftover units), chained so that each period opens with
+# what the previous one left over. The objective is the leftover units (or their cost) carried at the end of every
+# period, plus an optional fixed cost per order placed (eg. shipping), which is what makes it worth buying ahead.
+#
+# Solving every period at once gets slow as the horizon or catalog grows, so the rolling horizon planner only solves a
+# short window of periods at a time, commits the first period's purchases, then rolls forward a period (opening with
+# the stock those purchases leave) and solves again. Each window length's model is built once and reused, with just
+# the opening stock constraints rebuilt in place between solves. --compare reports the runtime and objective of each
+# window length against a single monolithic solve over every period.
+#
+# Usage:
+#   python rolling_horizon_planner.py --periods 13 --window 3 --order-cost 15 --compare 1 2 3 6
+
+import argparse
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from catalog_io import add_catalog_argument
+from lazy_imports import lazy_import, tabulate
+from optimization_mode import OptimizationMode, get_mode_enum
+from solver_options import DEFAULT_SOLVER_OPTIONS, SolverOptions, add_solver_arguments
+from stacks_search import catalog_arrays, leftover_weights
+from supplement_catalog import SupplementCatalog
+from supplements_data import supplements
+
+np = lazy_import('numpy')
+pulp = lazy_import('pulp')
+
+# Modes a multi-period plan supports (only counting the leftovers of purchased bottles doesn't carry over periods)
+HORIZON_MODES = (OptimizationMode.LEFTOVER_UNITS, OptimizationMode.LEFTOVER_UNITS_COST)
+
+# Purchases scheduled across every period, and what they come to over the whole horizon
+@dataclass(frozen=True)
+class HorizonPlan:
+  status: str
+  mode: OptimizationMode
+  periods: int
+  period_days: int
+  window: int
+  # Bottles bought of each supplement (aligned to the catalog) at the start of each period, ie. periods x supplements
+  schedule: Optional['np.ndarray'] = None
+  objective: Optional[float] = None
+  total_cost: Optional[float] = None
+  orders: Optional[int] = None
+  solves: int = 0
+  runtime: float = 0.0
+
+  @property
+  def has_solution(self) -> bool:
+    return self.schedule is not None
+
+# MILP over a fixed number of periods, with the opening stock levels changeable in place before re-solving
+class HorizonModel:
+  def __init__(self, supplements, periods, period_days, mode, order_cost=0.0):
+    if mode not in HORIZON_MODES:
+      raise ValueError(f"Unknown optimization mode: {mode}")
+
+    # Our own copy of the catalog, kept in sync with any stock level changes
+    self.supplements = [dict(supp) for supp in supplements]
+    self.periods = periods
+    self.period_days = period_days
+
+    bottle_size, bottle_cost, _daily_dose, _current_stock = catalog_arrays(self.supplements)
+    weights = leftover_weights(bottle_size, bottle_cost, mode).tolist()
+
+    self.prob = pulp.LpProblem("RollingHorizonPurchasing", pulp.LpMinimize)
+
+    # Decision variables: bottles to purchase at the start of each period, and the leftover units at its end
+    self.bottles_purchased = {
+      supp['label']: [pulp.LpVariable(f"BottlesPurchased_{supp['label']}_{period}", lowBound=0, cat='Integer') for period in range(periods)]
+      for supp in self.supplements
+    }
+    self.leftover_units = {
+      supp['label']: [pulp.LpVariable(f"LeftoverUnits_{supp['label']}_{period}", lowBound=0, cat='Continuous') for period in range(periods)]
+      for supp in self.supplements
+    }
+
+    # Whether we place an order in each period (only needed when orders cost something)
+    self.ordered = [pulp.LpVariable(f"Ordered_{period}", cat='Binary') for period in range(periods)] if order_cost > 0 else None
+
+    # Each supplement's first period balance, kept so it can be rebuilt in place when the opening stock changes
+    self.opening_balance = {}
+
+    for supp in self.supplements:
+      label = supp['label']
+      bottles_purchased = self.bottles_purchased[label]
+      leftover_units = self.leftover_units[label]
+
+      for period in range(periods):
+        # Leftover units carry over, so each period opens with whatever the previous one left (non-negative, so every
+        # period's doses are covered)
+        opening_stock = supp['current_stock'] if period == 0 else leftover_units[period - 1]
+        balance = leftover_units[period] == self.balance(supp, opening_stock, bottles_purchased[period])
+        self.prob += balance, f"Balance_{label}_{period}"
+        if period == 0:
+          self.opening_balance[label] = balance
+
+        if self.ordered is not None:
+          # Bottles can only be bought in a period we order in (never more than would cover the rest of the window)
+          max_bottles = math.ceil((periods - period) * period_days * supp['daily_dose'] / supp['bottle_size'])
+          self.prob += bottles_purchased[period] <= self.ordered[period] * max_bottles, f"OrderPlaced_{label}_{period}"
+
+    # Objective function: Minimize the leftover units (or their cost) carried at the end of every period, plus orders
+    self.prob += pulp.lpSum(
+      weight * leftover for supp, weight in zip(self.supplements, weights) for leftover in self.leftover_units[supp['label']]
+    ) + order_cost * pulp.lpSum(self.ordered or [])
+
+  # Leftover units at the end of a period: its opening stock plus the bottles bought, less the period's doses
+  def balance(self, supp, opening_stock, bottles_purchased):
+    return opening_stock + (bottles_purchased * supp['bottle_size']) - (self.period_days * supp['daily_dose'])
+
+  # Update current_stock (ie. the first period's opening stock) for some supplements (mapping of label to units on hand)
+  def set_current_stock(self, current_stock):
+    for supp in self.supplements:
+      label = supp['label']
+      if label not in current_stock or current_stock[label] == supp['current_stock']:
+        continue
+
+      supp['current_stock'] = current_stock[label]
+
+      constraint = self.opening_balance[label]
+      replacement = self.leftover_units[label][0] == self.balance(supp, supp['current_stock'], self.bottles_purchased[label][0])
+      constraint.clear()
+      constraint.update(replacement)
+      constraint.constant = replacement.constant
+
+  # Seed every variable from a purchase schedule (periods x supplements, which may cover fewer periods than the model),
+  # topped up with just enough bottles to keep it feasible, so CBC can warm start from it
+  def set_initial_values(self, schedule):
+    bottle_size, _bottle_cost, daily_dose, stock = catalog_arrays(self.supplements)
+    needed = self.period_days * daily_dose
+
+    for period in range(self.periods):
+      bottles = schedule[period] if period < len(schedule) else np.zeros(len(self.supplements))
+      bottles = np.maximum(bottles, np.ceil(np.maximum(needed - stock, 0) / bottle_size))
+      stock = stock + bottles * bottle_size - needed
+
+      for supp, supp_bottles, leftover in zip(self.supplements, bottles.tolist(), stock.tolist()):
+        self.bottles_purchased[supp['label']][period].setInitialValue(supp_bottles)
+        self.leftover_units[supp['label']][period].setInitialValue(leftover)
+      if self.ordered is not None:
+        self.ordered[period].setInitialValue(1 if bottles.any() else 0)
+
+  # Solve (warm starting from set_initial_values), returning the status and bottles purchased (periods x supplements, or
+  # None without a solution)
+  def solve(self, solver_options=None, warm_start=False):
+    solver_options = solver_options or DEFAULT_SOLVER_OPTIONS
+    self.prob.solve(solver_options.solver(warm_start=warm_start))
+
+    status = pulp.LpStatus[self.prob.status]
+    if status != 'Optimal':
+      return status, None
+
+    # Stopped early (eg. on the time limit) with a solution that isn't proven optimal
+    if self.prob.sol_status == pulp.LpSolutionIntegerFeasible:
+      status = 'Feasible'
+
+    schedule = np.array(
+      [[round(self.bottles_purchased[supp['label']][period].varValue) for supp in self.supplements] for period in range(self.periods)],
+      dtype=np.int64,
+    )
+
+    return status, schedule
+
+# Objective, total cost and number of orders of a purchase schedule over the whole horizon, along with the stock of each
+# supplement left at the end
+def schedule_totals(supplements, schedule, period_days, mode, order_cost=0.0):
+  bottle_size, bottle_cost, daily_dose, current_stock = catalog_arrays(supplements)
+  weights = leftover_weights(bottle_size, bottle_cost, mode)
+
+  stock = current_stock.copy()
+  objective = 0.0
+  for bottles in schedule:
+    stock += bottles * bottle_size - period_days * daily_dose
+    objective += float(stock @ weights)
+
+  orders = int(np.count_nonzero(schedule.any(axis=1)))
+
+  return objective + order_cost * orders, float((schedule @ bottle_cost).sum()), orders, stock
+
+# Plan purchases across every period, solving window periods at a time and committing one period per solve (a window
+# covering every period is a single monolithic solve). Each window warm starts from what's left of the previous one's
+# schedule, and the first from initial_schedule (eg. another plan's schedule) if there is one.
+def rolling_horizon(
+  supplements, periods, period_days, window, mode, order_cost=0.0, solver_options=None, initial_schedule=None,
+):
+  if periods < 1 or window < 1:
+    raise ValueError("periods and window must both be at least 1")
+
+  catalog = SupplementCatalog.from_records(supplements)
+  window = min(window, periods)
+  bottle_size = catalog.column('bottle_size')
+  daily_dose = catalog.column('daily_dose')
+
+  start_time = time.perf_counter()
+
+  # One model per window length (the last few windows get shorter as they reach the end of the horizon)
+  models = {}
+  stock = catalog.column('current_stock').copy()
+  schedule = np.zeros((periods, len(catalog)), dtype=np.int64)
+  statuses = set()
+  solves = 0
+
+  # A monolithic solve commits every period at once
+  commit = periods if window == periods else 1
+
+  for start in range(0, periods, commit):
+    length = min(window, periods - start)
+    current_stock = dict(zip(catalog.labels, stock.tolist()))
+
+    if length not in models:
+      models[length] = HorizonModel(catalog.with_current_stock(stock), length, period_days, mode, order_cost)
+    model = models[length]
+    model.set_current_stock(current_stock)
+
+    if initial_schedule is not None:
+      model.set_initial_values(initial_schedule)
+    status, window_schedule = model.solve(solver_options, warm_start=initial_schedule is not None)
+    solves += 1
+    if window_schedule is None:
+      return HorizonPlan(status, mode, periods, period_days, window, solves=solves, runtime=time.perf_counter() - start_time)
+    statuses.add(status)
+
+    # Commit the purchases for the periods we're moving past, and open the next window with the stock they leave
+    for period in range(commit):
+      schedule[start + period] = window_schedule[period]
+      stock = stock + window_schedule[period] * bottle_size - period_days * daily_dose
+    initial_schedule = window_schedule[commit:]
+
+  runtime = time.perf_counter() - start_time
+  objective, total_cost, orders, _stock = schedule_totals(catalog, schedule, period_days, mode, order_cost)
+
+  return HorizonPlan(
+    'Feasible' if 'Feasible' in statuses else 'Optimal', mode, periods, period_days, window,
+    schedule=schedule, objective=objective, total_cost=total_cost, orders=orders, solves=solves, runtime=runtime,
+  )
+
+# Print each period's purchases for a plan
+def print_schedule(catalog, plan):
+  bottle_cost = catalog.column('bottle_cost')
+
+  table = []
+  for period, bottles in enumerate(plan.schedule):
+    purchased = np.flatnonzero(bottles)
+    table.append([
+      period + 1,
+      f"{period * plan.period_days + 1}-{(period + 1) * plan.period_days}",
+      len(purchased),
+      int(bottles.sum()),
+      f"${float(bottles @ bottle_cost):.2f}",
+      ", ".join(f"{catalog.labels[i]} x{bottles[i]}" for i in purchased),
+    ])
+
+  headers = ["Period", "Days", "Supplements", "Bottles", "Cost", "Purchases"]
+  print(tabulate(table, headers=headers))
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Schedule supplement purchases across periods with a rolling horizon.")
+
+  parser.add_argument(
+    '--periods', type=int, default=13,
+    help="Number of periods to plan (default: 13, ie. a year of 4 week periods)"
+  )
+  parser.add_argument(
+    '--period-days', type=int, default=7 * 4,
+    help="Number of stacks (days) in each period (default: 7 * 4 days)"
+  )
+  parser.add_argument(
+    '--window', type=int, default=3,
+    help="Number of periods each solve looks ahead, before committing the first period's purchases and rolling forward (default: 3)"
+  )
+  parser.add_argument(
+    '--mode', type=str, choices=[mode.value for mode in HORIZON_MODES], default='leftover_units_cost',
+    help="Optimization mode: 'leftover_units' or 'leftover_units_cost', carried at the end of every period (default: 'leftover_units_cost')"
+  )
+  parser.add_argument(
+    '--order-cost', type=float, default=0.0,
+    help="Optional: Fixed cost of placing an order in a period (eg. shipping), in the same units as the objective, which makes it worth buying ahead (default: 0)"
+  )
+  parser.add_argument(
+    '--compare', type=int, nargs='+', default=None, metavar='WINDOW',
+    help="Optional: Also plan with each of these window lengths and a single monolithic solve, reporting the runtime and objective of each"
+  )
+  add_solver_arguments(parser)
+  add_catalog_argument(parser)
+
+  return parser.parse_args()
+
+# Main function
+def main():
+  args = parse_args()
+
+  catalog = SupplementCatalog.from_records(SupplementCatalog.from_file(args.catalog) if args.catalog else supplements)
+  mode = get_mode_enum(args.mode)
+  solver_options = SolverOptions.from_args(args)
+
+  def plan(window):
+    return rolling_horizon(catalog, args.periods, args.period_days, window, mode, args.order_cost, solver_options)
+
+  horizon_plan = plan(args.window)
+
+  print("Configuration:")
+  print(f"  periods={args.periods} x {args.period_days} days")
+  print(f"  window={horizon_plan.window}")
+  print(f"  mode={mode}")
+  print(f"  order_cost={args.order_cost}")
+  print(f"  solver={solver_options.describe()}")
+  print("\nStatus:", horizon_plan.status)
+
+  if not horizon_plan.has_solution:
+    print(f"\nProblem could not be solved optimally.")
+    return
+
+  print()
+  print_schedule(catalog, horizon_plan)
+  print(f"\nObjective: {horizon_plan.objective:.2f}")
+  print(f"Total Cost: ${horizon_plan.total_cost:.2f} over {horizon_plan.orders} order(s)")
+  print(f"Solves: {horizon_plan.solves} in {horizon_plan.runtime:.3f}s")
+
+  if args.compare:
+    # Along with the plan above (reused rather than solved again)
+    plans = {horizon_plan.window: horizon_plan}
+    for window in args.compare:
+      if window < args.periods and window not in plans:
+        plans[window] = plan(window)
+    # Warm started from the rolling plan, so even a time limited monolithic solve has a solution to improve on
+    monolithic = rolling_horizon(
+      catalog, args.periods, args.period_days, args.periods, mode, args.order_cost, solver_options,
+      initial_schedule=horizon_plan.schedule,
+    )
+
+    table = []
+    for window_plan in [*(plans[window] for window in sorted(plans) if window < args.periods), monolithic]:
+      if window_plan.has_solution and monolithic.has_solution:
+        gap = window_plan.objective - monolithic.objective
+        gap_pct = f"{gap / abs(monolithic.objective) * 100:.2f}%" if monolithic.objective else "N/A"
+      else:
+        gap = gap_pct = None
+
+      table.append([
+        "monolithic" if window_plan.window == args.periods else window_plan.window,
+        window_plan.status,
+        window_plan.solves,
+        f"{window_plan.runtime:.3f}s",
+        *([f"{window_plan.objective:.2f}", f"{gap:.2f}", gap_pct, window_plan.orders, f"${window_plan.total_cost:.2f}"] if gap is not None else [None] * 5),
+      ])
+
+    headers = ["Window", "Status", "Solves", "Runtime", "Objective", "Gap", "Gap %", "Orders", "Total Cost"]
+    print(f"\nWindow Comparison:\n")
+    print(tabulate(table, headers=headers))
+
+if __name__ == "__main__":
+  main()
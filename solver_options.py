@@ -0,0 +1,162 @@
+# NOTE: By default PuLP runs its bundled CBC single threaded with no limits at all, which is fine for our 18 row catalog
+# but means a large catalog can tie up one core indefinitely proving optimality. SolverOptions picks the MILP backend
+# (CBC, HiGHS or GLPK, where installed) and passes through thread count, time limit, relative/absolute MIP gap and
+# presolve settings, mapping each onto whatever the backend calls it.
+#
+# A solve stopped by the time limit reports the best solution found so far with a 'Feasible' (rather than 'Optimal')
+# status, and every plan records the backend and settings that produced it.
+
+import argparse
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from lazy_imports import lazy_import
+
+pulp = lazy_import('pulp')
+
+SOLVER_BACKENDS = ('cbc', 'highs', 'glpk')
+
+# Options each backend can't honour (rather than silently ignoring them)
+UNSUPPORTED_OPTIONS = {
+  'cbc': (),
+  'highs': (),
+  'glpk': ('threads', 'gap_abs'),
+}
+
+# Backend, parallelism and stopping criteria for a MILP solve (None leaves the solver's own default in place)
+@dataclass(frozen=True)
+class SolverOptions:
+  backend: str = 'cbc'
+  threads: Optional[int] = None
+  time_limit: Optional[float] = None
+  gap_rel: Optional[float] = None
+  gap_abs: Optional[float] = None
+  presolve: Optional[bool] = None
+
+  def __post_init__(self):
+    if self.backend not in SOLVER_BACKENDS:
+      raise ValueError(f"Unknown solver backend: {self.backend}")
+
+    for name in UNSUPPORTED_OPTIONS[self.backend]:
+      if getattr(self, name) is not None:
+        raise ValueError(f"The {self.backend} backend doesn't support {name}")
+
+  @classmethod
+  def from_args(cls, args):
+    return cls(
+      backend=args.solver,
+      threads=args.threads,
+      time_limit=args.time_limit,
+      gap_rel=args.gap_rel,
+      gap_abs=args.gap_abs,
+      presolve=args.presolve,
+    )
+
+  # Just the settings that were actually set
+  def settings(self):
+    return {name: value for name, value in asdict(self).items() if name != 'backend' and value is not None}
+
+  # Settings that can change which solution is returned (and so belong in a cache key). A time limited solve that
+  # still finishes is optimal regardless, and only optimal results are ever cached.
+  def cache_options(self):
+    return {name: value for name, value in self.settings().items() if name in ('gap_rel', 'gap_abs')}
+
+  # eg. "cbc threads=4 time_limit=30 gap_rel=0.01"
+  def describe(self):
+    return " ".join([self.backend, *(f"{name}={value}" for name, value in self.settings().items())])
+
+  # Build the PuLP solver for these options (warm starting and logging to a file are only supported with CBC)
+  def solver(self, msg=False, warm_start=False, log_path=None):
+    if self.backend == 'cbc':
+      # PuLP's presolve flag only ever turns presolve on, so pass it through as a raw option instead
+      options = [] if self.presolve is None else [f"presolve {'on' if self.presolve else 'off'}"]
+
+      return pulp.PULP_CBC_CMD(
+        msg=msg, warmStart=warm_start, logPath=log_path, options=options,
+        threads=self.threads, timeLimit=self.time_limit, gapRel=self.gap_rel, gapAbs=self.gap_abs,
+      )
+    elif self.backend == 'highs':
+      presolve = {} if self.presolve is None else {'presolve': 'on' if self.presolve else 'off'}
+
+      # Prefer the in-process highspy API, falling back to the highs binary
+      solver = pulp.HiGHS(
+        msg=msg, threads=self.threads, timeLimit=self.time_limit, gapRel=self.gap_rel, gapAbs=self.gap_abs, **presolve
+      )
+      if not solver.available():
+        solver = pulp.HiGHS_CMD(
+          msg=msg, threads=self.threads, timeLimit=self.time_limit, gapRel=self.gap_rel, gapAbs=self.gap_abs,
+          options=[f"{name}={value}" for name, value in presolve.items()],
+        )
+    else:
+      options = []
+      if self.gap_rel is not None:
+        options += ["--mipgap", str(self.gap_rel)]
+      if self.presolve:
+        options.append("--presol")
+
+      solver = pulp.GLPK_CMD(msg=msg, timeLimit=self.time_limit, options=options)
+
+    if not solver.available():
+      raise ValueError(f"The {self.backend} solver backend isn't installed (available: {', '.join(available_backends())})")
+
+    return solver
+
+  # Command line arguments for running the CBC binary directly (see array_model)
+  def cbc_args(self):
+    if self.backend != 'cbc':
+      raise ValueError(f"Only the cbc backend can run the CBC binary directly, not {self.backend}")
+
+    args = []
+    if self.threads is not None:
+      args += ["-threads", str(self.threads)]
+    if self.time_limit is not None:
+      args += ["-sec", str(self.time_limit)]
+    if self.gap_rel is not None:
+      args += ["-ratioGap", str(self.gap_rel)]
+    if self.gap_abs is not None:
+      args += ["-allowableGap", str(self.gap_abs)]
+    if self.presolve is not None:
+      args += ["-presolve", 'on' if self.presolve else 'off']
+
+    return args
+
+DEFAULT_SOLVER_OPTIONS = SolverOptions()
+
+# Backends whose solver is installed
+def available_backends():
+  available = []
+  if pulp.PULP_CBC_CMD(msg=False).available():
+    available.append('cbc')
+  if pulp.HiGHS(msg=False).available() or pulp.HiGHS_CMD(msg=False).available():
+    available.append('highs')
+  if pulp.GLPK_CMD(msg=False).available():
+    available.append('glpk')
+
+  return available
+
+# Add the solver backend/option arguments to an optimizer CLI
+def add_solver_arguments(parser):
+  parser.add_argument(
+    '--solver', type=str, choices=SOLVER_BACKENDS, default='cbc',
+    help="MILP solver backend for the 'milp' engine (the 'array' engine only supports 'cbc'), where installed (default: 'cbc')"
+  )
+  parser.add_argument(
+    '--threads', type=int, default=None,
+    help="Optional: Number of solver threads (not supported by glpk)"
+  )
+  parser.add_argument(
+    '--time-limit', type=float, default=None,
+    help="Optional: Stop the solver after this many seconds, reporting the best solution found so far as 'Feasible'"
+  )
+  parser.add_argument(
+    '--gap-rel', type=float, default=None,
+    help="Optional: Stop once the solution is proven within this relative MIP gap of optimal (eg. 0.01 for 1%%)"
+  )
+  parser.add_argument(
+    '--gap-abs', type=float, default=None,
+    help="Optional: Stop once the solution is proven within this absolute MIP gap of optimal (not supported by glpk)"
+  )
+  parser.add_argument(
+    '--presolve', action=argparse.BooleanOptionalAction, default=None,
+    help="Optional: Force the solver's presolve on or off (default: the solver's own default)"
+  )
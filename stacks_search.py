@@ -0,0 +1,254 @@
+# NOTE: Once the number of stacks is fixed, the MILP in optimize_bottles_min_leftover_units_or_cost(_of_leftover_bought)
+# splits into independent per-supplement problems: the cheapest way to cover `stacks * daily_dose` units is always to
+# buy the fewest bottles that do so, ie. ceil(max(0, stacks * daily_dose - current_stock) / bottle_size). Every mode
+# only ever gets worse by buying more bottles than that, so we can find the same optimum as prob.solve() by directly
+# scoring each candidate stacks value, without building a model or starting a CBC subprocess at all.
+#
+# Where several stacks values tie on the objective, we prefer the largest one (ie. the most days covered for the same
+# leftovers).
+
+import heapq
+import math
+from collections import namedtuple
+
+from lazy_imports import lazy_import
+from optimization_mode import OptimizationMode, ADJUSTED_MODES, COST_MODES
+from supplement_catalog import SupplementCatalog
+
+np = lazy_import('numpy')
+
+# Result of a direct stacks search, with bottles_purchased aligned to the order of the supplements passed in
+StacksSolution = namedtuple("StacksSolution", ["status", "stacks", "bottles_purchased", "objective"])
+
+# Relative tolerance used when comparing objective values between stacks candidates
+OBJECTIVE_TOLERANCE = 1e-9
+
+# Maximum number of (stacks x supplements) cells to evaluate in a single array operation
+MAX_CHUNK_CELLS = 4_000_000
+
+# Extract the catalog fields used by the optimizers as float arrays
+def catalog_arrays(supplements):
+  # A SupplementCatalog already has them as columns
+  if isinstance(supplements, SupplementCatalog):
+    return supplements.arrays()
+
+  bottle_size = np.array([supp['bottle_size'] for supp in supplements], dtype=np.float64)
+  bottle_cost = np.array([supp['bottle_cost'] for supp in supplements], dtype=np.float64)
+  daily_dose = np.array([supp['daily_dose'] for supp in supplements], dtype=np.float64)
+  current_stock = np.array([supp['current_stock'] for supp in supplements], dtype=np.float64)
+
+  return bottle_size, bottle_cost, daily_dose, current_stock
+
+# First and last stacks values in [min_stacks, max_stacks] of the form stacks_multiple * k + stacks_offset (eg. whole
+# weeks with a multiple of 7), which are the only ones considered (first > last if there are none)
+def lattice_bounds(min_stacks, max_stacks, stacks_multiple=1, stacks_offset=0):
+  if stacks_multiple < 1:
+    raise ValueError(f"The stacks multiple must be at least 1, not {stacks_multiple}")
+
+  first = stacks_offset - ((stacks_offset - min_stacks) // stacks_multiple) * stacks_multiple
+  last = stacks_offset + ((max_stacks - stacks_offset) // stacks_multiple) * stacks_multiple
+
+  return first, last
+
+# Every stacks value considered in [min_stacks, max_stacks], as floats
+def stacks_lattice(min_stacks, max_stacks, stacks_multiple=1, stacks_offset=0):
+  first, last = lattice_bounds(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+
+  return np.arange(first, last + 1, stacks_multiple, dtype=np.float64)
+
+# Per-unit weight that each supplement's leftover units contribute to the objective for the given mode
+def leftover_weights(bottle_size, bottle_cost, mode):
+  if mode in COST_MODES:
+    return bottle_cost / bottle_size
+  elif mode in (OptimizationMode.LEFTOVER_UNITS, OptimizationMode.ADJUSTED_LEFTOVER_UNITS):
+    return np.ones_like(bottle_size)
+  else:
+    raise ValueError(f"Unknown optimization mode: {mode}")
+
+# Fewest bottles needed to cover the given stacks (broadcasts over stacks and supplements)
+def bottles_needed(stacks, bottle_size, daily_dose, current_stock):
+  return np.ceil(np.maximum(stacks * daily_dose - current_stock, 0) / bottle_size)
+
+# Build the solution (purchases and objective) for a fixed stacks value
+def solution_at(stacks, bottle_size, bottle_cost, daily_dose, current_stock, mode):
+  bottles = bottles_needed(stacks, bottle_size, daily_dose, current_stock)
+  leftover = current_stock + bottles * bottle_size - stacks * daily_dose
+
+  if mode in ADJUSTED_MODES:
+    leftover = np.where(bottles > 0, leftover, 0)
+
+  objective = float(leftover @ leftover_weights(bottle_size, bottle_cost, mode))
+
+  return StacksSolution("Optimal", int(stacks), bottles.astype(np.int64).tolist(), objective)
+
+# Pick the best objective, preferring the largest stacks value within tolerance of it
+def best_index(objective):
+  best = objective.min()
+  tolerance = OBJECTIVE_TOLERANCE * max(1.0, abs(best))
+
+  return int(np.flatnonzero(objective <= best + tolerance)[-1])
+
+# Objective at every stacks value in stacks_range, summed over the given supplements
+def stacks_objective(stacks_range, bottle_size, daily_dose, current_stock, weights, adjusted):
+  objective = np.zeros_like(stacks_range)
+
+  # Accumulate the objective over chunks of supplements so huge catalogs don't blow out memory
+  chunk_size = max(1, MAX_CHUNK_CELLS // len(stacks_range))
+  for start in range(0, len(bottle_size), chunk_size):
+    chunk = slice(start, start + chunk_size)
+
+    units_needed = stacks_range[:, None] * daily_dose[chunk]
+    bottles = bottles_needed(stacks_range[:, None], bottle_size[chunk], daily_dose[chunk], current_stock[chunk])
+    leftover = current_stock[chunk] + bottles * bottle_size[chunk] - units_needed
+
+    if adjusted:
+      # Only count leftovers for supplements we actually purchased bottles of
+      leftover = np.where(bottles > 0, leftover, 0)
+
+    objective += leftover @ weights[chunk]
+
+  return objective
+
+# Total cost of the fewest bottles covering each stacks value in stacks_range
+def stacks_cost(stacks_range, bottle_size, bottle_cost, daily_dose, current_stock):
+  cost = np.zeros_like(stacks_range)
+
+  chunk_size = max(1, MAX_CHUNK_CELLS // len(stacks_range))
+  for start in range(0, len(bottle_size), chunk_size):
+    chunk = slice(start, start + chunk_size)
+    cost += bottles_needed(stacks_range[:, None], bottle_size[chunk], daily_dose[chunk], current_stock[chunk]) @ bottle_cost[chunk]
+
+  return cost
+
+# Evaluate every stacks value in [min_stacks, max_stacks] (on the stacks lattice) for every supplement and return the
+# optimum
+def sweep_stacks(supplements, min_stacks, max_stacks, mode, stacks_multiple=1, stacks_offset=0):
+  stacks_range = stacks_lattice(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+  if not len(stacks_range):
+    return StacksSolution("Infeasible", None, None, None)
+
+  bottle_size, bottle_cost, daily_dose, current_stock = catalog_arrays(supplements)
+  weights = leftover_weights(bottle_size, bottle_cost, mode)
+
+  objective = stacks_objective(stacks_range, bottle_size, daily_dose, current_stock, weights, mode in ADJUSTED_MODES)
+
+  index = best_index(objective)
+
+  return solution_at(int(stacks_range[index]), bottle_size, bottle_cost, daily_dose, current_stock, mode)
+
+# Largest stacks value that the given number of bottles (plus current stock) still covers
+def last_covered_stacks(bottles, bottle_size, daily_dose, current_stock):
+  return math.floor((current_stock + bottles * bottle_size) / daily_dose)
+
+# Score only the stacks values where some supplement is about to need another bottle.
+#
+# Between two consecutive breakpoints every supplement's bottle count is constant, so each mode's objective is linear
+# and non-increasing in stacks (more units get used up, leftovers shrink), which means the best value within each
+# interval is always its right end. Merging each supplement's breakpoint sequence (current_stock + k * bottle_size) /
+# daily_dose with a heap visits exactly those right ends, so the cost grows with the number of bottles bought rather
+# than with max_stacks - min_stacks.
+#
+# On a stacks lattice, the best value within an interval is instead the last lattice point in it (if it has any), so
+# the search is the same with each right end rounded down onto the lattice.
+def breakpoint_stacks(supplements, min_stacks, max_stacks, mode, stacks_multiple=1, stacks_offset=0):
+  min_stacks, max_stacks = lattice_bounds(min_stacks, max_stacks, stacks_multiple, stacks_offset)
+  if min_stacks > max_stacks:
+    return StacksSolution("Infeasible", None, None, None)
+
+  bottle_size, bottle_cost, daily_dose, current_stock = catalog_arrays(supplements)
+  weights = leftover_weights(bottle_size, bottle_cost, mode).tolist()
+  adjusted = mode in ADJUSTED_MODES
+
+  bottle_size = bottle_size.tolist()
+  daily_dose = daily_dose.tolist()
+  current_stock = current_stock.tolist()
+  bottles = bottles_needed(
+    min_stacks, np.array(bottle_size), np.array(daily_dose), np.array(current_stock)
+  ).astype(np.int64).tolist()
+
+  # Within an interval, objective(stacks) = available_total - stacks * dose_total, over the supplements that count
+  def counts(i):
+    return bottles[i] > 0 or not adjusted
+
+  available_total = 0.0
+  dose_total = 0.0
+  for i in range(len(bottles)):
+    if counts(i):
+      available_total += weights[i] * (current_stock[i] + bottles[i] * bottle_size[i])
+      dose_total += weights[i] * daily_dose[i]
+
+  # Heap of (last stacks value covered by the current bottle count, supplement index)
+  heap = []
+  for i in range(len(bottles)):
+    if daily_dose[i] > 0:
+      breakpoint = last_covered_stacks(bottles[i], bottle_size[i], daily_dose[i], current_stock[i])
+      if breakpoint < max_stacks:
+        heap.append((breakpoint, i))
+  heapq.heapify(heap)
+
+  best_stacks = None
+  best_objective = None
+  # First stacks value of the current interval
+  interval_start = min_stacks
+
+  def consider(stacks):
+    nonlocal best_stacks, best_objective
+    stacks = lattice_bounds(interval_start, stacks, stacks_multiple, stacks_offset)[1]
+    if stacks < interval_start:
+      return
+
+    objective = available_total - stacks * dose_total
+    tolerance = OBJECTIVE_TOLERANCE * max(1.0, abs(objective))
+
+    if best_objective is None or objective < best_objective - tolerance:
+      best_stacks, best_objective = stacks, objective
+    elif objective <= best_objective + tolerance:
+      # Prefer the largest stacks value among ties
+      best_stacks, best_objective = stacks, min(objective, best_objective)
+
+  while heap:
+    stacks = heap[0][0]
+    consider(stacks)
+
+    # Every supplement whose breakpoint this is needs more bottles from stacks + 1 onwards
+    while heap and heap[0][0] == stacks:
+      _, i = heapq.heappop(heap)
+
+      if counts(i):
+        available_total -= weights[i] * (current_stock[i] + bottles[i] * bottle_size[i])
+        dose_total -= weights[i] * daily_dose[i]
+
+      bottles[i] = math.ceil(max(0, (stacks + 1) * daily_dose[i] - current_stock[i]) / bottle_size[i])
+
+      if counts(i):
+        available_total += weights[i] * (current_stock[i] + bottles[i] * bottle_size[i])
+        dose_total += weights[i] * daily_dose[i]
+
+      breakpoint = last_covered_stacks(bottles[i], bottle_size[i], daily_dose[i], current_stock[i])
+      if breakpoint < max_stacks:
+        heapq.heappush(heap, (breakpoint, i))
+
+    interval_start = stacks + 1
+
+  # The final interval always ends at max_stacks
+  consider(max_stacks)
+
+  # Recompute the solution directly rather than trusting the running totals
+  return solution_at(best_stacks, *catalog_arrays(supplements), mode)
+
+# Direct search engines, selectable alongside the 'milp' engine
+SEARCH_ENGINES = {
+  'sweep': sweep_stacks,
+  'breakpoints': breakpoint_stacks,
+}
+
+# Add the stacks lattice arguments to an optimizer CLI
+def add_stacks_lattice_arguments(parser):
+  parser.add_argument(
+    '--stacks-multiple', type=int, default=1, metavar='N',
+    help="Optional: Only consider stacks values that are a multiple of N (plus --stacks-offset), eg. 7 for weekly packs, which shrinks the search N times rather than constraining it (default: 1)"
+  )
+  parser.add_argument(
+    '--stacks-offset', type=int, default=0, metavar='R',
+    help="Optional: With --stacks-multiple, only consider stacks values of N * k + R (default: 0)"
+  )
@@ -0,0 +1,183 @@
+# NOTE: A catalog as a list of dicts costs several hundred bytes per supplement (a dict, its keys, and a boxed int or
+# float per field), and every model or report row looks each field up by name again. SupplementCatalog keeps the
+# numeric fields in a single NumPy structured array (32 bytes per supplement) alongside a list of interned labels, so
+# code that works a column at a time (catalog_arrays, cache keys, building plans, validation) reads whole columns at
+# once instead.
+#
+# Indexing or iterating a catalog gives lightweight Supplement records (built on demand) that read like the dicts, ie.
+# supp['label'], so everything that takes a list of supplement dicts (the optimizers, PurchaseModel, the search
+# engines) takes a SupplementCatalog too.
+#
+# Usage:
+#   catalog = SupplementCatalog.from_records(supplements)
+#   catalog = SupplementCatalog.from_file("inventory.csv")
+
+import functools
+import sys
+
+from catalog_io import FIELDS, MAX_WHOLE_NUMBER, POSITIVE_FIELDS, convert_field, load_catalog_arrays
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Numeric fields (everything but the label), in catalog order
+NUMERIC_FIELDS = tuple(name for name in FIELDS if name != 'label')
+
+# Structured dtype of the numeric fields, in their catalog types (built on first use, so importing this doesn't import
+# NumPy)
+@functools.cache
+def catalog_dtype():
+  return np.dtype([(name, np.int64 if FIELDS[name] is int else np.float64) for name in NUMERIC_FIELDS])
+
+# A single supplement, read by attribute or by key like the supplements_data dicts
+class Supplement:
+  __slots__ = tuple(FIELDS)
+
+  def __init__(self, label, bottle_size, bottle_cost, daily_dose, current_stock):
+    self.label = label
+    self.bottle_size = bottle_size
+    self.bottle_cost = bottle_cost
+    self.daily_dose = daily_dose
+    self.current_stock = current_stock
+
+  def __getitem__(self, name):
+    if name not in FIELDS:
+      raise KeyError(name)
+    return getattr(self, name)
+
+  def get(self, name, default=None):
+    return getattr(self, name) if name in FIELDS else default
+
+  # With keys() and __getitem__, dict(supp) gives the equivalent supplements_data dict
+  def keys(self):
+    return FIELDS.keys()
+
+  def __repr__(self):
+    return f"Supplement({', '.join(f'{name}={getattr(self, name)!r}' for name in FIELDS)})"
+
+# Columnar supplement catalog: interned labels plus a structured array of the numeric fields. Build one with
+# from_records/from_columns/from_file, which validate the catalog (the constructor trusts its arguments).
+class SupplementCatalog:
+  def __init__(self, labels, records):
+    if len(labels) != len(records):
+      raise ValueError(f"Got {len(labels)} labels for {len(records)} records")
+
+    # Labels are interned once, so the models' per-label dicts and variable names all share the same strings
+    self.labels = [sys.intern(str(label)) for label in labels]
+    self.records = np.asarray(records, dtype=catalog_dtype())
+    # Built on first use by index()
+    self._index = None
+
+  # Build a catalog from a list of supplement dicts (or anything else with the catalog fields)
+  @classmethod
+  def from_records(cls, supplements):
+    if isinstance(supplements, SupplementCatalog):
+      return supplements
+
+    supplements = list(supplements)
+    columns = {name: np.array([supp[name] for supp in supplements], dtype=np.float64) for name in NUMERIC_FIELDS}
+
+    return cls.from_columns([supp['label'] for supp in supplements], columns)
+
+  # Build a catalog from its labels and a mapping of field name to column
+  @classmethod
+  def from_columns(cls, labels, columns):
+    # The models key their variables by label, so each one has to be unique
+    if len(set(labels)) != len(labels):
+      raise ValueError("Supplement labels must be unique")
+
+    # Checked before casting, so eg. a fractional daily dose is rejected rather than truncated
+    validate_columns({name: np.asarray(columns[name], dtype=np.float64) for name in NUMERIC_FIELDS})
+
+    records = np.empty(len(labels), dtype=catalog_dtype())
+    for name in NUMERIC_FIELDS:
+      records[name] = columns[name]
+
+    return cls(labels, records)
+
+  # Stream a catalog in from a CSV or JSON lines file (see catalog_io)
+  @classmethod
+  def from_file(cls, path, format=None):
+    labels, *columns = load_catalog_arrays(path, format)
+
+    return cls.from_columns(labels, dict(zip(NUMERIC_FIELDS, columns)))
+
+  def __len__(self):
+    return len(self.labels)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return SupplementCatalog(self.labels[index], self.records[index])
+
+    return Supplement(self.labels[index], *self.records[index].tolist())
+
+  def __iter__(self):
+    columns = [self.records[name].tolist() for name in NUMERIC_FIELDS]
+
+    for label, *values in zip(self.labels, *columns):
+      yield Supplement(label, *values)
+
+  def __repr__(self):
+    return f"SupplementCatalog({len(self)} supplements)"
+
+  # A single field for every supplement (a view onto the records, or the list of labels)
+  def column(self, name):
+    if name == 'label':
+      return self.labels
+    return self.records[name]
+
+  # The same catalog with a different current_stock column
+  def with_current_stock(self, current_stock):
+    current_stock = np.asarray(current_stock, dtype=np.float64)
+    validate_columns({'current_stock': current_stock})
+
+    records = self.records.copy()
+    records['current_stock'] = current_stock
+
+    return SupplementCatalog(self.labels, records)
+
+  # The same catalog with some stock levels (mapping of label to units on hand) substituted in
+  def with_stock_levels(self, current_stock):
+    index = self.index()
+    stock = self.records['current_stock'].copy()
+
+    for label, units in current_stock.items():
+      if label not in index:
+        raise ValueError(f"Unknown supplement: {label!r}")
+      stock[index[label]] = convert_field('current_stock', units)
+
+    return self.with_current_stock(stock)
+
+  # Position of each label in the catalog
+  def index(self):
+    if self._index is None:
+      self._index = {label: i for i, label in enumerate(self.labels)}
+    return self._index
+
+  # The numeric columns as float64 arrays, in the order stacks_search.catalog_arrays returns them
+  def arrays(self):
+    return tuple(self.records[name].astype(np.float64) for name in ('bottle_size', 'bottle_cost', 'daily_dose', 'current_stock'))
+
+  # The equivalent list of supplements_data dicts
+  def to_records(self):
+    return [dict(supp) for supp in self]
+
+# Every field's column, from either a SupplementCatalog or a list of supplement dicts (keeping the dicts' own types)
+def catalog_columns(supplements):
+  if isinstance(supplements, SupplementCatalog):
+    return {name: supplements.column(name) for name in FIELDS}
+
+  return {name: [supp[name] for supp in supplements] if name == 'label' else np.array([supp[name] for supp in supplements]) for name in FIELDS}
+
+# Check the numeric columns in one pass: finite, non-negative (positive sizes and doses) and whole numbers of units that
+# fit in their int64 column (see catalog_io.MAX_WHOLE_NUMBER)
+def validate_columns(columns):
+  for name, column in columns.items():
+    if not np.all(np.isfinite(column)):
+      raise ValueError(f"{name} must be finite")
+    if np.any(column <= 0 if name in POSITIVE_FIELDS else column < 0):
+      raise ValueError(f"{name} must be {'positive' if name in POSITIVE_FIELDS else 'non-negative'}")
+    if FIELDS[name] is int and not np.all(column == np.floor(column)):
+      raise ValueError(f"{name} must be whole numbers")
+    if FIELDS[name] is int and np.any(column > MAX_WHOLE_NUMBER):
+      raise ValueError(f"{name} must be at most {MAX_WHOLE_NUMBER}")